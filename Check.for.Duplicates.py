@@ -1,62 +1,103 @@
-# author：8891689
-import os
-import re
-from collections import defaultdict
-
-def process_file(file_path, sequence_counts):
-    pattern = re.compile(r'R:[a-zA-Z0-9]{63,65}')
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                sequences = pattern.findall(line)
-                for sequence in sequences:
-                    sequence_counts[sequence] += 1
-    except Exception as e:
-        print(f"Error processing file {file_path}: {e}")
-
-def find_and_log_duplicates(folder_path, output_file):
-    sequence_counts = defaultdict(int)
-
-    # Process each file
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            file_path = os.path.join(root, file)
-            process_file(file_path, sequence_counts)
-
-            # Optional: Periodically write intermediate results to disk
-            if len(sequence_counts) > 100000:  # Threshold to write intermediate results
-                with open(output_file, 'a', encoding='utf-8') as out_f:
-                    out_f.write("The following are the repeated sequences and their number of occurrences(starting with 'R:' and with a length between 63 and 65 characters):\n")
-                    for sequence, count in sequence_counts.items():
-                        if count >= 2:
-                            out_f.write(f"sequence: {sequence}, Occurrence: {count}\n")
-                sequence_counts.clear()  # Clear in-memory data
-
-    # Write remaining results to output file
-    with open(output_file, 'a', encoding='utf-8') as out_f:
-        out_f.write("The following are the repeated sequences and their occurrence counts (starting with 'R:' and with lengths between 63 and 65):\n")
-        for sequence, count in sequence_counts.items():
-            if count >= 2:
-                out_f.write(f"sequence: {sequence}, Occurrence: {count}\n")
-
-    return sequence_counts
-
-def main():
-    folder_path = os.getcwd()  # Current working directory
-    output_file = os.path.join(folder_path, "duplicates_log.txt")
-    
-    if os.path.exists(output_file):
-        os.remove(output_file)  # Clear previous output files
-
-    sequence_counts = find_and_log_duplicates(folder_path, output_file)
-    
-    if any(count >= 2 for count in sequence_counts.values()):  # Check if there is a sequence with a number of occurrences greater than or equal to 2
-        print(f"Results saved to {output_file}")
-    else:
-        print("No duplicate sequences found。")
-
-    input("Press any key to exit...")
-
-if __name__ == "__main__":
-    main()
-
+# author：8891689
+import os
+import json
+import argparse
+from duplicate_finder import find_duplicates, find_duplicate_groups, find_duplicates_approximate, iter_input_files
+
+def find_and_log_duplicates(folder_path, output_file, memory_bytes=256 << 20, work_dir=None, workers=None):
+    # Files are memory-mapped and scanned in parallel chunks; R values are sorted into shards on disk
+    # and counted range by range, so duplicates spanning several files are found exactly in bounded memory
+    file_paths = iter_input_files(folder_path, exclude=[output_file])
+    duplicates_found = 0
+
+    with open(output_file, 'a', encoding='utf-8') as out_f:
+        out_f.write("The following are the repeated R values and their occurrence counts (R values normalized to 64 hex digits):\n")
+        for r, count in find_duplicates(file_paths, memory_bytes, work_dir or folder_path, workers):
+            out_f.write(f"sequence: R:{r}, Occurrence: {count}\n")
+            duplicates_found += 1
+
+    return duplicates_found
+
+def find_and_log_duplicate_provenance(folder_path, output_file, memory_bytes=256 << 20, work_dir=None, workers=None):
+    # The shards also record where each R value was found; only the offsets of repeated values are read
+    # back, and each repeated value is written as one JSON line with all of its occurrences
+    file_paths = iter_input_files(folder_path, exclude=[output_file])
+    duplicates_found = 0
+
+    with open(output_file, 'a', encoding='utf-8') as out_f:
+        for group in find_duplicate_groups(file_paths, memory_bytes, work_dir or folder_path, workers):
+            out_f.write(json.dumps(group) + "\n")
+            duplicates_found += 1
+
+    return duplicates_found
+
+def find_and_log_duplicates_approximate(folder_path, output_file, error_rate=0.001, workers=None):
+    # A Bloom filter flags values that may repeat; only those candidates are counted exactly in a second pass
+    file_paths = iter_input_files(folder_path, exclude=[output_file])
+    duplicates, stats = find_duplicates_approximate(file_paths, error_rate, workers)
+    print(f"Pass 1: {stats['values']} R values, {stats['filter_bytes'] / 2 ** 20:.1f} MiB filter "
+          f"({stats['hashes']} hashes), {stats['candidates']} candidates")
+    print(f"Pass 2: {len(duplicates)} repeated R values confirmed, {stats['false_positives']} false positives discarded")
+
+    with open(output_file, 'a', encoding='utf-8') as out_f:
+        out_f.write("The following are the repeated R values and their occurrence counts (R values normalized to 64 hex digits):\n")
+        for r, count in duplicates:
+            out_f.write(f"sequence: R:{r}, Occurrence: {count}\n")
+
+    return len(duplicates)
+
+def setup_arg_parser():
+    """Sets up the command-line argument parser."""
+    parser = argparse.ArgumentParser(
+        description="Find R values that occur more than once across all files of a folder. Understands the "
+                    "'Signature - R: ', 'R : ' and 'R:' output formats and binary signature files."
+    )
+    parser.add_argument("folder", nargs="?", default=os.getcwd(),
+                        help="Folder whose files are searched (default: current working directory).")
+    parser.add_argument("-o", "--output",
+                        help="Output file (default: duplicates_log.txt, or duplicates_log.jsonl with --provenance, "
+                             "in the folder).")
+    parser.add_argument("--memory", type=int, default=256,
+                        help="Approximate memory budget in MiB; more signatures are spilled to disk (default: 256).")
+    parser.add_argument("--tmp-dir", help="Directory for the temporary shard files (default: the searched folder).")
+    parser.add_argument("--workers", type=int, help="Number of scanner processes (default: CPU count).")
+    parser.add_argument("--approximate", action="store_true",
+                        help="Two-pass sweep: a Bloom filter picks candidate repeats, which are then verified "
+                             "exactly. Uses far less memory and no temporary files.")
+    parser.add_argument("--error-rate", type=float, default=0.001,
+                        help="False-positive rate of the --approximate filter (default: 0.001).")
+    parser.add_argument("--provenance", action="store_true",
+                        help="Write JSON Lines instead: every repeated R value with the file, offset, txid, input "
+                             "index, height, pubkey, S and Z of each occurrence.")
+    return parser
+
+def main():
+    parser = setup_arg_parser()
+    args = parser.parse_args()
+    if args.provenance and args.approximate:
+        parser.error("--provenance needs the exact search; it cannot be combined with --approximate.")
+    folder_path = args.folder
+    output_file = args.output or os.path.join(folder_path,
+                                              "duplicates_log.jsonl" if args.provenance else "duplicates_log.txt")
+
+    if os.path.exists(output_file):
+        os.remove(output_file)  # Clear previous output files
+
+    if args.approximate:
+        duplicates_found = find_and_log_duplicates_approximate(folder_path, output_file, args.error_rate, args.workers)
+    elif args.provenance:
+        duplicates_found = find_and_log_duplicate_provenance(folder_path, output_file, args.memory << 20,
+                                                             args.tmp_dir, args.workers)
+    else:
+        duplicates_found = find_and_log_duplicates(folder_path, output_file, args.memory << 20, args.tmp_dir,
+                                                   args.workers)
+
+    if duplicates_found:  # Check if there is a sequence with a number of occurrences greater than or equal to 2
+        print(f"Results saved to {output_file}")
+    else:
+        print("No duplicate sequences found。")
+
+    input("Press any key to exit...")
+
+if __name__ == "__main__":
+    main()
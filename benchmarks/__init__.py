@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the extraction and analysis scripts
+Author: https://github.com/8891689
+
+Run from the repository root, e.g. python -m benchmarks.bench_script_parser
+"""
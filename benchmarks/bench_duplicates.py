@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: duplicate R detection over a directory of output files
+Author: https://github.com/8891689
+
+"Before" is the original single-process, line-by-line text regex scan of
+Check.for.Duplicates.py (with its pattern widened to the 'R: ' format and
+to short R values, normalized to 64 digits, so both sides count the same
+values). About 1% of the generated R values are shorter than 32 bytes,
+and the short R of k = 1/2 repeats across the first and last file.
+"After" is duplicate_finder, which maps the files and scans chunks in a
+process pool. "Approximate" is the Bloom filter pre-filter mode. Times are
+taken with --workers processes.
+
+Memory is measured separately: each variant runs once more with one
+worker in a fresh process. With one worker the line scan and the
+approximate mode do all their work in that process, which reports its
+tracemalloc peak and its peak RSS growth over the interpreter. The exact
+search always scans in a pool, so the peak RSS of its largest child is
+added (getrusage RUSAGE_CHILDREN). RSS includes the pages of the file
+being read through mmap. The approximate mode reads every file twice and
+hashes each value in Python, so it trades run time for memory.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from benchmarks.bench_records import peak_rss
+from duplicate_finder import find_duplicates, find_duplicates_approximate
+
+# R of k = 1/2, the best-known reused nonce; its leading zero bytes make it shorter than 32 bytes
+HALF_K_R = bytes.fromhex("00000000000000000000003b78ce563f89a0ed9414f5aa28ad0d96d6795f9c63")
+SHORT_SHARE = 0.01
+
+
+def write_output_files(directory: str, file_count: int, signatures_per_file: int, reuse: float, seed: int = 0):
+    """Writes extract_data.py style output files in which about reuse of the R values repeat an earlier one."""
+    rng = random.Random(seed)
+    seen = []
+    for file_index in range(file_count):
+        lines = []
+        for position in range(signatures_per_file):
+            if position == 0 and file_index in (0, file_count - 1):
+                r = HALF_K_R
+            elif seen and rng.random() < reuse:
+                r = rng.choice(seen)
+            else:
+                r = rng.randbytes(32)
+                if rng.random() < SHORT_SHARE:
+                    r = bytes(rng.randrange(1, 4)) + r[3:]
+                seen.append(r)
+            # DER strips leading zero bytes and pads a value whose top bit is set
+            der = r.lstrip(b'\x00') or b'\x00'
+            r_hex = ('00' + der.hex()) if der[0] & 0x80 else der.hex()
+            lines.append(f"Transaction ID: {rng.randbytes(32).hex()}\n"
+                         f"  Signature - R: {r_hex}, S: {rng.randbytes(32).hex()}\n")
+        with open(os.path.join(directory, f"signatures_{file_index:03d}.txt"), 'w') as f:
+            f.writelines(lines)
+
+
+def line_scan(directory: str) -> dict:
+    """The original in-memory, line-by-line counter."""
+    pattern = re.compile(r'R: ?([a-fA-F0-9]{2,66})')
+    sequence_counts = defaultdict(int)
+    for root, _, files in os.walk(directory):
+        for file in files:
+            with open(os.path.join(root, file), 'r', encoding='utf-8') as f:
+                for line in f:
+                    for sequence in pattern.findall(line):
+                        sequence_counts[f"{int(sequence, 16):064x}"] += 1
+    return {sequence: count for sequence, count in sequence_counts.items() if count >= 2}
+
+
+def files_in(directory: str) -> list:
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))]
+
+
+VARIANTS = {
+    "before": lambda directory, memory, error_rate: line_scan(directory),
+    "after": lambda directory, memory, error_rate: find_duplicates(files_in(directory), memory, workers=1),
+    "approximate": lambda directory, memory, error_rate: find_duplicates_approximate(files_in(directory),
+                                                                                     error_rate, workers=1),
+}
+
+
+def run_variant(name, directory, memory, error_rate, results):
+    """
+    Child process: runs one variant with one worker and reports its
+    tracemalloc peak in bytes, and its baseline and peak RSS and the peak
+    RSS of its largest child in KiB.
+    """
+    baseline = peak_rss()
+    tracemalloc.start()
+    result = VARIANTS[name](directory, memory, error_rate)
+    if name == "after":
+        result = dict(result)
+    traced = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss if resource is not None else 0
+    results.put((traced, baseline, peak_rss(), children))
+    del result
+
+
+def peak_memory(name, directory, memory, error_rate):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run_variant, args=(name, directory, memory, error_rate, results))
+    process.start()
+    measured = results.get()
+    process.join()
+    return measured
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare line-by-line and parallel mmap duplicate R scans.")
+    parser.add_argument("--files", type=int, default=8, help="Number of output files (default: 8).")
+    parser.add_argument("--signatures", type=int, default=250000, help="Signatures per file (default: 250000).")
+    parser.add_argument("--reuse", type=float, default=0.001, help="Share of reused R values (default: 0.001).")
+    parser.add_argument("--workers", type=int, help="Scanner processes (default: CPU count).")
+    parser.add_argument("--memory", type=int, default=256, help="Memory budget in MiB (default: 256).")
+    parser.add_argument("--error-rate", type=float, default=0.001,
+                        help="False-positive rate of the approximate mode (default: 0.001).")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="duplicates_bench_")
+    try:
+        write_output_files(directory, args.files, args.signatures, args.reuse)
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"{args.files * args.signatures:,} signatures, {size / 2 ** 20:.0f} MiB")
+
+        start = time.perf_counter()
+        before = line_scan(directory)
+        before_time = time.perf_counter() - start
+        print(f"before: {before_time:.2f}s ({size / 2 ** 20 / before_time:.0f} MiB/s)")
+
+        files = files_in(directory)
+        start = time.perf_counter()
+        after = dict(find_duplicates(files, args.memory << 20, workers=args.workers))
+        after_time = time.perf_counter() - start
+        print(f"after:  {after_time:.2f}s ({size / 2 ** 20 / after_time:.0f} MiB/s)")
+        print(f"{len(after):,} duplicated R values, results {'match' if after == before else 'DIFFER'}")
+
+        start = time.perf_counter()
+        approximate, stats = find_duplicates_approximate(files, args.error_rate, args.workers)
+        approximate_time = time.perf_counter() - start
+        print(f"approximate: {approximate_time:.2f}s ({size / 2 ** 20 / approximate_time:.0f} MiB/s), "
+              f"{approximate_time / after_time:.1f}x the time of the exact search, "
+              f"{stats['candidates']:,} candidates, results {'match' if dict(approximate) == before else 'DIFFER'}")
+
+        print(f"\n{'one worker':<13}{'Python peak':>12}{'RSS growth':>12}{'largest child RSS':>19}")
+        traced = {}
+        for name in VARIANTS:
+            traced[name], baseline, peak, children = peak_memory(name, directory, args.memory << 20,
+                                                                 args.error_rate)
+            child = f"{children / 1024:.1f} MiB" if children else "-"
+            print(f"{name:<13}{traced[name] / 2 ** 20:>8.1f} MiB{(peak - baseline) / 1024:>8.1f} MiB{child:>19}")
+        print(f"approximate: {traced['before'] / traced['approximate']:.0f}x less Python memory than before, "
+              f"{approximate_time / after_time:.1f}x the time of the exact search")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: R index ingestion and lookup throughput
+Author: https://github.com/8891689
+
+Ingests random signatures in batches the size of a block, with a small
+share of reused R values, then measures membership lookups for indexed and
+unknown R values.
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from r_index import RIndex
+
+
+def build_batches(count: int, batch_size: int, reuse: float, seed: int = 0) -> list:
+    """Returns batches of (r, txid, input_index, height) entries; about reuse of them repeat an earlier R."""
+    rng = random.Random(seed)
+    batches = []
+    seen = []
+    for start in range(0, count, batch_size):
+        height = start // batch_size
+        batch = []
+        for position in range(min(batch_size, count - start)):
+            if seen and rng.random() < reuse:
+                r = rng.choice(seen)
+            else:
+                r = rng.randbytes(32)
+                seen.append(r)
+            batch.append((r, rng.randbytes(32), position, height))
+        batches.append(batch)
+    return batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure R index ingestion and lookup throughput.")
+    parser.add_argument("--count", type=int, default=1000000, help="Signatures to ingest (default: 1000000).")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Signatures per batch (default: 5000).")
+    parser.add_argument("--reuse", type=float, default=0.001, help="Share of reused R values (default: 0.001).")
+    parser.add_argument("--lookups", type=int, default=200000, help="Membership lookups to time (default: 200000).")
+    parser.add_argument("--dir", help="Parent directory of the temporary index (default: system temp directory).")
+    args = parser.parse_args()
+
+    batches = build_batches(args.count, args.batch_size, args.reuse)
+    index_dir = tempfile.mkdtemp(prefix="r_index_bench_", dir=args.dir)
+    try:
+        with RIndex(index_dir) as index:
+            collisions = 0
+            start = time.perf_counter()
+            for batch in batches:
+                collisions += len(index.add(batch))
+            ingest = time.perf_counter() - start
+            print(f"ingest: {args.count:,} signatures in {ingest:.2f}s = {args.count / ingest:,.0f}/s "
+                  f"({collisions:,} new collisions, {index.distinct():,} distinct R)")
+
+            rng = random.Random(1)
+            known = [entry[0] for batch in batches for entry in batch]
+            probes = [rng.choice(known) for _ in range(args.lookups // 2)]
+            probes += [rng.randbytes(32) for _ in range(args.lookups - len(probes))]
+            start = time.perf_counter()
+            found = sum(r in index for r in probes)
+            lookup = time.perf_counter() - start
+            print(f"lookup: {len(probes):,} membership checks in {lookup:.2f}s = {len(probes) / lookup:,.0f}/s "
+                  f"({found:,} hits)")
+
+        size = sum(os.path.getsize(os.path.join(index_dir, name)) for name in os.listdir(index_dir))
+        print(f"index size: {size / 2 ** 20:.1f} MiB ({size / args.count:.0f} bytes per signature)")
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
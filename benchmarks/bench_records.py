@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: memory of signature records on the extraction hot path
+Author: https://github.com/8891689
+
+"Before" is the dict-per-signature extraction extract_data.py used: a dict
+of hex strings per signature, then a tuple of hex strings per record.
+"After" is raw_block_signature_batch, which packs the signatures of a block
+into a SignatureBatch and converts to hex only for the output lines. Both
+render the same output lines.
+
+Per block, tracemalloc gives the peak traced memory while the block is
+processed, and the bytes and live allocations its records keep. The
+pickled size is what a worker sends back to the parent. Peak RSS is
+measured in a fresh process per variant that keeps the records of every
+block (peak RSS growth while they are made). The last table compares the hex dicts of extract_rszp.py with its
+InputSignature records.
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from benchmarks.synthetic_chain import SyntheticChain
+from block_parser import parse_block, is_coinbase
+from extract_data import raw_block_signature_batch
+from extract_rszp import analyze_transaction_signatures
+from script_parser import extract_script_signatures
+
+
+def dict_records(raw_block):
+    """The extraction this replaced: hex dicts per signature, then hex record tuples and output lines."""
+    lines = []
+    records = []
+    for tx in parse_block(raw_block)['tx']:
+        if is_coinbase(tx):
+            continue
+        signatures = []
+        for input_index, vin in enumerate(tx['vin']):
+            signatures.extend({'r': r.hex(), 's': s.hex(), 'input_index': input_index}
+                              for r, s, _ in extract_script_signatures(vin['script_sig'], strict=False))
+        if signatures:
+            lines.append(f"Transaction ID: {tx['txid']}\n")
+            for sig in signatures:
+                lines.append(f"  Signature - R: {sig['r']}, S: {sig['s']}\n")
+                records.append((tx['txid'], sig['input_index'], sig['r'], sig['s'], None, None))
+    return lines, records
+
+
+def batch_records(raw_block):
+    batch = raw_block_signature_batch(raw_block)
+    return batch.text_lines(), batch
+
+
+VARIANTS = {"dict records (before)": dict_records, "SignatureBatch (after)": batch_records}
+
+
+def measure(function, raw_blocks) -> dict:
+    """Time, then per block: transient peak, retained bytes and allocations of the records, pickled size."""
+    start = time.perf_counter()
+    signatures = 0
+    for raw_block in raw_blocks:
+        signatures += len(function(raw_block)[1])
+    seconds = time.perf_counter() - start
+
+    peak = retained = allocations = pickled = 0
+    tracemalloc.start()
+    try:
+        for raw_block in raw_blocks:
+            before_blocks = sys.getallocatedblocks()
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            lines, records = function(raw_block)
+            peak += tracemalloc.get_traced_memory()[1] - before
+            del lines
+            retained += tracemalloc.get_traced_memory()[0] - before
+            allocations += sys.getallocatedblocks() - before_blocks
+            pickled += len(pickle.dumps(records))
+            del records
+    finally:
+        tracemalloc.stop()
+    blocks = len(raw_blocks)
+    return {"signatures": signatures, "seconds": seconds, "peak": peak / blocks, "retained": retained / blocks,
+            "allocations": allocations / blocks, "pickled": pickled / blocks}
+
+
+def iter_block_file(path: str):
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(4)
+            if not header:
+                return
+            yield f.read(struct.unpack('<I', header)[0])
+
+
+def peak_rss():
+    """
+    Peak resident set size of this process in KiB. Linux carries ru_maxrss
+    over from the parent into a spawned child; VmHWM starts fresh with the
+    child's address space, so it is used where /proc has it.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else None
+
+
+def hold_records(name, blocks_path, results):
+    """
+    Child process: keeps the records of every block and reports the growth
+    of its peak RSS in KiB. Blocks are read one at a time, so they do not
+    raise the peak before the records are made.
+    """
+    function = VARIANTS[name]
+    before = peak_rss()
+    held = [function(raw_block)[1] for raw_block in iter_block_file(blocks_path)]
+    results.put(None if before is None else peak_rss() - before)
+    del held
+
+
+def peak_rss_growth(name, blocks_path):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=hold_records, args=(name, blocks_path, results))
+    process.start()
+    growth = results.get()
+    process.join()
+    return growth
+
+
+def measure_inputs(raw_transactions, provider) -> list:
+    """Retained bytes and allocations per input of extract_rszp.py results, as hex dicts and as InputSignature."""
+    rows = []
+    for name, convert in (("hex dicts (before)", lambda records: [record.to_dict() for record in records]),
+                          ("InputSignature (after)", lambda records: records)):
+        tracemalloc.start()
+        try:
+            before_blocks = sys.getallocatedblocks()
+            before = tracemalloc.get_traced_memory()[0]
+            held = [convert(analyze_transaction_signatures(raw_tx, provider)) for raw_tx in raw_transactions]
+            retained = tracemalloc.get_traced_memory()[0] - before
+            allocations = sys.getallocatedblocks() - before_blocks
+            rows.append((name, sum(len(records) for records in held), retained, allocations))
+            del held
+        finally:
+            tracemalloc.stop()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the memory of dict and compact signature records.")
+    parser.add_argument("--blocks", type=int, default=100, help="Blocks in the synthetic chain (default: 100).")
+    parser.add_argument("--transactions", type=int, default=200, help="Spends per block (default: 200).")
+    parser.add_argument("--seed", type=int, default=0, help="Chain seed (default: 0).")
+    args = parser.parse_args()
+
+    chain = SyntheticChain(args.blocks, args.transactions, args.seed)
+    raw_blocks = [chain.raw_block(height) for height in range(len(chain))]
+    blocks_file, blocks_path = tempfile.mkstemp(prefix="bench_records_")
+    with os.fdopen(blocks_file, 'wb') as f:
+        for raw_block in raw_blocks:
+            f.write(struct.pack('<I', len(raw_block)) + raw_block)
+
+    print(f"{'records':<26}{'sigs/block':>11}{'µs/sig':>8}{'peak/block':>12}{'kept/block':>12}"
+          f"{'allocs/block':>13}{'pickled/block':>14}{'peak RSS':>10}")
+    try:
+        for name, function in VARIANTS.items():
+            result = measure(function, raw_blocks)
+            growth = peak_rss_growth(name, blocks_path)
+            per_block = result["signatures"] / len(raw_blocks)
+            rss = "-" if growth is None else f"{growth / 1024:.1f} MiB"
+            print(f"{name:<26}{per_block:>11,.0f}{result['seconds'] / result['signatures'] * 1e6:>8.2f}"
+                  f"{result['peak'] / 1024:>9,.0f} KiB{result['retained'] / 1024:>9,.0f} KiB"
+                  f"{result['allocations']:>13,.0f}{result['pickled'] / 1024:>11,.0f} KiB{rss:>10}")
+    finally:
+        os.remove(blocks_path)
+
+    print(f"\n{'extract_rszp.py records':<26}{'inputs':>11}{'bytes/input':>13}{'allocs/input':>14}")
+    raw_transactions = [raw_tx.hex() for raw_tx in list(chain.spending_transactions())[:5000]]
+    for name, count, retained, allocations in measure_inputs(raw_transactions, chain.prevout_provider()):
+        print(f"{name:<26}{count:>11,}{retained / count:>13,.0f}{allocations / count:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark: scriptSig signature parsing before and after script_parser
+Author: https://github.com/8891689
+
+"Before" is the asm regex path extract_data.py used, reproduced here so the
+two can be compared on the same machine. "After" parses the scriptSig bytes
+with script_parser.extract_script_signatures.
+"""
+import argparse
+import hashlib
+import re
+import time
+
+from script_parser import extract_script_signatures
+
+SIG_HEX = ("304502210083fe1c06236449b69a7bee5be422c067d02c4ce3f4fa3756bd92c632f971de06"
+           "02207405249d2aa9184b688f5307006fddc3bd4a7eb89294e3be3438636384d64ce7")
+PUBKEY_HEX = ("04ca5606a1e820e7a2f6bb3ab090e8ade7b04a7e0b5909a68dda2744ae3b8ecbfa"
+              "280a47639c811134d648e8ee8096c33b41611be509ebca837fbda10baaa1eb15")
+
+
+def legacy_extract(scriptSig_asm):
+    """The regex-over-asm extraction extract_data.py used before script_parser."""
+    signatures = []
+    matches = re.findall(r'([0-9a-fA-F]+)', scriptSig_asm)
+    if len(matches) > 1:
+        sig_data = ''.join(matches)
+        offset = 0
+        if sig_data[offset:offset+2] == '30':
+            offset += 4
+            if sig_data[offset:offset+2] == '02':
+                offset += 2
+                r_len = int(sig_data[offset:offset+2], 16)
+                offset += 2
+                r = sig_data[offset:offset + r_len * 2]
+                offset += r_len * 2
+                if sig_data[offset:offset+2] == '02':
+                    offset += 2
+                    s_len = int(sig_data[offset:offset+2], 16)
+                    offset += 2
+                    s = sig_data[offset:offset + s_len * 2]
+                    signatures.append({'r': r, 's': s})
+    return signatures
+
+
+def build_corpus(count: int):
+    """Builds distinct P2PKH scriptSigs as (asm, raw bytes) pairs."""
+    corpus = []
+    for i in range(count):
+        r = hashlib.sha256(i.to_bytes(8, 'little')).hexdigest()
+        sig_hex = SIG_HEX[:10] + r + SIG_HEX[74:]
+        sig = bytes.fromhex(sig_hex + "01")
+        pubkey = bytes.fromhex(PUBKEY_HEX)
+        script = bytes([len(sig)]) + sig + bytes([len(pubkey)]) + pubkey
+        corpus.append((f"{sig_hex}[ALL] {PUBKEY_HEX}", script))
+    return corpus
+
+
+def measure(func, items, repeat: int) -> float:
+    """Returns the best signatures-per-second rate over repeat runs."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(items) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare scriptSig signature parsing throughput.")
+    parser.add_argument("--count", type=int, default=50000, help="Number of scriptSigs (default: 50000).")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per variant, best is reported (default: 5).")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.count)
+    asm_items = [asm for asm, _ in corpus]
+    raw_items = [script for _, script in corpus]
+
+    before = measure(legacy_extract, asm_items, args.repeat)
+    after = measure(lambda script: [(r.hex(), s.hex()) for r, s, _ in extract_script_signatures(script, strict=False)],
+                    raw_items, args.repeat)
+    after_views = measure(lambda script: extract_script_signatures(script, strict=False), raw_items, args.repeat)
+
+    print(f"{'Before (asm regex):':<36}{before:12,.0f} sig/s")
+    print(f"{'After  (script_parser, hex output):':<36}{after:12,.0f} sig/s  ({after / before:.2f}x)")
+    print(f"{'After  (script_parser, views only):':<36}{after_views:12,.0f} sig/s  ({after_views / before:.2f}x)")
+
+if __name__ == '__main__':
+    main()
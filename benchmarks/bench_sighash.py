@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: legacy sighash (z) cost per input as the input count grows
+Author: https://github.com/8891689
+
+"Before" is the string-concatenating z loop analyze_transaction_signatures
+used, reproduced here for comparison. "After" is sighash.legacy_z_values.
+"""
+import argparse
+import hashlib
+import random
+import time
+
+from block_parser import parse_transaction
+from script_parser import ByteReader
+from sighash import legacy_z_values, encode_varint, hash160
+
+
+def legacy_z_loop(raw_tx: bytes) -> list:
+    """The O(n^2) string-based z computation used before sighash.py."""
+    tx = parse_transaction(ByteReader(raw_tx))
+    inputs_data = []
+    for tx_input in tx["vin"]:
+        script = bytes(tx_input["script_sig"])
+        inputs_data.append({
+            "prev_tx": tx_input["prev_txid"].hex(),
+            "prev_out_index": tx_input["prev_index"].to_bytes(4, 'little').hex(),
+            "pubkey": script[2 + script[0]:].hex(),
+            "sequence": tx_input["sequence"].to_bytes(4, 'little').hex(),
+        })
+    outputs_and_locktime = encode_varint(len(tx["vout"])).hex() + "".join(
+        o["value"].to_bytes(8, 'little').hex() + encode_varint(len(o["script_pubkey"])).hex() + o["script_pubkey"].hex()
+        for o in tx["vout"]) + tx["locktime"].to_bytes(4, 'little').hex()
+    base_tx_part1 = tx["version"].to_bytes(4, 'little').hex() + encode_varint(len(inputs_data)).hex()
+    base_tx_part3 = f"{outputs_and_locktime}01000000"
+
+    z_values = []
+    for i, data in enumerate(inputs_data):
+        middle_part = ""
+        for j, other_data in enumerate(inputs_data):
+            middle_part += other_data["prev_tx"]
+            middle_part += other_data["prev_out_index"]
+            if i == j:
+                pubkey_hash = hashlib.new('ripemd160', hashlib.sha256(bytes.fromhex(data["pubkey"])).digest()).hexdigest()
+                script_pubkey = f"76a914{pubkey_hash}88ac"
+                middle_part += f"{len(bytes.fromhex(script_pubkey)):02x}{script_pubkey}"
+            else:
+                middle_part += "00"
+            middle_part += other_data["sequence"]
+        tx_to_sign = base_tx_part1 + middle_part + base_tx_part3
+        z_values.append(hashlib.sha256(hashlib.sha256(bytes.fromhex(tx_to_sign)).digest()).hexdigest())
+    return z_values
+
+
+def build_p2pkh_transaction(input_count: int, seed: int = 0, distinct_pubkeys: int = 50) -> bytes:
+    """Builds a legacy transaction spending input_count P2PKH outputs with random signatures."""
+    rng = random.Random(seed)
+    pubkeys = [b'\x04' + rng.randbytes(64) for _ in range(distinct_pubkeys)]
+    tx = bytearray((1).to_bytes(4, 'little') + encode_varint(input_count))
+    for _ in range(input_count):
+        r, s = b'\x00\x80' + rng.randbytes(31), b'\x7f' + rng.randbytes(31)
+        der = b'\x30' + bytes((len(r) + len(s) + 4,)) + b'\x02' + bytes((len(r),)) + r + b'\x02' + bytes((len(s),)) + s
+        sig = der + b'\x01'
+        pubkey = rng.choice(pubkeys)
+        script = bytes((len(sig),)) + sig + bytes((len(pubkey),)) + pubkey
+        tx += rng.randbytes(32) + rng.randrange(4).to_bytes(4, 'little') + encode_varint(len(script)) + script + b'\xff' * 4
+    tx += b'\x01' + (50000).to_bytes(8, 'little') + b'\x19\x76\xa9\x14' + rng.randbytes(20) + b'\x88\xac'
+    tx += bytes(4)
+    return bytes(tx)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-input sighash cost for growing input counts.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 5000], help="Input counts (default: 1 100 5000).")
+    parser.add_argument("--legacy-max", type=int, default=2000,
+                        help="Largest input count to run the quadratic legacy loop on (default: 2000).")
+    args = parser.parse_args()
+
+    # Warm up lazily initialised hash objects so the 1-input row is not dominated by them
+    warm_up = build_p2pkh_transaction(2, seed=1)
+    legacy_z_values(parse_transaction(ByteReader(warm_up)))
+    legacy_z_loop(warm_up)
+
+    print(f"{'inputs':>8} {'before us/input':>16} {'after us/input':>15}")
+    for size in args.sizes:
+        raw_tx = build_p2pkh_transaction(size)
+        hash160.cache_clear()
+
+        start = time.perf_counter()
+        after = [entry[0][2].hex() for entry in legacy_z_values(parse_transaction(ByteReader(raw_tx)))]
+        after_us = (time.perf_counter() - start) / size * 1e6
+
+        before_text = "skipped"
+        if size <= args.legacy_max:
+            start = time.perf_counter()
+            before = legacy_z_loop(raw_tx)
+            before_text = f"{(time.perf_counter() - start) / size * 1e6:.1f}"
+            if before != after:
+                raise SystemExit(f"z values differ for {size} inputs")
+
+        print(f"{size:>8} {before_text:>16} {after_us:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
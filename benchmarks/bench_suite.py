@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite over a synthetic chain, with a saved baseline
+Author: https://github.com/8891689
+
+Every benchmark runs on the same deterministic SyntheticChain:
+
+    extract_signatures_from_transaction  decoded transactions (getblock verbosity 2)
+    parse_der_signature                  every DER signature of the chain
+    analyze_transaction_signatures       raw transactions, r/s/z per input
+    find_and_log_duplicates              text output files of the chain
+    scan_mock_node                       extract_data.main against a MockNode
+
+Each one is timed --repeat times. The report is written as JSON, and with
+--baseline the throughput is compared against an earlier report: anything
+slower than the baseline by more than --tolerance is listed, and the exit
+status is 1, so the suite can gate a change.
+
+python -m benchmarks.bench_suite --save-baseline baseline.json
+python -m benchmarks.bench_suite --baseline baseline.json
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_node import MockNode
+from benchmarks.synthetic_chain import SyntheticChain
+from script_parser import iter_pushes, parse_der_signature
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_duplicate_checker():
+    """Check.for.Duplicates.py is a script, not an importable module name."""
+    spec = importlib.util.spec_from_file_location("check_for_duplicates",
+                                                  os.path.join(REPOSITORY, "Check.for.Duplicates.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def setup_extract_signatures(chain, args, work_dir):
+    from extract_data import extract_signatures_from_transaction
+    transactions = chain.decoded_transactions()
+    signatures = sum(len(extract_signatures_from_transaction(tx)[0]) for tx in transactions)
+
+    def run():
+        for tx in transactions:
+            extract_signatures_from_transaction(tx)
+    return run, signatures, "signatures"
+
+
+def setup_parse_der(chain, args, work_dir):
+    signatures = []
+    for tx in chain.decoded_transactions():
+        for tx_input in tx["vin"]:
+            items = [bytes.fromhex(item) for item in tx_input.get("txinwitness", [])]
+            items += [bytes(data) for _, data in iter_pushes(bytes.fromhex(tx_input["scriptSig"]["hex"]))
+                      if data is not None]
+            signatures.extend(item for item in items if item[:1] == b'\x30')
+
+    def run():
+        for signature in signatures:
+            parse_der_signature(signature, strict=False)
+    return run, len(signatures), "signatures"
+
+
+def setup_analyze_transactions(chain, args, work_dir):
+    from extract_rszp import analyze_transaction_signatures
+    provider = chain.prevout_provider()
+    transactions = [raw_tx.hex() for raw_tx in chain.spending_transactions()]
+    inputs = sum(len(analyze_transaction_signatures(raw_tx, provider)) for raw_tx in transactions)
+
+    def run():
+        for raw_tx in transactions:
+            analyze_transaction_signatures(raw_tx, provider)
+    return run, inputs, "signatures"
+
+
+def setup_find_duplicates(chain, args, work_dir):
+    from extract_data import format_raw_block_signatures
+    checker = load_duplicate_checker()
+    folder = os.path.join(work_dir, "outputs")
+    os.makedirs(folder)
+    signatures = 0
+    blocks_per_file = max(1, len(chain) // 8)
+    for first in range(0, len(chain), blocks_per_file):
+        lines = [line for height in range(first, min(first + blocks_per_file, len(chain)))
+                 for line in format_raw_block_signatures(chain.raw_block(height))]
+        signatures += sum(1 for line in lines if line.startswith('  '))
+        with open(os.path.join(folder, f"signatures_{first:09d}.txt"), 'w') as f:
+            f.writelines(lines)
+    output_file = os.path.join(work_dir, "duplicates.txt")
+
+    def run():
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        with contextlib.redirect_stdout(io.StringIO()):
+            checker.find_and_log_duplicates(folder, output_file, workers=args.workers)
+    return run, signatures, "signatures"
+
+
+def setup_scan_mock_node(chain, args, work_dir):
+    import extract_data
+    output_file = os.path.join(work_dir, "scan.txt")
+    node = MockNode(chain, args.latency).start()
+    base_url = extract_data.rpc_client.url
+
+    def run():
+        for path in (output_file, output_file + '.checkpoint'):
+            if os.path.exists(path):
+                os.remove(path)
+        extract_data.rpc_client.url = node.url
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                extract_data.main(0, len(chain) - 1, output_file, workers=args.workers or 1)
+        finally:
+            extract_data.rpc_client.url = base_url
+    run.close = node.close
+    return run, len(chain), "blocks"
+
+
+BENCHMARKS = {
+    "extract_signatures_from_transaction": setup_extract_signatures,
+    "parse_der_signature": setup_parse_der,
+    "analyze_transaction_signatures": setup_analyze_transactions,
+    "find_and_log_duplicates": setup_find_duplicates,
+    "scan_mock_node": setup_scan_mock_node,
+}
+
+
+def run_benchmark(name: str, chain, args) -> dict:
+    work_dir = tempfile.mkdtemp(prefix="bench_suite_")
+    try:
+        run, items, unit = BENCHMARKS[name](chain, args, work_dir)
+        try:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+        finally:
+            if hasattr(run, 'close'):
+                run.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    best = min(timings)
+    return {"unit": unit, "items": items, "best_seconds": best, "median_seconds": statistics.median(timings),
+            "per_second": items / best if best else 0.0}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Prints the change against the baseline; returns the names that got slower than tolerance allows."""
+    regressions = []
+    print(f"\n{'benchmark':<38}{'baseline/s':>14}{'current/s':>14}{'change':>9}")
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or not before.get("per_second"):
+            print(f"{name:<38}{'-':>14}{result['per_second']:>14,.0f}{'new':>9}")
+            continue
+        change = result["per_second"] / before["per_second"] - 1
+        flag = ""
+        if change < -tolerance:
+            regressions.append(name)
+            flag = "  SLOWER"
+        print(f"{name:<38}{before['per_second']:>14,.0f}{result['per_second']:>14,.0f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite on a synthetic chain and compare "
+                                                 "the throughput with a saved baseline.")
+    parser.add_argument("--blocks", type=int, default=200, help="Blocks in the synthetic chain (default: 200).")
+    parser.add_argument("--transactions", type=int, default=50, help="Spends per block (default: 50).")
+    parser.add_argument("--seed", type=int, default=0, help="Chain seed (default: 0).")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark; the best counts (default: 5).")
+    parser.add_argument("--latency", type=float, default=0.001,
+                        help="Seconds the mock node adds to every request (default: 0.001).")
+    parser.add_argument("--workers", type=int, help="Worker processes for the scans that use them.")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these benchmarks.")
+    parser.add_argument("--report", default="benchmark_report.json",
+                        help="JSON report to write (default: benchmark_report.json).")
+    parser.add_argument("--baseline", help="Earlier report to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Allowed slowdown against the baseline before it counts as a regression (default: 0.1).")
+    parser.add_argument("--save-baseline", help="Also write the report to this file, as the new baseline.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    chain = SyntheticChain(args.blocks, args.transactions, args.seed)
+    print(f"Synthetic chain: {len(chain)} blocks, {len(chain.raw_transactions):,} transactions "
+          f"({', '.join(f'{count} {kind}' for kind, count in chain.kinds.items())}), "
+          f"built in {time.perf_counter() - start:.1f}s")
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        results[name] = result = run_benchmark(name, chain, args)
+        print(f"{name:<38}{result['items']:>10,} {result['unit']:<11}{result['best_seconds']:>8.3f}s "
+              f"{result['per_second']:>14,.0f} {result['unit']}/s")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "chain": {"blocks": args.blocks, "transactions_per_block": args.transactions, "seed": args.seed,
+                  "kinds": chain.kinds},
+        "repeat": args.repeat,
+        "latency": args.latency,
+        "results": results,
+    }
+    for path in filter(None, (args.report, args.save_baseline)):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(f"Report written to {args.report}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get("chain", {}).get("blocks") != args.blocks or \
+                baseline.get("chain", {}).get("transactions_per_block") != args.transactions:
+            print("Warning: the baseline was measured on a different chain size")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmarks slower than the baseline by more than {args.tolerance:.0%}: "
+                  f"{', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
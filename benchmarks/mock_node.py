@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Local mock bitcoind serving a synthetic chain over JSON-RPC
+Author: https://github.com/8891689
+
+Answers getblockcount, getbestblockhash, getblockhash, getblock (verbosity
+0, 1 and 2) and getrawtransaction (raw or verbose) for a SyntheticChain,
+including JSON-RPC batch arrays. latency seconds are added to every HTTP
+request, to model a node on another machine or a busy one. Unknown methods,
+heights and txids get the error codes bitcoind uses. With auth set to
+(user, password), requests without those credentials are refused with an
+empty HTTP 401, like bitcoind does.
+
+Used in-process by the benchmarks, or on its own for manual runs:
+python -m benchmarks.mock_node --port 18443 --blocks 500 --latency 0.005
+python3 extract_data.py 0 499 out.txt   (with RPC_PORT set to 18443)
+"""
+import argparse
+import base64
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from benchmarks.synthetic_chain import SyntheticChain
+from block_parser import parse_transaction
+from script_parser import ByteReader
+
+
+class RPCError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class MockNode:
+    """A JSON-RPC server for chain on 127.0.0.1 (port 0: any free port), running in a background thread."""
+    def __init__(self, chain: SyntheticChain, latency: float = 0.0, port: int = 0, auth=None):
+        self.chain = chain
+        self.latency = latency
+        self.authorization = None if auth is None else \
+            'Basic ' + base64.b64encode(':'.join(auth).encode()).decode()
+        self.calls = {}
+        self._lock = threading.Lock()
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if node.authorization and self.headers.get('Authorization') != node.authorization:
+                    self.send_response(401)
+                    self.send_header('WWW-Authenticate', 'Basic realm="jsonrpc"')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if node.latency:
+                    time.sleep(node.latency)
+                if isinstance(request, list):
+                    response = [node.handle(call) for call in request]
+                else:
+                    response = node.handle(request)
+                data = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def handle(self, call: dict) -> dict:
+        method, params = call.get('method'), call.get('params') or []
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        try:
+            handler = getattr(self, 'rpc_' + str(method), None)
+            if handler is None:
+                raise RPCError(-32601, "Method not found")
+            return {'result': handler(*params), 'error': None, 'id': call.get('id')}
+        except RPCError as e:
+            return {'result': None, 'error': {'code': e.code, 'message': str(e)}, 'id': call.get('id')}
+        except (TypeError, ValueError) as e:
+            return {'result': None, 'error': {'code': -1, 'message': str(e)}, 'id': call.get('id')}
+
+    def rpc_getblockcount(self):
+        return len(self.chain) - 1
+
+    def rpc_getbestblockhash(self):
+        return self.chain.hashes[-1]
+
+    def rpc_getblockhash(self, height):
+        if not 0 <= height < len(self.chain):
+            raise RPCError(-8, "Block height out of range")
+        return self.chain.hashes[height]
+
+    def rpc_getblock(self, block_hash, verbosity=1):
+        if block_hash not in self.chain.raw_blocks:
+            raise RPCError(-5, "Block not found")
+        if verbosity == 0:
+            return self.chain.raw_blocks[block_hash].hex()
+        return self.chain.verbose_block(block_hash, verbosity)
+
+    def rpc_getrawtransaction(self, txid, verbose=False, block_hash=None):
+        raw_tx = self.chain.raw_transactions.get(txid)
+        if raw_tx is None:
+            raise RPCError(-5, "No such mempool or blockchain transaction")
+        if not verbose:
+            return raw_tx.hex()
+        decoded = self.chain.decode_transaction(parse_transaction(ByteReader(raw_tx)))
+        decoded['hex'] = raw_tx.hex()
+        return decoded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic chain over JSON-RPC like bitcoind.")
+    parser.add_argument("--port", type=int, default=18443, help="Port to listen on (default: 18443).")
+    parser.add_argument("--blocks", type=int, default=500, help="Blocks in the chain (default: 500).")
+    parser.add_argument("--transactions", type=int, default=50, help="Spends per block (default: 50).")
+    parser.add_argument("--seed", type=int, default=0, help="Chain seed (default: 0).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request (default: 0).")
+    args = parser.parse_args()
+
+    chain = SyntheticChain(args.blocks, args.transactions, args.seed)
+    node = MockNode(chain, args.latency, args.port)
+    print(f"Serving {len(chain)} blocks at {node.url} (Ctrl+C to stop)")
+    try:
+        node.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
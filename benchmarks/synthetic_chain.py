@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Deterministic synthetic block chain for benchmarks
+Author: https://github.com/8891689
+
+Builds a chain of serialized blocks from a seed. Each block has a coinbase
+that funds later blocks, followed by a mix of spends:
+
+    p2pkh          legacy P2PKH spends with one or two inputs
+    p2sh_multisig  2-of-3 P2SH multisig spends (two signatures per input)
+    p2wpkh         native SegWit spends (signature and key in the witness)
+    large          legacy P2PKH spends with many inputs
+
+Signatures are random but well-formed DER with SIGHASH_ALL, so every parser
+and sighash path runs as it does on mainnet; they do not verify. A small
+share of R values is reused on purpose, so the duplicate finders have
+something to find. The same arguments always produce the same chain, with
+the same block hashes and txids.
+"""
+import random
+
+from block_parser import double_sha256, parse_block, parse_transaction, is_coinbase
+from prevouts import DictPrevoutProvider
+from script_parser import ByteReader, iter_pushes
+from sighash import encode_varint, hash160
+
+TRANSACTION_KINDS = ("p2pkh", "p2sh_multisig", "p2wpkh", "large")
+DEFAULT_MIX = {"p2pkh": 0.5, "p2sh_multisig": 0.15, "p2wpkh": 0.3, "large": 0.05}
+COIN = 100000000
+
+
+def der_integer(value: bytes) -> bytes:
+    """Minimal DER encoding of a 32-byte big-endian integer."""
+    value = value.lstrip(b'\x00') or b'\x00'
+    if value[0] & 0x80:
+        value = b'\x00' + value
+    return b'\x02' + bytes((len(value),)) + value
+
+
+def der_signature(r: bytes, s: bytes, sighash: int = 1) -> bytes:
+    body = der_integer(r) + der_integer(s)
+    return b'\x30' + bytes((len(body),)) + body + bytes((sighash,))
+
+
+def push(data: bytes) -> bytes:
+    """A minimal push of up to 255 bytes."""
+    return (bytes((len(data),)) if len(data) < 0x4c else b'\x4c' + bytes((len(data),))) + data
+
+
+def script_asm(script) -> str:
+    """A simplified asm rendering in the style of bitcoind: pushes as hex, signatures with [ALL]."""
+    parts = []
+    for opcode, data in iter_pushes(script):
+        if data is None:
+            parts.append(str(opcode - 0x50) if 0x51 <= opcode <= 0x60 else f"OP_{opcode:#04x}")
+        elif not len(data):
+            parts.append("0")
+        elif data[0] == 0x30 and data[-1] == 1 and len(data) > 8:
+            parts.append(bytes(data[:-1]).hex() + "[ALL]")
+        else:
+            parts.append(bytes(data).hex())
+    return " ".join(parts)
+
+
+class SyntheticChain:
+    """
+    blocks blocks of transactions_per_block spends each (after block 0,
+    which only has its coinbase). mix weighs the TRANSACTION_KINDS,
+    large_inputs is the input count of a large spend, and r_reuse is the
+    share of signatures that repeat an earlier R value.
+    """
+    def __init__(self, blocks: int = 100, transactions_per_block: int = 20, seed: int = 0, mix: dict = None,
+                 large_inputs: int = 100, r_reuse: float = 0.001):
+        self.rng = random.Random(seed)
+        self.mix = dict(DEFAULT_MIX if mix is None else mix)
+        self.large_inputs = large_inputs
+        self.r_reuse = r_reuse
+        self.hashes = []
+        self.heights = {}
+        self.raw_blocks = {}
+        self.raw_transactions = {}
+        self.kinds = {kind: 0 for kind in TRANSACTION_KINDS}
+        self._unspent = {"p2pkh": [], "p2sh_multisig": [], "p2wpkh": []}
+        self._r_values = []
+        for height in range(blocks):
+            self._add_block(height, transactions_per_block if height else 0)
+
+    # Keys and scripts
+
+    def _pubkey(self) -> bytes:
+        return bytes((2 + self.rng.getrandbits(1),)) + self.rng.randbytes(32)
+
+    def _new_output(self, kind: str):
+        """Returns (script_pubkey, key) for a fresh output of kind; key is what the spend needs."""
+        if kind == "p2sh_multisig":
+            redeem_script = b'\x52' + b''.join(push(self._pubkey()) for _ in range(3)) + b'\x53\xae'
+            return b'\xa9\x14' + hash160(redeem_script) + b'\x87', redeem_script
+        pubkey = self._pubkey()
+        if kind == "p2wpkh":
+            return b'\x00\x14' + hash160(pubkey), pubkey
+        return b'\x76\xa9\x14' + hash160(pubkey) + b'\x88\xac', pubkey
+
+    def _signature(self) -> bytes:
+        if self._r_values and self.rng.random() < self.r_reuse:
+            r = self.rng.choice(self._r_values)
+        else:
+            r = self.rng.randbytes(32)
+            if len(self._r_values) < 4096:
+                self._r_values.append(r)
+        return der_signature(r, self.rng.randbytes(32))
+
+    # Transactions
+
+    def _serialize(self, inputs, outputs, witnesses=None) -> bytes:
+        """inputs: (prev txid bytes, index, script_sig); outputs: (value, script_pubkey)."""
+        body = encode_varint(len(inputs)) + b''.join(
+            prev_txid + index.to_bytes(4, 'little') + encode_varint(len(script)) + script + b'\xff\xff\xff\xff'
+            for prev_txid, index, script in inputs)
+        body += encode_varint(len(outputs)) + b''.join(
+            value.to_bytes(8, 'little') + encode_varint(len(script)) + script for value, script in outputs)
+        version, locktime = (2).to_bytes(4, 'little'), bytes(4)
+        if witnesses is None:
+            return version + body + locktime
+        witness = b''.join(encode_varint(len(items)) + b''.join(encode_varint(len(item)) + item for item in items)
+                           for items in witnesses)
+        return version + b'\x00\x01' + body + witness + locktime
+
+    def _register(self, raw_tx: bytes) -> str:
+        txid = parse_transaction(ByteReader(raw_tx))["txid"]
+        self.raw_transactions[txid] = raw_tx
+        return txid
+
+    def _coinbase(self, height: int, funding: int):
+        outputs, keys = [], []
+        kinds = [self._spend_kind() for _ in range(funding)]
+        for kind in kinds:
+            kind = "p2pkh" if kind == "large" else kind
+            script, key = self._new_output(kind)
+            outputs.append((50 * COIN // funding, script))
+            keys.append((kind, key))
+        script_sig = push(height.to_bytes(4, 'little')) + push(self.rng.randbytes(8))
+        raw_tx = self._serialize([(bytes(32), 0xffffffff, script_sig)], outputs)
+        return raw_tx, list(zip(keys, outputs))
+
+    def _spend_kind(self) -> str:
+        return self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+
+    def _spend(self, kind: str):
+        """Builds a spend of kind from the unspent outputs, or returns None when there are none."""
+        pool_kind = "p2pkh" if kind == "large" else kind
+        pool = self._unspent[pool_kind]
+        wanted = self.large_inputs if kind == "large" else self.rng.choice((1, 1, 1, 2))
+        if len(pool) < wanted:
+            if kind != "large" or len(pool) < 2:
+                return None
+            wanted = len(pool)
+        spent = [pool.pop(self.rng.randrange(len(pool))) for _ in range(wanted)]
+
+        inputs, witnesses = [], []
+        for prev_txid, index, value, key in spent:
+            if pool_kind == "p2sh_multisig":
+                script_sig = b'\x00' + push(self._signature()) + push(self._signature()) + push(key)
+            elif pool_kind == "p2wpkh":
+                script_sig = b''
+                witnesses.append([self._signature(), key])
+            else:
+                script_sig = push(self._signature()) + push(key)
+            inputs.append((bytes.fromhex(prev_txid)[::-1], index, script_sig))
+
+        total = sum(entry[2] for entry in spent) - 1000
+        outputs, keys = [], []
+        for _ in range(2):
+            output_kind = self._spend_kind()
+            output_kind = "p2pkh" if output_kind == "large" else output_kind
+            script, output_key = self._new_output(output_kind)
+            outputs.append((max(total // 2, 546), script))
+            keys.append((output_kind, output_key))
+        raw_tx = self._serialize(inputs, outputs, witnesses if pool_kind == "p2wpkh" else None)
+        self.kinds[kind] += 1
+        return raw_tx, list(zip(keys, outputs))
+
+    # Blocks
+
+    def _add_block(self, height: int, spends: int):
+        transactions = []
+        created = []
+        coinbase, coinbase_outputs = self._coinbase(height, spends + 8)
+        transactions.append(coinbase)
+        created.append((coinbase, coinbase_outputs))
+        for _ in range(spends):
+            kind = self._spend_kind()
+            built = self._spend(kind) or (self._spend("p2pkh") if kind != "p2pkh" else None)
+            if built is None:
+                continue
+            transactions.append(built[0])
+            created.append(built)
+
+        txids = []
+        for raw_tx, outputs in created:
+            txid = self._register(raw_tx)
+            txids.append(txid)
+            # Outputs become spendable from the next block on
+            for index, ((kind, key), (value, _)) in enumerate(outputs):
+                self._unspent[kind].append((txid, index, value, key))
+
+        previous = bytes.fromhex(self.hashes[-1])[::-1] if self.hashes else bytes(32)
+        header = ((0x20000000).to_bytes(4, 'little') + previous + self._merkle_root(txids)
+                  + (1600000000 + height * 600).to_bytes(4, 'little') + (0x1d00ffff).to_bytes(4, 'little')
+                  + self.rng.getrandbits(32).to_bytes(4, 'little'))
+        block_hash = double_sha256(header)[::-1].hex()
+        self.hashes.append(block_hash)
+        self.heights[block_hash] = height
+        self.raw_blocks[block_hash] = header + encode_varint(len(transactions)) + b''.join(transactions)
+
+    @staticmethod
+    def _merkle_root(txids) -> bytes:
+        level = [bytes.fromhex(txid)[::-1] for txid in txids]
+        while len(level) > 1:
+            if len(level) % 2:
+                level.append(level[-1])
+            level = [double_sha256(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+        return level[0]
+
+    # Views used by the benchmarks and the mock node
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def raw_block(self, height: int) -> bytes:
+        return self.raw_blocks[self.hashes[height]]
+
+    def verbose_block(self, block_hash: str, verbosity: int = 2) -> dict:
+        """The block as getblock returns it at verbosity 1 (txids) or 2 (decoded transactions)."""
+        height = self.heights[block_hash]
+        raw = self.raw_blocks[block_hash]
+        block = parse_block(raw)
+        result = {
+            "hash": block_hash,
+            "height": height,
+            "confirmations": len(self.hashes) - height,
+            "size": len(raw),
+            "nTx": len(block["tx"]),
+            "previousblockhash": self.hashes[height - 1] if height else None,
+            "tx": [tx["txid"] for tx in block["tx"]] if verbosity == 1 else
+                  [self.decode_transaction(tx) for tx in block["tx"]],
+        }
+        if height + 1 < len(self.hashes):
+            result["nextblockhash"] = self.hashes[height + 1]
+        return result
+
+    @staticmethod
+    def decode_transaction(tx: dict) -> dict:
+        """A parsed transaction in the decoded form of getrawtransaction verbose / getblock verbosity 2."""
+        vin = []
+        for tx_input in tx["vin"]:
+            if is_coinbase(tx):
+                vin.append({"coinbase": bytes(tx_input["script_sig"]).hex(), "sequence": tx_input["sequence"]})
+                continue
+            entry = {"txid": bytes(tx_input["prev_txid"])[::-1].hex(), "vout": tx_input["prev_index"],
+                     "scriptSig": {"asm": script_asm(tx_input["script_sig"]),
+                                   "hex": bytes(tx_input["script_sig"]).hex()},
+                     "sequence": tx_input["sequence"]}
+            if tx_input["witness"]:
+                entry["txinwitness"] = [bytes(item).hex() for item in tx_input["witness"]]
+            vin.append(entry)
+        vout = [{"value": output["value"] / COIN, "n": index,
+                 "scriptPubKey": {"hex": bytes(output["script_pubkey"]).hex()}}
+                for index, output in enumerate(tx["vout"])]
+        return {"txid": tx["txid"], "hash": tx["txid"], "version": tx["version"], "locktime": tx["locktime"],
+                "vin": vin, "vout": vout}
+
+    def decoded_transactions(self) -> list:
+        """Every non-coinbase transaction of the chain in decoded form."""
+        return [self.decode_transaction(tx) for block_hash in self.hashes
+                for tx in parse_block(self.raw_blocks[block_hash])["tx"] if not is_coinbase(tx)]
+
+    def spending_transactions(self) -> list:
+        """The raw bytes of every non-coinbase transaction, in chain order."""
+        return [bytes(self.raw_transactions[tx["txid"]]) for block_hash in self.hashes
+                for tx in parse_block(self.raw_blocks[block_hash])["tx"] if not is_coinbase(tx)]
+
+    def prevout_provider(self) -> DictPrevoutProvider:
+        """A provider that knows every output of the chain."""
+        provider = DictPrevoutProvider()
+        for raw_tx in self.raw_transactions.values():
+            provider.add_transaction(raw_tx)
+        return provider
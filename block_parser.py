@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming parser for raw serialized blocks (getblock verbosity 0)
+Author: https://github.com/8891689
+"""
+import hashlib
+
+from script_parser import ByteReader
+
+COINBASE_PREV_TXID = b'\x00' * 32
+COINBASE_PREV_INDEX = 0xffffffff
+
+
+def double_sha256(*parts) -> bytes:
+    """Computes the double SHA-256 digest of one or more consecutive byte buffers."""
+    first = hashlib.sha256()
+    for part in parts:
+        first.update(part)
+    return hashlib.sha256(first.digest()).digest()
+
+
+def parse_transaction(stream: ByteReader) -> dict:
+    """
+    Parses one transaction from the stream. Scripts, hashes and witness items
+    are memoryview slices of the underlying block buffer.
+
+    The txid is computed locally from the non-witness serialization, so it
+    matches the txid bitcoind reports for both legacy and SegWit transactions.
+    """
+    tx_start = stream.tell()
+    version = stream.read(4)
+
+    is_segwit = stream.peek(2) == b'\x00\x01'
+    if is_segwit:
+        stream.seek(stream.tell() + 2)
+    body_start = stream.tell()
+
+    inputs = []
+    for _ in range(stream.read_varint()):
+        prev_txid = stream.read(32)
+        prev_index = stream.read_uint(4)
+        script_sig = stream.read(stream.read_varint())
+        sequence = stream.read_uint(4)
+        inputs.append({
+            "prev_txid": prev_txid,
+            "prev_index": prev_index,
+            "script_sig": script_sig,
+            "sequence": sequence,
+            "witness": []
+        })
+
+    outputs = []
+    for _ in range(stream.read_varint()):
+        value = stream.read_uint(8)
+        script_pubkey = stream.read(stream.read_varint())
+        outputs.append({"value": value, "script_pubkey": script_pubkey})
+    body_end = stream.tell()
+
+    if is_segwit:
+        for tx_input in inputs:
+            for _ in range(stream.read_varint()):
+                tx_input["witness"].append(stream.read(stream.read_varint()))
+
+    locktime = stream.read(4)
+    tx_end = stream.tell()
+
+    if is_segwit:
+        txid = double_sha256(version, stream.slice(body_start, body_end), locktime)
+    else:
+        txid = double_sha256(stream.slice(tx_start, tx_end))
+
+    return {
+        "txid": txid[::-1].hex(),
+        "version": int.from_bytes(version, 'little'),
+        "vin": inputs,
+        "vout": outputs,
+        "locktime": int.from_bytes(locktime, 'little'),
+        "is_segwit": is_segwit
+    }
+
+
+def parse_block(raw_block_hex) -> dict:
+    """Parses a raw serialized block, given as hex or bytes, into its header hash and transactions."""
+    stream = ByteReader(raw_block_hex)
+    header = stream.read(80)
+    tx_count = stream.read_varint()
+    return {
+        "hash": double_sha256(header)[::-1].hex(),
+        "tx": [parse_transaction(stream) for _ in range(tx_count)]
+    }
+
+
+def is_coinbase(tx: dict) -> bool:
+    first_input = tx["vin"][0] if tx["vin"] else None
+    return (first_input is not None
+            and first_input["prev_txid"] == COINBASE_PREV_TXID
+            and first_input["prev_index"] == COINBASE_PREV_INDEX)
@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""
+Lease-Based Work Partitioning for Scans on Several Hosts
+Author: https://github.com/8891689
+
+A height range is cut into fixed-size work units, kept in a shared
+directory (a local disk for several processes on one machine, or an NFS
+or SMB share for several hosts, each with its own node). Workers take
+units by lease, scan them with extract_data.main into a shard of their own,
+and mark them done. merge stitches the shards in height order.
+
+Layout of the work directory:
+  plan.json                 range and unit size
+  leases/<unit>.<n>         lease number n of a unit: worker and expiry
+  shards/<unit>.<worker>.txt(.checkpoint)   a worker's output for a unit
+  done/<unit>.json          the shard that completed the unit
+
+A unit's current lease is the one with the highest number. Taking a unit
+means creating the next number with O_EXCL, which only one worker can do,
+and is only allowed when the current lease has expired or was released.
+The owner renews its lease while it scans. A worker that stops renewing
+(crashed, lost its node, or its host went away) loses the unit when the
+lease expires, and another worker scans it again into its own shard. The
+first shard that completes a unit claims done/<unit>.json, again with
+O_EXCL, so a slow former owner finishing late never replaces it. Expiry
+compares wall-clock times, so the hosts' clocks must roughly agree.
+
+merge checks that every unit is done, that the units cover the range
+without gaps or overlaps, and that each shard's checkpoint ends exactly at
+its unit's last height with no failed blocks, before writing the output.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import sys
+import threading
+import time
+
+DEFAULT_UNIT_SIZE = 1000
+DEFAULT_LEASE_SECONDS = 300
+
+
+def unit_name(start: int, end: int) -> str:
+    return f"{start:09d}-{end:09d}"
+
+
+def _write_json(path: str, data: dict, exclusive: bool = False) -> bool:
+    """Writes data atomically; with exclusive, only if path does not exist yet. Returns False if it did."""
+    if exclusive:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        return True
+    tmp_file = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_file, path)
+    return True
+
+
+def _read_json(path: str):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        # Missing, or an exclusive create whose content is not written yet
+        return None
+
+
+class WorkQueue:
+    """The work units of a shared directory, created with plan() or opened after it."""
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.plan = _read_json(os.path.join(directory, 'plan.json'))
+        if self.plan is None:
+            raise FileNotFoundError(f"No work plan in {directory}; create one with the plan command.")
+        self.units = [tuple(unit) for unit in self.plan['units']]
+
+    @classmethod
+    def plan(cls, directory: str, start_block: int, end_block: int, unit_size: int = DEFAULT_UNIT_SIZE):
+        """Cuts start_block..end_block into units of unit_size heights and creates the directory."""
+        if start_block < 0 or end_block < start_block or unit_size < 1:
+            raise ValueError("Invalid block range or unit size")
+        for name in ('leases', 'shards', 'done'):
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+        units = [[low, min(low + unit_size - 1, end_block)] for low in range(start_block, end_block + 1, unit_size)]
+        plan = {'start': start_block, 'end': end_block, 'unit_size': unit_size, 'units': units}
+        if not _write_json(os.path.join(directory, 'plan.json'), plan, exclusive=True):
+            existing = _read_json(os.path.join(directory, 'plan.json'))
+            if existing != plan:
+                raise FileExistsError(f"{directory} already holds a different plan")
+        return cls(directory)
+
+    def _path(self, *parts) -> str:
+        return os.path.join(self.directory, *parts)
+
+    def done(self, unit) -> dict:
+        return _read_json(self._path('done', unit_name(*unit) + '.json'))
+
+    def current_lease(self, unit):
+        """Returns (number, lease) of the unit's newest lease, or (0, None)."""
+        prefix = unit_name(*unit) + '.'
+        numbers = [int(name[len(prefix):]) for name in os.listdir(self._path('leases'))
+                   if name.startswith(prefix) and name[len(prefix):].isdigit()]
+        if not numbers:
+            return 0, None
+        number = max(numbers)
+        lease = _read_json(self._path('leases', prefix + str(number)))
+        # A lease being created right now counts as taken
+        return number, lease if lease is not None else {'worker': None, 'expires': time.time() + 1}
+
+    def take(self, worker: str, lease_seconds: float):
+        """Leases the first unit that is neither done nor validly leased. Returns (unit, number) or None."""
+        for unit in self.units:
+            if self.done(unit) is not None:
+                continue
+            number, lease = self.current_lease(unit)
+            if lease is not None and lease['expires'] > time.time():
+                continue
+            lease = {'worker': worker, 'expires': time.time() + lease_seconds, 'taken': time.time()}
+            if _write_json(self._path('leases', f"{unit_name(*unit)}.{number + 1}"), lease, exclusive=True):
+                return unit, number + 1
+        return None
+
+    def renew(self, unit, number: int, worker: str, lease_seconds: float) -> bool:
+        """Extends a lease; returns False if the unit was taken over since."""
+        if self.current_lease(unit)[0] != number:
+            return False
+        _write_json(self._path('leases', f"{unit_name(*unit)}.{number}"),
+                    {'worker': worker, 'expires': time.time() + lease_seconds, 'taken': time.time()})
+        return True
+
+    def release(self, unit, number: int, worker: str):
+        """Gives a lease back early, so any worker can take the unit right away."""
+        if self.current_lease(unit)[0] == number:
+            _write_json(self._path('leases', f"{unit_name(*unit)}.{number}"), {'worker': worker, 'expires': 0})
+
+    def shard_path(self, unit, worker: str) -> str:
+        return self._path('shards', f"{unit_name(*unit)}.{worker}.txt")
+
+    def complete(self, unit, worker: str) -> bool:
+        """
+        Marks the unit done with the worker's shard, if its checkpoint ends at
+        the unit's last height without failed blocks. Returns False if the
+        shard is incomplete or another shard completed the unit first.
+        """
+        shard = self.shard_path(unit, worker)
+        checkpoint = _read_json(shard + '.checkpoint')
+        if not checkpoint or checkpoint.get('height') != unit[1] or checkpoint.get('failed'):
+            return False
+        return _write_json(self._path('done', unit_name(*unit) + '.json'),
+                           {'worker': worker, 'shard': os.path.basename(shard), 'offset': checkpoint['offset'],
+                            'finished': time.time()}, exclusive=True)
+
+    def status(self) -> dict:
+        """Counts of done, leased and open units, and the units leased per worker."""
+        counts = {'done': 0, 'leased': 0, 'open': 0}
+        workers = {}
+        now = time.time()
+        for unit in self.units:
+            if self.done(unit) is not None:
+                counts['done'] += 1
+                continue
+            _, lease = self.current_lease(unit)
+            if lease is not None and lease['expires'] > now:
+                counts['leased'] += 1
+                workers.setdefault(lease['worker'], []).append(unit_name(*unit))
+            else:
+                counts['open'] += 1
+        return {'units': len(self.units), **counts, 'workers': workers}
+
+    def verify(self) -> list:
+        """Returns (unit, shard path) in height order, or raises ValueError on a gap, overlap or bad shard."""
+        shards = []
+        expected = self.plan['start']
+        for unit in self.units:
+            if unit[0] != expected:
+                raise ValueError(f"Units {unit_name(*unit)} and the previous one leave a gap or overlap "
+                                 f"(expected a unit starting at {expected})")
+            expected = unit[1] + 1
+            done = self.done(unit)
+            if done is None:
+                raise ValueError(f"Unit {unit_name(*unit)} is not done yet")
+            shard = self._path('shards', done['shard'])
+            checkpoint = _read_json(shard + '.checkpoint')
+            if not checkpoint or checkpoint.get('height') != unit[1] or checkpoint.get('failed'):
+                raise ValueError(f"The shard {done['shard']} does not end at block {unit[1]}")
+            if not os.path.exists(shard) or os.path.getsize(shard) != checkpoint['offset']:
+                raise ValueError(f"The shard {done['shard']} does not match its checkpoint")
+            shards.append((unit, shard))
+        if expected != self.plan['end'] + 1:
+            raise ValueError(f"The units end at block {expected - 1} instead of {self.plan['end']}")
+        return shards
+
+    def merge(self, output_file: str) -> int:
+        """Verifies the shards and concatenates them in height order into output_file. Returns its size."""
+        shards = self.verify()
+        tmp_file = output_file + '.tmp'
+        with open(tmp_file, 'wb') as out:
+            for _, shard in shards:
+                with open(shard, 'rb') as f:
+                    shutil.copyfileobj(f, out, 1 << 20)
+        os.replace(tmp_file, output_file)
+        return os.path.getsize(output_file)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def run_worker(directory: str, worker: str = None, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+               poll_interval: float = None, rpc_url: str = None, **scan_options) -> int:
+    """
+    Takes and scans units until every unit is done. While other workers
+    hold the remaining leases, it waits, so the units of a worker that died
+    are picked up once their leases expire. Returns the number of units
+    this worker completed.
+    """
+    import extract_data
+    queue = WorkQueue(directory)
+    worker = worker or default_worker_id()
+    poll_interval = poll_interval or max(1.0, lease_seconds / 10)
+    if rpc_url:
+        extract_data.rpc_client.url = rpc_url
+    completed = 0
+    while True:
+        taken = queue.take(worker, lease_seconds)
+        if taken is None:
+            status = queue.status()
+            if status['done'] == status['units']:
+                return completed
+            time.sleep(poll_interval)
+            continue
+        unit, number = taken
+        print(f"{worker}: scanning unit {unit_name(*unit)} (lease {number})")
+        lost = threading.Event()
+        stop = threading.Event()
+
+        def heartbeat():
+            # Renews at a third of the lease time, so one missed renewal does not lose the unit
+            while not stop.wait(lease_seconds / 3):
+                if not queue.renew(unit, number, worker, lease_seconds):
+                    lost.set()
+                    return
+
+        renewer = threading.Thread(target=heartbeat, daemon=True)
+        renewer.start()
+        try:
+            # A lost lease stops the scan at the next block; the new holder rescans the unit anyway
+            extract_data.main(unit[0], unit[1], queue.shard_path(unit, worker), exit_on_error=False,
+                              stop_event=lost, **scan_options)
+        except BaseException as e:
+            stop.set()
+            renewer.join()
+            # Handed back at once, instead of after the lease expires
+            print(f"{worker}: unit {unit_name(*unit)} failed ({e!r}), releasing it")
+            if not lost.is_set():
+                queue.release(unit, number, worker)
+            raise
+        finally:
+            stop.set()
+            renewer.join()
+        if queue.complete(unit, worker):
+            completed += 1
+            print(f"{worker}: unit {unit_name(*unit)} done")
+        elif lost.is_set():
+            print(f"{worker}: unit {unit_name(*unit)} was taken over after the lease expired")
+        else:
+            print(f"{worker}: unit {unit_name(*unit)} is incomplete or was completed elsewhere, releasing it")
+            queue.release(unit, number, worker)
+
+
+def _local_worker(directory, worker, lease_seconds, rpc_url, scan_options):
+    return run_worker(directory, worker, lease_seconds, rpc_url=rpc_url, **scan_options)
+
+
+def setup_arg_parser():
+    """Sets up the command-line argument parser."""
+    parser = argparse.ArgumentParser(description="Split a block range into leased work units for several "
+                                                 "scanner processes or hosts, and merge their output.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    plan_parser = subparsers.add_parser("plan", help="Create the work units of a range in a shared directory.")
+    plan_parser.add_argument("work_dir", help="Shared work directory.")
+    plan_parser.add_argument("start_block", type=int, help="First block height.")
+    plan_parser.add_argument("end_block", type=int, help="Last block height.")
+    plan_parser.add_argument("--unit-size", type=int, default=DEFAULT_UNIT_SIZE,
+                             help=f"Heights per work unit (default: {DEFAULT_UNIT_SIZE}).")
+    work_parser = subparsers.add_parser("work", help="Take and scan units until every unit is done.")
+    work_parser.add_argument("work_dir", help="Shared work directory.")
+    work_parser.add_argument("--worker-id", help="Name of this worker (default: <hostname>-<pid>).")
+    work_parser.add_argument("--processes", type=int, default=1,
+                             help="Worker processes to start on this machine, each taking its own units (default: 1).")
+    work_parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                             help=f"Lease time; a unit not renewed for this long is reassigned "
+                                  f"(default: {DEFAULT_LEASE_SECONDS}).")
+    work_parser.add_argument("--rpc-url", help="RPC URL of this host's node (default: extract_data.RPC_URL).")
+    work_parser.add_argument("--batch-size", type=int, default=100, help="Block hashes per batch (default: 100).")
+    work_parser.add_argument("--in-flight", type=int, default=8, help="Concurrent getblock requests (default: 8).")
+    work_parser.add_argument("--raw-blocks", action="store_true", help="Fetch and parse raw blocks.")
+    work_parser.add_argument("--with-z", action="store_true", help="Also compute the z value of each signature.")
+    status_parser = subparsers.add_parser("status", help="Show how many units are done, leased and open.")
+    status_parser.add_argument("work_dir", help="Shared work directory.")
+    merge_parser = subparsers.add_parser("merge", help="Verify the shards and stitch them in height order.")
+    merge_parser.add_argument("work_dir", help="Shared work directory.")
+    merge_parser.add_argument("output_file", help="Merged output file.")
+    return parser
+
+
+def main():
+    args = setup_arg_parser().parse_args()
+    if args.command == "plan":
+        queue = WorkQueue.plan(args.work_dir, args.start_block, args.end_block, args.unit_size)
+        print(f"{len(queue.units)} units of up to {args.unit_size} blocks in {args.work_dir}")
+    elif args.command == "work":
+        scan_options = dict(batch_size=args.batch_size, in_flight=args.in_flight, raw_blocks=args.raw_blocks,
+                            with_z=args.with_z)
+        if args.processes > 1:
+            base = args.worker_id or default_worker_id()
+            processes = [multiprocessing.Process(target=_local_worker,
+                                                 args=(args.work_dir, f"{base}-{index}", args.lease_seconds,
+                                                       args.rpc_url, scan_options))
+                         for index in range(args.processes)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        else:
+            completed = run_worker(args.work_dir, args.worker_id, args.lease_seconds, rpc_url=args.rpc_url,
+                                   **scan_options)
+            print(f"All units are done; this worker completed {completed}.")
+    elif args.command == "status":
+        status = WorkQueue(args.work_dir).status()
+        print(f"{status['units']} units: {status['done']} done, {status['leased']} leased, {status['open']} open")
+        for worker, units in sorted(status['workers'].items()):
+            print(f"  {worker}: {', '.join(units)}")
+    elif args.command == "merge":
+        try:
+            size = WorkQueue(args.work_dir).merge(args.output_file)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(f"Merged {args.output_file} ({size:,} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,531 @@
+# -*- coding: utf-8 -*-
+"""
+Out-of-Core Duplicate R Detection
+Author: https://github.com/8891689
+
+Two passes over a process pool:
+
+1. Scan: input files are memory-mapped and split into chunks at line
+   boundaries. Each worker runs a compiled bytes pattern over its chunk,
+   lowercases the 64-digit R values, sorts them and writes
+   them to a shard file of fixed-width records.
+2. Count: the R value space is cut into ranges small enough to count in
+   the memory budget. Each worker reads one range from every shard (a
+   binary search, since shards are sorted) and counts it.
+
+A value always falls into the same range, so the counts are exact across
+all input files, while memory stays bounded by one chunk or one range per
+worker. Binary signature files (sigfile.py) are read chunk by chunk from
+their R column instead of being searched with the pattern.
+
+find_duplicate_groups runs the same passes with the source of every value
+appended to its shard record (file, byte offset, record number). The count
+pass then groups the records of each range instead of counting them, and
+only the offsets of colliding values are read back to recover their txid,
+input index, pubkey, S and Z. No input file is rescanned.
+
+find_duplicates_approximate is a lighter two-pass sweep: a Bloom filter
+flags every value that may have been seen before, and only those candidates
+are counted exactly in a second pass.
+"""
+import itertools
+import math
+import mmap
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+from multiprocessing import Pool
+
+from sigfile import SigFileReader, SigChunk, is_signature_file
+
+# Every text format the project writes: 'Signature - R: <hex>' (extract_data.py, extract_blk.py,
+# whose R keeps the DER 00 pad byte), 'R : <hex>' (the C++ tools) and 'R:<hex>'.
+# R values shorter than 32 bytes (a leading zero byte, as in the reused R of k = 1/2) are matched too;
+# normalize_r_values brings every match to 64 digits like r_index.normalize_r.
+R_PATTERN = re.compile(rb'(?<![0-9A-Za-z_])R ?: ?([0-9a-fA-F]{2,66})(?![0-9a-fA-F])')
+
+# The rest of a signature, after its R value: ', S: <hex>, Z: <hex>' on the same line (extract_data.py)
+# or 'S : <hex>' and 'Z : <hex>' on the following lines (the C++ tools)
+TEXT_FIELD = re.compile(rb'\b([SZ]) ?: ?([0-9a-fA-F]+)')
+TEXT_TXID = re.compile(rb'ID: ?([0-9a-fA-F]{64})')
+# Any R value, to count the signatures of a transaction
+R_LABEL = re.compile(rb'R ?: ?[0-9a-fA-F]')
+# How far before a signature line its 'ID: ' line is looked for
+TXID_LOOKBACK = 1 << 20
+
+R_HEX_LENGTH = 64
+SHARD_RECORD = R_HEX_LENGTH + 1
+# File index, byte offset and record number in hex, after the R value
+LOCATION_HEX = 8 + 16 + 8
+LOCATED_RECORD = R_HEX_LENGTH + LOCATION_HEX + 1
+READ_RECORDS = 1 << 16
+# A sorted list of bytes objects costs about this much per record while a chunk or range is processed
+RECORD_MEMORY = 160
+LOCATED_RECORD_MEMORY = 200
+# Bits of an R value used as Bloom filter hashes; the top 8 bits split the values between workers
+HASH_BITS = 248
+# <output_file>.collisions of extract_data.py --r-index repeats R values that are already in the output
+REPORT_SUFFIXES = ('.collisions',)
+
+
+def iter_input_files(folder_path: str, exclude=()):
+    """
+    Yields every file below folder_path, skipping the excluded files and
+    directories and the collision reports of --r-index (REPORT_SUFFIXES).
+    """
+    excluded = {os.path.abspath(path) for path in exclude}
+    for root, dirs, files in os.walk(folder_path):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) not in excluded)
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            if os.path.abspath(file_path) not in excluded and not file.endswith(REPORT_SUFFIXES):
+                yield file_path
+
+
+def normalize_r_value(value: bytes):
+    """An R value as 64 lowercase hex digits without the DER pad byte, or None if it exceeds 32 bytes."""
+    number = int(value, 16)
+    return None if number >> 256 else b'%064x' % number
+
+
+def normalize_r_values(values) -> list:
+    """
+    Lowercases matched R values, converting the whole batch at once, and
+    brings the few that are not 64 digits (padded or short) to 64 digits.
+    Values that do not fit 32 bytes become None, keeping the list aligned
+    with the matches.
+    """
+    joined = b'\n'.join(values)
+    lowered = joined.lower()
+    values = lowered.split(b'\n') if lowered != joined else values
+    return [value if len(value) == R_HEX_LENGTH else normalize_r_value(value) for value in values]
+
+
+def chunk_bounds(data, start: int, end: int):
+    """Returns the byte range of the lines that begin inside [start, end) of a mapped file."""
+    if start > 0 and data[start - 1] != 0x0a:
+        newline = data.find(b'\n', start)
+        start = len(data) if newline < 0 else newline + 1
+    if end < len(data):
+        newline = data.find(b'\n', end - 1)
+        end = len(data) if newline < 0 else newline + 1
+    return start, max(start, end)
+
+
+def signature_chunk_values(chunk) -> list:
+    """Returns the R column of a signature file chunk as lowercase 64-digit hex values."""
+    digits = chunk.column("r").tobytes().hex().encode('ascii')
+    return [digits[index:index + R_HEX_LENGTH] for index in range(0, len(digits), R_HEX_LENGTH)]
+
+
+def read_signature_chunk(file_path: str, offset: int) -> list:
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        view = memoryview(data)
+        try:
+            return signature_chunk_values(SigChunk(view, offset))
+        finally:
+            view.release()
+
+
+def scan_chunk(task):
+    """
+    Worker: writes the sorted R values of one file chunk to a shard file.
+    With a file index, each value is followed by its location. Returns
+    (shard path, count).
+    """
+    file_path, start, end, shard_path, file_index = task
+    try:
+        if end is None:
+            # A chunk of a binary signature file
+            values = read_signature_chunk(file_path, start)
+            locations = [(start, record) for record in range(len(values))]
+        else:
+            with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                start, end = chunk_bounds(data, start, end)
+                if file_index is None:
+                    values = R_PATTERN.findall(data, start, end)
+                else:
+                    matches = list(R_PATTERN.finditer(data, start, end))
+                    values = [match.group(1) for match in matches]
+                    locations = [(match.start(), 0) for match in matches]
+    except (OSError, ValueError) as e:
+        print(f"Error processing file {file_path}: {e}")
+        return None, 0
+    if not values:
+        return None, 0
+    values = normalize_r_values(values)
+    if file_index is not None:
+        values = [value + b'%08x%016x%08x' % (file_index, offset, record)
+                  for value, (offset, record) in zip(values, locations) if value is not None]
+    elif None in values:
+        values = [value for value in values if value is not None]
+    if not values:
+        return None, 0
+    values.sort()
+    with open(shard_path, 'wb') as shard:
+        shard.write(b'\n'.join(values))
+        shard.write(b'\n')
+    return shard_path, len(values)
+
+
+def shard_offset(data, count: int, key: bytes, record: int = SHARD_RECORD) -> int:
+    """Returns the byte offset of the first record >= key in a sorted shard of fixed-width records."""
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        if data[middle * record:middle * record + R_HEX_LENGTH] < key:
+            low = middle + 1
+        else:
+            high = middle
+    return low * record
+
+
+def iter_shard_range(shards, low: bytes, high: bytes, record: int = SHARD_RECORD):
+    """Yields lists of the records in [low, high) of every shard, a block at a time."""
+    read_block = record * READ_RECORDS
+    for shard_path, count in shards:
+        with open(shard_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            begin = shard_offset(data, count, low, record) if low else 0
+            stop = shard_offset(data, count, high, record) if high else len(data)
+            for block_start in range(begin, stop, read_block):
+                block = data[block_start:min(block_start + read_block, stop)]
+                yield block[:-1].split(b'\n')
+
+
+def count_range(task):
+    """Worker: counts the values in [low, high) across all shards. Returns the duplicates, sorted."""
+    shards, low, high = task
+    counts = Counter()
+    for records in iter_shard_range(shards, low, high):
+        counts.update(records)
+    return sorted((value.decode('ascii'), count) for value, count in counts.items() if count >= 2)
+
+
+def group_range(task):
+    """
+    Worker: groups the located values in [low, high) across all shards and
+    resolves the occurrences of every value that repeats. Returns the groups
+    in R order.
+    """
+    shards, low, high, file_paths = task
+    records = []
+    for block in iter_shard_range(shards, low, high, LOCATED_RECORD):
+        records.extend(block)
+    records.sort()
+    groups = []
+    for value, group in itertools.groupby(records, key=lambda record: record[:R_HEX_LENGTH]):
+        group = list(group)
+        if len(group) >= 2:
+            groups.append((value.decode('ascii'), [parse_location(record) for record in group]))
+    if not groups:
+        return []
+    resolved = resolve_locations(file_paths, [location for _, locations in groups for location in locations])
+    return [{"r": r, "count": len(locations), "occurrences": [resolved[location] for location in locations]}
+            for r, locations in groups]
+
+
+def parse_location(record: bytes) -> tuple:
+    """The (file index, byte offset, record number) after the R value of a located shard record."""
+    location = record[R_HEX_LENGTH:]
+    return int(location[:8], 16), int(location[8:24], 16), int(location[24:32], 16)
+
+
+def empty_occurrence(file_path: str, offset: int, record) -> dict:
+    return {"file": file_path, "offset": offset, "record": record, "txid": None, "input_index": None,
+            "height": None, "pubkey": None, "s": None, "z": None}
+
+
+def text_occurrence(data, file_path: str, offset: int) -> dict:
+    """
+    Reads back the signature whose R value starts at offset in a mapped text
+    file. The text formats hold no input index, so the position of the
+    signature within its transaction stands in for it, as in r_index.py.
+    """
+    line_start = data.rfind(b'\n', 0, offset) + 1
+    line_end = data.find(b'\n', offset)
+    line_end = len(data) if line_end < 0 else line_end
+    occurrence = empty_occurrence(file_path, line_start, None)
+    fields = dict(TEXT_FIELD.findall(data[offset:line_end]))
+    position = line_end + 1
+    while not fields.keys() >= {b'S', b'Z'} and position < len(data):
+        # 'R : ' lines of the C++ tools are followed by 'S : ' and 'Z : ' lines
+        match = TEXT_FIELD.match(data, position)
+        if not match or match.group(1) in fields:
+            break
+        fields[match.group(1)] = match.group(2)
+        position = data.find(b'\n', match.end())
+        position = len(data) if position < 0 else position + 1
+    for name, value in fields.items():
+        occurrence[name.decode('ascii').lower()] = value.decode('ascii').lower()
+
+    id_start = data.rfind(b'ID: ', max(0, line_start - TXID_LOOKBACK), line_start)
+    match = TEXT_TXID.match(data, id_start) if id_start >= 0 else None
+    if match:
+        occurrence["txid"] = match.group(1).decode('ascii').lower()
+        occurrence["input_index"] = len(R_LABEL.findall(data, match.end(), line_start))
+    return occurrence
+
+
+def resolve_locations(file_paths, locations) -> dict:
+    """Maps each (file index, offset, record) location to its occurrence, reading only those offsets."""
+    by_file = {}
+    for location in locations:
+        by_file.setdefault(location[0], []).append(location)
+    resolved = {}
+    for file_index, file_locations in sorted(by_file.items()):
+        file_path = file_paths[file_index]
+        try:
+            if is_signature_file(file_path):
+                with SigFileReader(file_path) as reader:
+                    for location in file_locations:
+                        _, offset, record = location
+                        (height, txid, input_index, _, s, z, pubkey, _), = \
+                            SigChunk(reader.view, offset).records(record, record + 1)
+                        occurrence = empty_occurrence(file_path, offset, record)
+                        occurrence.update(txid=txid.hex(), input_index=input_index, height=height,
+                                          pubkey=pubkey.hex() if pubkey else None, s=s,
+                                          z=z.hex() if z else None)
+                        resolved[location] = occurrence
+            else:
+                with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    for location in file_locations:
+                        resolved[location] = text_occurrence(data, file_path, location[1])
+        except (OSError, ValueError) as e:
+            print(f"Error processing file {file_path}: {e}")
+        for location in file_locations:
+            if location not in resolved:
+                resolved[location] = empty_occurrence(file_path, location[1], None)
+    return resolved
+
+
+def range_keys(ranges: int) -> list:
+    """Splits the 256-bit value space into equal ranges, returned as hex lower bounds (b'' = open)."""
+    keys = [b'']
+    for index in range(1, ranges):
+        keys.append(f"{(index << 256) // ranges:064x}".encode('ascii'))
+    keys.append(b'')
+    return keys
+
+
+def plan_chunks(file_paths, chunk_bytes: int, shard_dir: str, located: bool = False) -> list:
+    """
+    Splits the input files into (path, start, end, shard path, file index)
+    scan tasks. end is None for signature file chunks; the file index is
+    None unless the values are located.
+    """
+    tasks = []
+    for file_index, file_path in enumerate(file_paths):
+        file_index = file_index if located else None
+        try:
+            size = os.path.getsize(file_path)
+            if is_signature_file(file_path):
+                with SigFileReader(file_path) as reader:
+                    for offset in reader.offsets:
+                        tasks.append((file_path, offset, None, os.path.join(shard_dir, f"shard-{len(tasks):06d}"),
+                                      file_index))
+                continue
+        except (OSError, ValueError) as e:
+            print(f"Error processing file {file_path}: {e}")
+            continue
+        for start in range(0, size, chunk_bytes):
+            tasks.append((file_path, start, min(start + chunk_bytes, size),
+                          os.path.join(shard_dir, f"shard-{len(tasks):06d}"), file_index))
+    return tasks
+
+
+def find_duplicates(file_paths, memory_bytes: int = 256 << 20, work_dir: str = None, workers: int = None):
+    """
+    Yields (r hex, count) for every R value that occurs at least twice across
+    all files, in R order. Each of the workers (default: CPU count) uses
+    about memory_bytes / workers. Shard files are written to a temporary
+    directory inside work_dir and removed afterwards.
+    """
+    yield from _sharded_search(file_paths, memory_bytes, work_dir, workers, located=False)
+
+
+def find_duplicate_groups(file_paths, memory_bytes: int = 256 << 20, work_dir: str = None, workers: int = None):
+    """
+    Yields every R value that occurs at least twice across all files, in R
+    order, as a dict: r, count, and one occurrence per signature with its
+    file, offset (of the line, or of the chunk with a record number for
+    signature files), txid, input_index, height, pubkey, s and z. Fields a
+    format does not hold are None. Same passes and memory as find_duplicates.
+    """
+    yield from _sharded_search(file_paths, memory_bytes, work_dir, workers, located=True)
+
+
+def _sharded_search(file_paths, memory_bytes: int, work_dir: str, workers: int, located: bool):
+    file_paths = list(file_paths)
+    workers = workers or os.cpu_count() or 1
+    per_worker = max(1 << 20, memory_bytes // workers)
+    record_memory = LOCATED_RECORD_MEMORY if located else RECORD_MEMORY
+    # Values are a fraction of the text they are found in, so a chunk holds several times more text
+    chunk_bytes = max(1 << 20, per_worker // record_memory * SHARD_RECORD * 2)
+    shard_dir = tempfile.mkdtemp(prefix="duplicate_shards_", dir=work_dir)
+    try:
+        with Pool(workers) as pool:
+            # Pass 1: scan chunks of the mapped files in parallel into sorted shards
+            tasks = plan_chunks(file_paths, chunk_bytes, shard_dir, located)
+            shards = [(path, count) for path, count in pool.imap_unordered(scan_chunk, tasks) if path]
+            total = sum(count for _, count in shards)
+
+            # Pass 2: count (or group) value ranges in parallel; results arrive in range order
+            ranges = max(1, total * record_memory // per_worker + 1)
+            keys = range_keys(ranges)
+            if located:
+                range_tasks = [(shards, keys[index], keys[index + 1], file_paths) for index in range(ranges)]
+            else:
+                range_tasks = [(shards, keys[index], keys[index + 1]) for index in range(ranges)]
+            for duplicates in pool.imap(group_range if located else count_range, range_tasks):
+                yield from duplicates
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+
+class BloomFilter:
+    """
+    A Bloom filter over R values given as integers. R values are uniformly
+    distributed curve x coordinates, so disjoint bit slices of the value
+    itself serve as the independent hash functions. The top 8 bits are left
+    for splitting the values between workers. The size is a power of two, so
+    every bit position is equally likely.
+    """
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(-math.log2(error_rate)))
+        # A value only has room for so many slices; use more bits to make up for fewer hashes
+        while self.hashes > HASH_BITS // self.size.bit_length():
+            self.hashes = HASH_BITS // self.size.bit_length()
+            self.size = math.ceil(-self.hashes * capacity / math.log(1 - error_rate ** (1 / self.hashes)))
+        # A slice reduced modulo a size that is not a power of two would favour the low positions
+        slice_bits = (self.size - 1).bit_length()
+        self.size = 1 << slice_bits
+        self.slice_mask = self.size - 1
+        self.shifts = tuple(index * slice_bits for index in range(self.hashes))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+    def add(self, number: int) -> bool:
+        """Inserts a value; returns True if it may have been inserted before."""
+        bits = self.bits
+        slice_mask = self.slice_mask
+        seen = True
+        for shift in self.shifts:
+            position = (number >> shift) & slice_mask
+            index = position >> 3
+            mask = 1 << (position & 7)
+            if not bits[index] & mask:
+                seen = False
+                bits[index] |= mask
+        return seen
+
+
+def iter_file_r_values(file_path: str, chunk_bytes: int = 1 << 20):
+    """Yields lists of lowercase R values found in a mapped file, one list per chunk."""
+    if is_signature_file(file_path):
+        with SigFileReader(file_path) as reader:
+            for chunk in reader.chunks():
+                values = signature_chunk_values(chunk)
+                if values:
+                    yield values
+        return
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for start in range(0, len(data), chunk_bytes):
+                chunk_start, chunk_end = chunk_bounds(data, start, min(start + chunk_bytes, len(data)))
+                values = [value for value in normalize_r_values(R_PATTERN.findall(data, chunk_start, chunk_end))
+                          if value is not None]
+                if values:
+                    yield values
+
+
+def iter_owned_values(file_paths, part: int, parts: int):
+    """Yields (value, integer) for the R values whose top byte assigns them to this part."""
+    for file_path in file_paths:
+        try:
+            for values in iter_file_r_values(file_path):
+                if parts == 1:
+                    yield from ((value, int(value, 16)) for value in values)
+                    continue
+                for value in values:
+                    number = int(value, 16)
+                    if (number >> HASH_BITS) * parts >> 8 == part:
+                        yield value, number
+        except (OSError, ValueError) as e:
+            if part == 0:
+                print(f"Error processing file {file_path}: {e}")
+
+
+def approximate_part(task):
+    """
+    Worker: both passes of the approximate search for one share of the value
+    space. Every worker reads all files but only filters and counts its share.
+    """
+    file_paths, part, parts, capacity, error_rate = task
+    bloom = BloomFilter(capacity // parts + 1, error_rate)
+
+    candidates = set()
+    values_seen = 0
+    for value, number in iter_owned_values(file_paths, part, parts):
+        values_seen += 1
+        if bloom.add(number):
+            candidates.add(value)
+
+    counts = dict.fromkeys(candidates, 0)
+    if counts:
+        for value, _ in iter_owned_values(file_paths, part, parts):
+            if value in counts:
+                counts[value] += 1
+
+    duplicates = [(value.decode('ascii'), count) for value, count in counts.items() if count >= 2]
+    return duplicates, values_seen, bloom.memory_bytes, bloom.hashes, len(candidates)
+
+
+def find_duplicates_approximate(file_paths, error_rate: float = 0.001, workers: int = None):
+    """
+    Two-pass duplicate search. Pass 1 adds every R value to a Bloom filter
+    and keeps the values it reports as possibly seen. Every real repeat is
+    among them, along with about error_rate false positives. Pass 2 counts
+    only those candidates exactly. The value space is split between the
+    workers (default: CPU count), each with its own filter.
+
+    The filters are sized for the most values the files could hold, so the
+    false-positive rate stays at or below error_rate. Returns the sorted
+    (r hex, count) duplicates and a dict of statistics.
+    """
+    file_paths = list(file_paths)
+    workers = workers or os.cpu_count() or 1
+    input_bytes = 0
+    for file_path in file_paths:
+        try:
+            input_bytes += os.path.getsize(file_path)
+        except OSError:
+            pass
+    # Each match needs at least 'R:' and 64 digits
+    capacity = input_bytes // (R_HEX_LENGTH + 2)
+
+    tasks = [(file_paths, part, workers, capacity, error_rate) for part in range(workers)]
+    if workers == 1:
+        results = [approximate_part(tasks[0])]
+    else:
+        with Pool(workers) as pool:
+            results = pool.map(approximate_part, tasks)
+
+    duplicates = sorted(duplicate for result in results for duplicate in result[0])
+    candidates = sum(result[4] for result in results)
+    stats = {
+        "values": sum(result[1] for result in results),
+        "filter_bytes": sum(result[2] for result in results),
+        "hashes": results[0][3],
+        "candidates": candidates,
+        "false_positives": candidates - len(duplicates),
+    }
+    return duplicates, stats
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Offline Signature Extraction from Bitcoin Core blk*.dat Files
+Author: https://github.com/8891689
+"""
+import argparse
+import glob
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+from multiprocessing import Pool
+
+from block_parser import double_sha256
+from extract_data import format_raw_block_signatures, print_progress
+
+NETWORK_MAGIC = {
+    "main": bytes.fromhex("f9beb4d9"),
+    "test": bytes.fromhex("0b110907"),
+    "testnet4": bytes.fromhex("1c163f28"),
+    "signet": bytes.fromhex("0a03cf40"),
+    "regtest": bytes.fromhex("fabfb5da"),
+}
+
+
+def load_xor_key(blocks_dir: str):
+    """
+    Returns the obfuscation key Bitcoin Core (v28+) applies to blk files,
+    or None when the files are stored in the clear.
+    """
+    try:
+        with open(os.path.join(blocks_dir, "xor.dat"), "rb") as f:
+            key = f.read()
+    except FileNotFoundError:
+        return None
+    return key if key.strip(b'\x00') else None
+
+
+def read_region(data, start: int, end: int, xor_key=None):
+    """
+    Returns data[start:end], de-obfuscated when xor_key is set. Without a key
+    the result is a zero-copy view of the mapped file.
+    """
+    if xor_key is None:
+        return memoryview(data)[start:end]
+    length = end - start
+    shift = start % len(xor_key)
+    key_stream = (xor_key * (length // len(xor_key) + 2))[shift:shift + length]
+    value = int.from_bytes(data[start:end], 'big') ^ int.from_bytes(key_stream, 'big')
+    return value.to_bytes(length, 'big')
+
+
+def iter_blk_records(data, magic: bytes, xor_key=None):
+    """Walks the magic/size framing of a mapped blk file, yielding (offset, size) of each block."""
+    offset = 0
+    while offset + 8 <= len(data):
+        frame = bytes(read_region(data, offset, offset + 8, xor_key))
+        if frame[:4] != magic:
+            # Bitcoin Core pre-allocates blk files, the unused tail is zero-filled
+            break
+        size = int.from_bytes(frame[4:], 'little')
+        if offset + 8 + size > len(data):
+            print(f"Truncated block at offset {offset}, stopping.")
+            break
+        yield offset + 8, size
+        offset += 8 + size
+
+
+def map_file(path: str):
+    """Memory-maps a file read-only; returns None for empty files, which cannot be mapped."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def index_blk_file(task):
+    """Worker: reads only the block headers of one file, returning (hash, prev_hash, offset, size) entries."""
+    path, magic, xor_key = task
+    entries = []
+    data = map_file(path)
+    if data is None:
+        return path, entries
+    with data:
+        for offset, size in iter_blk_records(data, magic, xor_key):
+            header = bytes(read_region(data, offset, offset + 80, xor_key))
+            entries.append((double_sha256(header)[::-1].hex(), header[4:36][::-1].hex(), offset, size))
+    return path, entries
+
+
+def order_chain(file_entries, base_height: int = 0) -> dict:
+    """
+    Links the indexed headers into chains and returns {block_hash: height} for
+    the longest one. Blocks whose parent is missing (the genesis block, or the
+    first block kept by a pruned node) start at base_height.
+    """
+    parents = {}
+    for _, entries in file_entries:
+        for block_hash, prev_hash, _, _ in entries:
+            parents[block_hash] = prev_hash
+
+    heights = {}
+    for block_hash in parents:
+        path = []
+        current = block_hash
+        while current in parents and current not in heights:
+            path.append(current)
+            current = parents[current]
+        height = heights[current] if current in heights else base_height - 1
+        for ancestor in reversed(path):
+            height += 1
+            heights[ancestor] = height
+
+    if not heights:
+        return {}
+    tip = max(heights, key=heights.get)
+    main_chain = {}
+    while tip in heights:
+        main_chain[tip] = heights[tip]
+        tip = parents[tip]
+    return main_chain
+
+
+def extract_blk_file(task):
+    """
+    Worker: extracts the signatures of the wanted blocks of one file into a
+    shard file. Returns (height, shard_path, start, end) for each block.
+    """
+    path, magic, xor_key, wanted, shard_dir = task
+    results = []
+    data = map_file(path)
+    if data is None:
+        return results
+    shard_path = os.path.join(shard_dir, os.path.basename(path) + ".shard")
+    with data, open(shard_path, "w") as shard:
+        for offset, size in iter_blk_records(data, magic, xor_key):
+            height = wanted.get(offset)
+            if height is None:
+                continue
+            start = shard.tell()
+            shard.writelines(format_raw_block_signatures(read_region(data, offset, offset + size, xor_key)))
+            results.append((height, shard_path, start, shard.tell()))
+    return results
+
+
+def main(blocks_dir, output_file, start_block=None, end_block=None, workers=None,
+         network="main", base_height=0):
+    blk_files = sorted(glob.glob(os.path.join(blocks_dir, "blk*.dat")))
+    if not blk_files:
+        print(f"Error: No blk*.dat files found in {blocks_dir}")
+        sys.exit(1)
+
+    magic = NETWORK_MAGIC[network]
+    xor_key = load_xor_key(blocks_dir)
+    shard_dir = tempfile.mkdtemp(prefix="extract_blk_", dir=os.path.dirname(os.path.abspath(output_file)))
+
+    try:
+        with Pool(workers) as pool:
+            # Pass 1: one worker per file reads the headers, then the chain is ordered by height
+            file_entries = pool.map(index_blk_file, [(path, magic, xor_key) for path in blk_files])
+            heights = order_chain(file_entries, base_height)
+
+            tasks = []
+            for path, entries in file_entries:
+                wanted = {}
+                for block_hash, _, offset, _ in entries:
+                    height = heights.get(block_hash)
+                    if height is None:
+                        continue
+                    if (start_block is None or height >= start_block) and (end_block is None or height <= end_block):
+                        wanted[offset] = height
+                if wanted:
+                    tasks.append((path, magic, xor_key, wanted, shard_dir))
+
+            # Pass 2: one worker per file extracts signatures into a shard
+            blocks = []
+            for done, results in enumerate(pool.imap_unordered(extract_blk_file, tasks), 1):
+                blocks.extend(results)
+                print_progress(done, len(tasks))
+
+        # Stitch the shards together in height order
+        blocks.sort()
+        shards = {}
+        with open(output_file, "w") as file_handle:
+            for _, shard_path, start, end in blocks:
+                if shard_path not in shards:
+                    shards[shard_path] = open(shard_path, "r")
+                shard = shards[shard_path]
+                shard.seek(start)
+                file_handle.write(shard.read(end - start))
+        for shard in shards.values():
+            shard.close()
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+    print(f"Extracted {len(blocks)} blocks from {len(blk_files)} files into {output_file}")
+
+
+def write_blk_file(path: str, raw_blocks, network: str = "main", xor_key=None, padding: int = 0):
+    """
+    Writes blocks with blk*.dat framing, optionally obfuscated and zero padded
+    like Bitcoin Core's pre-allocated files. Used to build synthetic block files.
+    """
+    data = bytearray()
+    for raw_block in raw_blocks:
+        block = bytes.fromhex(raw_block) if isinstance(raw_block, str) else raw_block
+        data += NETWORK_MAGIC[network] + len(block).to_bytes(4, 'little') + block
+    data += bytes(padding)
+    if xor_key:
+        data = read_region(bytes(data), 0, len(data), xor_key)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def setup_arg_parser():
+    """Sets up the command-line argument parser."""
+    parser = argparse.ArgumentParser(
+        description="Extract ECDSA signature R and S values directly from Bitcoin Core blk*.dat files, without a running node."
+    )
+    parser.add_argument("blocks_dir", help="Bitcoin Core blocks directory containing blk*.dat files.")
+    parser.add_argument("output_file", help="File to write the extracted signatures to.")
+    parser.add_argument("--start-block", type=int, help="First block height to extract (default: all).")
+    parser.add_argument("--end-block", type=int, help="Last block height to extract, inclusive (default: all).")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (default: CPU count).")
+    parser.add_argument("--network", choices=sorted(NETWORK_MAGIC), default="main",
+                        help="Network whose magic bytes frame the blocks (default: main).")
+    parser.add_argument("--base-height", type=int, default=0,
+                        help="Height of the first block when the files do not start at genesis, e.g. a pruned node (default: 0).")
+    return parser
+
+
+if __name__ == '__main__':
+    args = setup_arg_parser().parse_args()
+    main(args.blocks_dir, args.output_file, args.start_block, args.end_block, args.workers,
+         args.network, args.base_height)
@@ -1,11 +1,25 @@
 # author：8891689
-import requests
-import json
 import sys
 import hashlib
 import base58
-import re
-from time import sleep
+import os
+import argparse
+import shutil
+import tempfile
+import functools
+import multiprocessing
+import time
+from rpc_client import RPCClient, RPCConnectionError, RPCAuthError, backoff_delay, shared_state
+from block_parser import parse_block, is_coinbase
+from script_parser import extract_script_signatures, ScriptError
+from sighash import transaction_signing_infos, required_outpoints, compute_z_values
+from prevouts import PrevoutCache, RPCPrevoutProvider
+from raw_cache import RawDataCache, CachingRPCClient
+from r_index import RIndex, format_collision
+from sigfile import SigFileWriter
+from signature_records import Signature, SignatureBatch
+from scan_output import GroupCommitWriter, save_checkpoint, read_checkpoint, rollback_point, save_rollback
+from metrics import METRICS, BlockProfiler, ProgressReporter, format_stage_table, shared_state as shared_metrics_state
 
 # RPC Connection Settings
 RPC_USER = '8891689'
@@ -13,61 +27,54 @@ RPC_PASSWORD = '1111111111111111111111$ddbbda8cbc8c0a8cc32a84d0590f2de17f1f8dc79
 RPC_PORT = '8332'
 RPC_URL = f'http://127.0.0.1:{RPC_PORT}'
 
-def wait_for_reconnect():
-    # print("Please press 'P' to reconnect...") # Original Chinese print statement
-    print("Please press 'P' to reconnect...") # English translation
-    while True:
-        user_input = input().strip().upper()
-        if user_input == 'P':
-            break
+# Blocks of history kept in the checkpoint journal by --follow, i.e. the deepest reorganization it can undo
+DEFAULT_REORG_DEPTH = 100
+
+# Rounds of retries for blocks that could not be fetched, and the base of the backoff between rounds (seconds)
+DEFAULT_RETRY_ROUNDS = 3
+RETRY_ROUND_DELAY = 10
+MAX_RETRY_ROUND_DELAY = 300
+
+# Shared keep-alive connection pool. When the node stays unreachable through all retries, the call raises
+# RPCConnectionError and the block is queued for a later retry instead of stopping the scan.
+rpc_client = RPCClient(RPC_URL, RPC_USER, RPC_PASSWORD)
+# Set when z values are computed during the scan (--with-z)
+prevout_cache = None
+# Samples blocks for cProfile when --profile-blocks is given
+block_profiler = BlockProfiler()
 
 def rpc_request(method, params=None):
-    headers = {'Content-Type': 'application/json'}
-    payload = {
-        "jsonrpc": "1.0",
-        "id": "python_rpc",
-        "method": method,
-        "params": params or []
-    }
-    for attempt in range(3):
-        try:
-            response = requests.post(
-                RPC_URL,
-                auth=(RPC_USER, RPC_PASSWORD),
-                headers=headers,
-                data=json.dumps(payload),
-                timeout=10  # Set timeout period
-            )
-            response_data = response.json()
-            if 'error' in response_data and response_data['error']:
-                # print(f"RPC 错误: {response_data['error']}") # Original Chinese print statement
-                print(f"RPC Error: {response_data['error']}") # English translation
-                return None
-            return response_data['result']
-        except requests.exceptions.RequestException as e:
-            # print(f"RPC 请求失败: {e}") # Original Chinese print statement
-            print(f"RPC request failed: {e}") # English translation
-            sleep(5)  # Wait 5 seconds before retrying after failure
-    # print("所有重试已用尽") # Original Chinese print statement
-    print("All retry attempts exhausted.") # English translation
-    wait_for_reconnect()  # Wait for user to press 'P' to reconnect
-    return rpc_request(method, params)  # Try the request again
+    return rpc_client.call(method, params)
 
 def get_block_hash(block_height):
     # print(f"获取区块哈希: {block_height}") # Original Chinese print statement
     print(f"Getting block hash: {block_height}") # English translation
     return rpc_request('getblockhash', [block_height])
 
-def get_block(block_hash):
+def get_block(block_hash, verbosity=2):
     # print(f"获取区块数据: {block_hash}") # Original Chinese print statement
     print(f"Getting block data: {block_hash}") # English translation
-    return rpc_request('getblock', [block_hash, 2]) # Verbosity level 2 for detailed block data
+    # Verbosity level 2 for detailed block data, 0 for the raw serialized block hex
+    return rpc_request('getblock', [block_hash, verbosity])
 
 def get_transaction(txid):
     # print(f"获取交易数据: {txid}") # Original Chinese print statement
     print(f"Getting transaction data: {txid}") # English translation
     return rpc_request('getrawtransaction', [txid, True]) # True for verbose output
 
+def get_block_hashes(block_heights, batch_size=100):
+    # Many getblockhash calls travel in a single JSON-RPC batch request
+    return rpc_client.batch_chunked('getblockhash', [[height] for height in block_heights], batch_size)
+
+def iter_blocks(block_hashes, in_flight=8, verbosity=2):
+    # Yields block data in the order of block_hashes with up to in_flight getblock requests outstanding.
+    # Missing hashes and failed requests yield None.
+    blocks = rpc_client.imap('getblock', ([block_hash, verbosity] for block_hash in block_hashes if block_hash),
+                             in_flight, return_exceptions=True)
+    for block_hash in block_hashes:
+        block = next(blocks) if block_hash else None
+        yield None if isinstance(block, Exception) else block
+
 def extract_signatures_from_transaction(tx):
     signatures = []
     txid = None
@@ -81,69 +88,61 @@ def extract_signatures_from_transaction(tx):
     if 'vin' in tx and len(tx['vin']) > 0 and 'coinbase' in tx['vin'][0]:
         return signatures, txid
 
-    for vin in tx.get('vin', []):
-        if 'scriptSig' in vin and 'asm' in vin['scriptSig']:
-            scriptSig_asm = vin['scriptSig']['asm']
-            # Use regular expression to match signature R and S values (hex strings)
-            matches = re.findall(r'([0-9a-fA-F]+)', scriptSig_asm)
-            if len(matches) > 1:
-                # Simple attempt to find DER encoded signature:
-                # Find potential signature data by joining hex parts.
-                # This is a basic approach and might not work for all script types.
-                sig_data = ''.join(matches) # Concatenate matched parts
-                try:
-                    # Parse the signature (basic DER parsing attempt)
-                    offset = 0
-                    length = len(sig_data)
-                    if sig_data[offset:offset+2] == '30':  # 0x30: Start of sequence
-                        offset += 2
-                        seq_len = int(sig_data[offset:offset+2], 16)  # Sequence length
-                        offset += 2
-                        # Check for R value
-                        if sig_data[offset:offset+2] == '02':  # 0x02: Start of integer
-                            offset += 2
-                            r_len = int(sig_data[offset:offset+2], 16)  # R length
-                            offset += 2
-                            r = sig_data[offset:offset + r_len * 2]  # R value (hex)
-                            offset += r_len * 2
-                            # Check for S value
-                            if sig_data[offset:offset+2] == '02':  # 0x02: Start of integer
-                                offset += 2
-                                s_len = int(sig_data[offset:offset+2], 16)  # S length
-                                offset += 2
-                                s = sig_data[offset:offset + s_len * 2]  # S value (hex)
-                                signatures.append({'r': r, 's': s})
-                except Exception as e:
-                    # print(f"解析签名数据时发生错误: {e}") # Original Chinese print statement
-                    print(f"Error parsing signature data: {e}") # English translation
+    for input_index, vin in enumerate(tx.get('vin', [])):
+        if 'scriptSig' in vin and 'hex' in vin['scriptSig']:
+            # Parse the script bytes instead of pattern matching over the asm rendering
+            signatures.extend(script_signatures(bytes.fromhex(vin['scriptSig']['hex']), input_index))
+
+    return signatures, txid
+
+def script_signatures(script, input_index=None):
+    # Every DER signature pushed by the scriptSig (P2PK, P2PKH and multisig spends), as Signature records
+    # with raw R/S bytes. Pre-BIP66 blocks contain non-canonical encodings, so only the length fields are validated.
+    try:
+        return [Signature(bytes(r), bytes(s), input_index)
+                for r, s, _ in extract_script_signatures(script, strict=False)]
+    except ScriptError as e:
+        # print(f"解析签名数据时发生错误: {e}") # Original Chinese print statement
+        print(f"Error parsing signature data: {e}") # English translation
+        return []
+
+def extract_signatures_from_raw_transaction(tx):
+    # Same extraction as extract_signatures_from_transaction, for a transaction parsed from a raw block
+    signatures = []
+    txid = tx['txid']
+
+    # Skip coinbase transactions as they don't have standard inputs/signatures
+    if is_coinbase(tx):
+        return signatures, txid
+
+    for input_index, vin in enumerate(tx['vin']):
+        signatures.extend(script_signatures(vin['script_sig'], input_index))
 
     return signatures, txid
 
-def print_progress(current, total):
+def print_progress(current, total, rates=None):
     percent = (current / total) * 100
     bar_length = 40
     filled_length = int(round(bar_length * percent / 100))
     bar = '=' * filled_length + '-' * (bar_length - filled_length)
     # Use \r to return to the beginning of the line, overwriting the previous progress bar instead of creating a new line
     # print(f'\r进度: [{bar}] {percent:.2f}% 完成', end="") # Original Chinese print statement
-    print(f'\rProgress: [{bar}] {percent:.2f}% Complete', end="") # English translation
+    print(f'\rProgress: [{bar}] {percent:.2f}% Complete' + (f' | {rates}' if rates else ''), end="") # English translation
     sys.stdout.flush()
     if current == total:
         print()  # Print a newline when progress is complete
 
-def process_block(block_height, file_handle, recorded_txids): # recorded_txids is currently unused
-    block_hash = get_block_hash(block_height)
-    if not block_hash:
-        # print(f"无法获取区块哈希: {block_height}") # Original Chinese print statement
-        print(f"Could not get block hash for height: {block_height}") # English translation
-        return
-
-    block = get_block(block_hash)
-    if not block:
-        # print(f"无法获取区块数据: {block_height}") # Original Chinese print statement
-        print(f"Could not get block data for hash: {block_hash} (height: {block_height})") # English translation
-        return
+def format_block_signatures(block, records=None):
+    # Renders the signatures of a block as output lines.
+    # With a records list, (txid, input index, r, s, z, pubkey) of every signature is appended to it as well.
+    batch = block_signature_batch(block)
+    if records is not None:
+        records.extend(batch)
+    return batch.text_lines()
 
+def block_signature_batch(block):
+    # The signatures of a verbose block (getblock verbosity 2) as a SignatureBatch
+    batch = SignatureBatch()
     transactions = block.get('tx', [])
 
     for tx in transactions:
@@ -174,52 +173,555 @@ def process_block(block_height, file_handle, recorded_txids): # recorded_txids i
             signatures, _ = extract_signatures_from_transaction(tx)
         # Else: Cannot extract signature from txid string alone here
 
-        if signatures:
-            # Record transaction ID and signatures
-            file_handle.write(f"Transaction ID: {txid}\n")
-            for sig in signatures:
-                file_handle.write(f"  Signature - R: {sig['r']}, S: {sig['s']}\n")
+        # Record transaction ID and signatures
+        for sig in signatures:
+            batch.add(txid, sig.input_index, sig.r, sig.s)
+
+    return batch
+
+def format_raw_block_signatures(raw_block_hex, prevout_cache=None, records=None):
+    # Renders the signatures of a raw serialized block (getblock verbosity 0 hex, or bytes) as output lines.
+    # With a prevout cache, z is computed inline as well.
+    batch = raw_block_signature_batch(raw_block_hex, prevout_cache)
+    if records is not None:
+        records.extend(batch)
+    return batch.text_lines()
+
+def raw_block_signature_batch(raw_block_hex, prevout_cache=None):
+    # The signatures of a raw serialized block as a SignatureBatch; R/S bytes are copied straight from the
+    # parsed block into the batch buffer without a record object per signature
+    transactions = parse_block(raw_block_hex)['tx']
+    if prevout_cache is not None:
+        return signature_batch_with_z(transactions, prevout_cache)
+
+    batch = SignatureBatch()
+    for tx in transactions:
+        if is_coinbase(tx):
+            continue
+        txid = tx['txid']
+        for input_index, vin in enumerate(tx['vin']):
+            try:
+                for r, s, _ in extract_script_signatures(vin['script_sig'], strict=False):
+                    batch.add(txid, input_index, r, s)
+            except ScriptError as e:
+                print(f"Error parsing signature data: {e}")
+    return batch
+
+def format_signatures_with_z(transactions, prevout_cache, records=None):
+    batch = signature_batch_with_z(transactions, prevout_cache)
+    if records is not None:
+        records.extend(batch)
+    return batch.text_lines()
+
+def signature_batch_with_z(transactions, prevout_cache):
+    # Outputs are registered first so spends of earlier transactions in the same block hit the cache
+    for tx in transactions:
+        prevout_cache.add_transaction(tx)
+
+    spending = [tx for tx in transactions if not is_coinbase(tx)]
+    start = time.perf_counter()
+    infos = [transaction_signing_infos(tx) for tx in spending]
+    sighash_time = time.perf_counter() - start
+    # Every prevout the block still needs is looked up in a single batch
+    wanted = [outpoint for tx, tx_infos in zip(spending, infos) for outpoint in required_outpoints(tx, tx_infos)]
+    prevouts = prevout_cache.get_prevouts(wanted) if wanted else {}
+
+    batch = SignatureBatch()
+    for tx, tx_infos in zip(spending, infos):
+        start = time.perf_counter()
+        signatures = [(input_index, sig, pubkey)
+                      for input_index, (entries, pubkey) in enumerate(compute_z_values(tx, tx_infos, prevouts))
+                      for sig in entries]
+        sighash_time += time.perf_counter() - start
+        for input_index, (r, s, z), pubkey in signatures:
+            batch.add(tx['txid'], input_index, r, s, z, pubkey)
+
+    METRICS.record('sighash', sighash_time)
+    # Spent outputs can never be looked up again
+    prevout_cache.discard([(tx_input['prev_txid'][::-1].hex(), tx_input['prev_index'])
+                           for tx in spending for tx_input in tx['vin']])
+    return batch
+
+def build_prevout_cache(spill_dir, max_entries):
+    # Prevouts missing from the cache are fetched from the node in batched getrawtransaction calls
+    spill_path = os.path.join(spill_dir, f"prevouts-{os.getpid()}.sqlite")
+    return PrevoutCache(RPCPrevoutProvider(rpc_client), max_entries, spill_path)
+
+def write_block_signatures(block, file_handle):
+    file_handle.writelines(format_block_signatures(block))
+    # Immediately flush the file buffer to ensure data is written, preventing data loss on crash
+    file_handle.flush()
+
+def process_block(block_height, file_handle, recorded_txids): # recorded_txids is currently unused
+    block_hash = get_block_hash(block_height)
+    if not block_hash:
+        # print(f"无法获取区块哈希: {block_height}") # Original Chinese print statement
+        print(f"Could not get block hash for height: {block_height}") # English translation
+        return
+
+    block = get_block(block_hash)
+    if not block:
+        # print(f"无法获取区块数据: {block_height}") # Original Chinese print statement
+        print(f"Could not get block data for hash: {block_hash} (height: {block_height})") # English translation
+        return
+
+    write_block_signatures(block, file_handle)
+
+def build_rpc_client(url, user, password, cache_dir=None, cache_size=0, pool_size=8, state=None, breaker_cooldown=30):
+    # With a cache directory, blocks and transactions already on disk are served without asking the node
+    if cache_dir:
+        return CachingRPCClient(url, user, password, RawDataCache(cache_dir, cache_size), pool_size=pool_size,
+                                state=state, breaker_cooldown=breaker_cooldown)
+    return RPCClient(url, user, password, pool_size=pool_size, state=state, breaker_cooldown=breaker_cooldown)
 
-            # Immediately flush the file buffer to ensure data is written, preventing data loss on crash
-            file_handle.flush()
+def init_scan_worker(url, user, password, prevout_spill_dir=None, prevout_cache_size=0, cache_dir=None, cache_size=0,
+                     rpc_state=None, breaker_cooldown=30, metrics_state=None, profile_output=None, profile_blocks=0):
+    # Each worker process gets its own connection pool instead of sharing the parent's sockets,
+    # and its own prevout cache when z values are computed. The circuit breaker and the metrics are shared.
+    global rpc_client, prevout_cache, block_profiler
+    METRICS.use_state(metrics_state)
+    if profile_blocks:
+        block_profiler = BlockProfiler(f"{profile_output}.{os.getpid()}", profile_blocks)
+    rpc_client = build_rpc_client(url, user, password, cache_dir, cache_size, pool_size=1, state=rpc_state,
+                                  breaker_cooldown=breaker_cooldown)
+    if prevout_spill_dir:
+        prevout_cache = build_prevout_cache(prevout_spill_dir, prevout_cache_size)
 
-def main(start_block, end_block, output_file):
+def format_scanned_block(block, raw_blocks=False, with_records=False):
+    # Returns (output lines, SignatureBatch of the records or None) for a fetched block.
+    # Hex is only produced here, for the output lines; the batch travels back to the parent as a few buffers.
+    if raw_blocks:
+        batch = raw_block_signature_batch(block, prevout_cache)
+    else:
+        batch = block_signature_batch(block)
+    return batch.text_lines(), batch if with_records else None
+
+def scan_block(block_height, raw_blocks=False, with_records=False):
+    # Fetches and parses one block inside a worker process;
+    # returns (height, block hash, output lines or None if the block could not be fetched, records)
+    try:
+        block_hash = rpc_request('getblockhash', [block_height])
+        block = rpc_request('getblock', [block_hash, 0 if raw_blocks else 2]) if block_hash else None
+    except RPCConnectionError as e:
+        print(f"Could not fetch block {block_height}: {e}")
+        return block_height, None, None, None
+    if not block_hash:
+        print(f"Could not get block hash for height: {block_height}")
+        return block_height, None, None, None
+    if not block:
+        print(f"Could not get block data for hash: {block_hash} (height: {block_height})")
+        return block_height, None, None, None
+    return scan_fetched_block(block_height, block_hash, block, raw_blocks, with_records)
+
+def scan_fetched_block(height, block_hash, block, raw_blocks=False, with_records=False):
+    # Returns the scan result of a fetched block; prevouts for --with-z can still fail to arrive
+    try:
+        with block_profiler.profile(height), METRICS.timer('parse'):
+            return (height, block_hash) + format_scanned_block(block, raw_blocks, with_records)
+    except RPCConnectionError as e:
+        print(f"Could not fetch the prevouts of block {height}: {e}")
+        return height, None, None, None
+
+def iter_scanned_blocks(heights, batch_size, in_flight, raw_blocks=False, with_records=False):
+    # Single-process scan: block hashes are fetched batch_size heights at a time, then the blocks
+    # of each chunk are streamed back in the order of heights while up to in_flight requests run
+    for chunk_start in range(0, len(heights), batch_size):
+        chunk = heights[chunk_start:chunk_start + batch_size]
+        try:
+            block_hashes = get_block_hashes(chunk, batch_size)
+        except RPCConnectionError as e:
+            print(f"Could not fetch blocks {chunk[0]}-{chunk[-1]}: {e}")
+            block_hashes = [None] * len(chunk)
+        blocks = iter_blocks(block_hashes, in_flight, 0 if raw_blocks else 2)
+        for height, block_hash, block in zip(chunk, block_hashes, blocks):
+            if not block_hash:
+                print(f"Could not get block hash for height: {height}")
+                yield height, None, None, None
+            elif not block:
+                print(f"Could not get block data for hash: {block_hash} (height: {height})")
+                yield height, None, None, None
+            else:
+                yield scan_fetched_block(height, block_hash, block, raw_blocks, with_records)
+
+def iter_with_retries(scan, heights, failed=(), retry_rounds=DEFAULT_RETRY_ROUNDS):
+    # Yields the scan results of the heights that failed in an earlier run, then of heights. Blocks that
+    # could not be fetched are rescanned in up to retry_rounds rounds with growing, jittered pauses.
+    # A failed block yields output lines None and never holds up the rest of the range.
+    batches = [sorted(failed), heights]
+    for round_number in range(retry_rounds + 1):
+        if round_number:
+            delay = backoff_delay(round_number - 1, RETRY_ROUND_DELAY, MAX_RETRY_ROUND_DELAY)
+            print(f"\nRetrying {len(batches[0])} failed blocks in {delay:.0f}s")
+            time.sleep(delay)
+        retry = []
+        for batch in batches:
+            for result in scan(batch) if len(batch) else ():
+                if result[2] is None:
+                    retry.append(result[0])
+                yield result
+        if not retry:
+            return
+        batches = [sorted(retry)]
+
+def main(start_block, end_block, output_file, batch_size=100, in_flight=8, workers=1, raw_blocks=False,
+         with_z=False, prevout_cache_size=1000000, prevout_cache_dir=None, cache_dir=None, cache_size=8 << 30,
+         r_index_dir=None, output_format='text', flush_blocks=1, flush_interval=None, fsync=False,
+         compression=None, shard_blocks=None, reorg_depth=0, retry_rounds=DEFAULT_RETRY_ROUNDS,
+         progress_interval=1.0, metrics_file=None, metrics_interval=10.0, profile_blocks=0, profile_output=None,
+         exit_on_error=True, stop_event=None):
+    # exit_on_error=False raises scan errors to the caller instead of exiting, as follow() and the
+    # coordinator's workers need. stop_event, once set, ends the scan after the block being written.
+    global rpc_client, prevout_cache, block_profiler
     if start_block < 0 or end_block < start_block:
+        if not exit_on_error:
+            raise ValueError(f"Invalid block range {start_block}-{end_block}")
         # print("错误: 区块范围不合法") # Original Chinese print statement
         print("Error: Invalid block range") # English translation
         sys.exit(1)
 
     total_blocks = end_block - start_block + 1
+    checkpoint_file = output_file + '.checkpoint'
+
+    binary_output = output_format == 'binary'
+    text_writer = None
+    # Resume after the last committed height, dropping anything written after it
+    if binary_output:
+        checkpoint = read_checkpoint(checkpoint_file)
+        output_size = os.path.getsize(output_file) if os.path.exists(output_file) else 0
+        if checkpoint and start_block - 1 <= checkpoint['height'] <= end_block and checkpoint['offset'] <= output_size:
+            resume_block, offset = checkpoint['height'] + 1, checkpoint['offset']
+            failed = {height for height in checkpoint.get('failed', []) if start_block <= height <= end_block}
+        else:
+            resume_block, offset, failed = start_block, 0, set()
+    else:
+        # Whole blocks are committed in groups; the checkpoint is the commit marker
+        text_writer = GroupCommitWriter(output_file, flush_blocks, flush_interval, fsync, compression,
+                                        shard_blocks=shard_blocks, journal_depth=reorg_depth)
+        resume_block = text_writer.resume(start_block, end_block)
+        failed = set(text_writer.failed)
+    if resume_block > start_block:
+        print(f"Resuming from block {resume_block} using {checkpoint_file}")
+
+    # One circuit breaker and one set of counters for this process and every worker
+    rpc_state = shared_state()
+    rpc_client.use_state(rpc_state)
+    # Stage timers and counters, likewise shared with the workers
+    metrics_state = shared_metrics_state()
+    METRICS.use_state(metrics_state)
+    reporter = ProgressReporter(METRICS, total_blocks, progress_interval, metrics_file, metrics_interval)
+    profile_output = profile_output or output_file + '.prof'
+    block_profiler = BlockProfiler(profile_output, profile_blocks)
+    base_client = rpc_client
+    if cache_dir:
+        rpc_client = build_rpc_client(rpc_client.url, RPC_USER, RPC_PASSWORD, cache_dir, cache_size,
+                                      pool_size=rpc_client.pool_size, state=rpc_state,
+                                      breaker_cooldown=rpc_client.breaker_cooldown)
+
+    pool = None
+    spill_dir = None
+    r_index = None
+    collisions_handle = None
+    if r_index_dir:
+        # Every signature is checked against all previously indexed history as it is scanned
+        r_index = RIndex(r_index_dir)
+        collisions_handle = open(output_file + '.collisions', 'a')
+        if text_writer is not None and text_writer.journal_depth:
+            # Occurrences of blocks past the last commit (an interrupted run) are removed; the rescan adds them
+            # again. Then every journaled record count is one at which no later block was indexed yet.
+            last_commit = text_writer.commits[-1] if text_writer.commits else None
+            if last_commit is not None and len(last_commit) > 3:
+                r_index.rollback(last_commit[0], since=last_commit[3])
+            text_writer.index_records = len(r_index)
+    if with_z:
+        # z needs the parsed transactions, so it always uses the raw block path
+        raw_blocks = True
+        spill_dir = tempfile.mkdtemp(prefix="prevouts_", dir=prevout_cache_dir)
+        if workers <= 1:
+            prevout_cache = build_prevout_cache(spill_dir, prevout_cache_size)
 
+    with_records = r_index is not None or binary_output
+    sig_writer = None
     try:
-        # Open the output file in write mode ('w')
-        with open(output_file, 'w') as file_handle:
-            for current_block in range(start_block, end_block + 1):
-                # Process each block, passing None for recorded_txids as deduplication is removed
-                process_block(current_block, file_handle, None)
-                # Update progress bar
-                print_progress(current_block - start_block + 1, total_blocks)
+        if binary_output:
+            # Records are buffered into chunks; the checkpoint only advances when a chunk is written
+            sig_writer = SigFileWriter(output_file, offset)
+        heights = range(resume_block, end_block + 1)
+        if workers > 1:
+            # Workers fetch and parse blocks; imap hands the results back in height order
+            pool = multiprocessing.Pool(workers, initializer=init_scan_worker,
+                                        initargs=(rpc_client.url, RPC_USER, RPC_PASSWORD, spill_dir,
+                                                  prevout_cache_size, cache_dir, cache_size, rpc_state,
+                                                  rpc_client.breaker_cooldown, metrics_state, profile_output,
+                                                  profile_blocks))
+            scan = functools.partial(pool.imap, functools.partial(scan_block, raw_blocks=raw_blocks,
+                                                                   with_records=with_records),
+                                     chunksize=max(1, in_flight // workers))
+        else:
+            scan = functools.partial(iter_scanned_blocks, batch_size=batch_size, in_flight=in_flight,
+                                     raw_blocks=raw_blocks, with_records=with_records)
+
+        progress = start_block - 1
+        for height, block_hash, lines, records in iter_with_retries(scan, heights, failed, retry_rounds):
+            if stop_event is not None and stop_event.is_set():
+                print(f"\nStopping before block {height}")
+                break
+            if lines is None:
+                # Committed as failed; retried later in this run or on the next one
+                failed.add(height)
+                if binary_output:
+                    sig_writer.add_block(height, ())
+                else:
+                    text_writer.add_failed(height)
+                continue
+            failed.discard(height)
+            with METRICS.timer('write'):
+                if records and r_index is not None:
+                    # Indexed before the checkpoint; re-adding a block after a resume is a no-op
+                    for r, occurrences in r_index.add((r, txid, input_index, height)
+                                                      for txid, input_index, r, _, _, _ in records):
+                        collisions_handle.writelines(format_collision(r, occurrences))
+                    collisions_handle.flush()
+                    if text_writer is not None:
+                        text_writer.index_records = len(r_index)
+                if binary_output:
+                    if sig_writer.add_block(height, records or ()):
+                        if fsync:
+                            sig_writer.sync()
+                        save_checkpoint(checkpoint_file, sig_writer.last_height, sig_writer.data_end, fsync,
+                                        {'failed': sorted(failed)})
+                else:
+                    text_writer.add_block(height, lines, block_hash)
+            METRICS.count('blocks')
+            METRICS.count('signatures', len(records) if records is not None else
+                          sum(1 for line in lines if line.startswith('  ')))
+            # The progress line is rate-limited; console output is not free at thousands of blocks per second
+            progress = max(progress, height)
+            rates = reporter.tick(progress - start_block + 1)
+            if rates is not None:
+                print_progress(progress - start_block + 1, total_blocks, rates)
+
+        print(f"\n{format_stage_table(reporter.close())}")
+        counters = rpc_client.counters()
+        if counters['failures']:
+            print(f"\nRPC: {counters['requests']} requests, {counters['failures']} failed, {counters['retries']} "
+                  f"retried, {counters['breaker_trips']} circuit breaker pauses")
+        if failed:
+            print(f"\n{len(failed)} blocks could not be fetched and are retried on the next run: "
+                  f"{', '.join(map(str, sorted(failed)))}")
+    except RPCAuthError as e:
+        if not exit_on_error:
+            raise
+        print(f"\nError: {e}")
+        sys.exit(1)
     except Exception as e:
+        if not exit_on_error:
+            raise
         # print(f"写入文件时发生错误: {e}") # Original Chinese print statement
         print(f"An error occurred while writing to the file: {e}") # English translation
         sys.exit(1)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        # Every block handed to a writer is complete, so the pending blocks are committed as well
+        if text_writer is not None:
+            text_writer.close()
+        if sig_writer is not None:
+            sig_writer.close()
+            if sig_writer.last_height is not None:
+                save_checkpoint(checkpoint_file, sig_writer.last_height, sig_writer.data_end, fsync,
+                                {'failed': sorted(failed)})
+        if prevout_cache is not None:
+            prevout_cache.close()
+            prevout_cache = None
+        if spill_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+        if cache_dir:
+            rpc_client.close()
+            rpc_client = base_client
+        if r_index is not None:
+            r_index.close()
+            collisions_handle.close()
 
     print()  # Add a newline to clear the progress bar line
 
-if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        # print("用法: python3 extract_data.py <start_block> <end_block> <output_file>") # Original Chinese print statement
-        print("Usage: python3 extract_data.py <start_block> <end_block> <output_file>") # English translation
-        sys.exit(1)
+def wait_for_block(height, timeout):
+    # Waits inside the node until the chain reaches height or timeout seconds pass, without polling.
+    # Returns False when the node does not offer waitforblockheight.
+    result = rpc_client.call('waitforblockheight', [height, int(timeout * 1000)], timeout=timeout + 30)
+    return result is not None
 
-    try:
-        start_block = int(sys.argv[1])
-        end_block = int(sys.argv[2])
-        output_file = sys.argv[3]
-    except ValueError:
-        # print("区块高度参数无效，请输入整数。") # Original Chinese print statement
-        print("Invalid block height arguments. Please provide integers.") # English translation
+def find_fork(blocks):
+    # blocks are the journaled [height, hash] pairs of the committed blocks, oldest first.
+    # Returns None while the newest of them is still on the node's best chain, otherwise the highest
+    # journaled height the node still agrees with (-1 if none). A block that could not be fetched has
+    # no journal entry; its height stays in the checkpoint's failed list until a retry scans it.
+    top_height, top_hash = blocks[-1]
+    if top_hash and get_block_hashes([top_height])[0] == top_hash:
+        return None
+    node_hashes = get_block_hashes([height for height, _ in blocks])
+    if not any(node_hashes):
+        # The node answered every call with an error (e.g. while it loads), which says nothing about a fork
+        raise RuntimeError("The node returned none of the journaled block hashes")
+    matching = [height for (height, block_hash), node_hash in zip(blocks, node_hashes)
+                if block_hash and block_hash == node_hash]
+    return max(matching, default=-1)
+
+def roll_back(checkpoint_file, checkpoint, fork, r_index_dir=None, fsync=False):
+    # Cuts the output and the R index back to the last commit at or below the fork
+    commit = rollback_point(checkpoint, fork)
+    if commit is None:
+        print(f"Error: Chain reorganization below block {fork + 1} is deeper than the journal (--reorg-depth)")
         sys.exit(1)
+    height = commit[0]
+    # The index goes first: if the checkpoint is not moved back yet, the fork is found again next time
+    if r_index_dir:
+        with RIndex(r_index_dir) as r_index:
+            # Commits journal the index size; older checkpoints do not, and the whole index is read
+            r_index.rollback(height, since=commit[3] if len(commit) > 3 else 0)
+    save_rollback(checkpoint_file, checkpoint, commit, fsync)
+    print(f"Chain reorganization after block {fork}: rolled back to block {height}")
+
+def follow(start_block, output_file, poll_interval=10, **scan_options):
+    # Scans up to the node's tip, then waits for every new block and scans it as soon as it arrives.
+    # Reorganizations are detected with the block hashes journaled in the checkpoint.
+    # Errors (node unreachable, a failed write) are logged and retried with a growing delay; only a
+    # reorganization deeper than the journal or refused credentials end the follower.
+    scan_options.setdefault('reorg_depth', DEFAULT_REORG_DEPTH)
+    checkpoint_file = output_file + '.checkpoint'
+    waiting = True
+    errors = 0
+    while True:
+        try:
+            checkpoint = read_checkpoint(checkpoint_file)
+            if checkpoint and checkpoint.get('blocks'):
+                fork = find_fork(checkpoint['blocks'])
+                if fork is not None:
+                    roll_back(checkpoint_file, checkpoint, fork, scan_options.get('r_index_dir'),
+                              scan_options.get('fsync', False))
+                    checkpoint = read_checkpoint(checkpoint_file)
+            next_block = max(start_block, checkpoint['height'] + 1) if checkpoint else start_block
+
+            tip = rpc_request('getblockcount')
+            if tip is not None and tip >= next_block:
+                main(start_block, tip, output_file, exit_on_error=False, **scan_options)
+                errors = 0
+                continue
+            if waiting and not wait_for_block(next_block, poll_interval):
+                print("The node does not support waitforblockheight, polling getblockcount instead")
+                waiting = False
+            errors = 0
+        except RPCAuthError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        except Exception as e:
+            errors += 1
+            delay = min(MAX_RETRY_ROUND_DELAY, poll_interval * 2 ** min(errors - 1, 10))
+            print(f"Error while following the chain: {e}; retrying in {delay:.0f}s")
+            time.sleep(delay)
+            continue
+        if not waiting:
+            time.sleep(poll_interval)
 
-    main(start_block, end_block, output_file)
-    
+def setup_arg_parser():
+    """Sets up the command-line argument parser."""
+    parser = argparse.ArgumentParser(
+        description="Extract ECDSA signature R and S values from a range of blocks via a node's JSON-RPC interface."
+    )
+    parser.add_argument("start_block", type=int, help="Block height to start scanning from.")
+    parser.add_argument("end_block", type=int, nargs="?",
+                        help="Block height to stop scanning at (inclusive); omitted with --follow.")
+    parser.add_argument("output_file", help="File to write the extracted signatures to.")
+    parser.add_argument("--batch-size", type=int, default=100,
+                        help="Number of getblockhash calls sent per JSON-RPC batch (default: 100).")
+    parser.add_argument("--in-flight", type=int, default=8,
+                        help="Maximum number of concurrent getblock requests (default: 8).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of scanner processes; more than 1 enables the parallel scan mode (default: 1).")
+    parser.add_argument("--raw-blocks", action="store_true",
+                        help="Fetch raw serialized blocks (getblock verbosity 0) and parse them locally.")
+    parser.add_argument("--with-z", action="store_true",
+                        help="Also compute the signature hash Z of every supported input (implies --raw-blocks).")
+    parser.add_argument("--prevout-cache-size", type=int, default=1000000,
+                        help="Prevouts kept in memory for --with-z before spilling to disk (default: 1000000).")
+    parser.add_argument("--prevout-cache-dir",
+                        help="Directory for the prevout cache spill file (default: system temp directory).")
+    parser.add_argument("--cache-dir",
+                        help="Keep fetched blocks and transactions in an on-disk cache in this directory; "
+                             "later runs over the same blocks read them from disk instead of the node.")
+    parser.add_argument("--cache-size", type=int, default=8192,
+                        help="Size cap of the --cache-dir cache in MiB; the oldest data is evicted first (default: 8192).")
+    parser.add_argument("--r-index",
+                        help="Add every signature to the persistent R index in this directory and append new "
+                             "R collisions to <output_file>.collisions.")
+    parser.add_argument("--format", choices=("text", "binary"), default="text",
+                        help="Output format: text lines, or a binary columnar signature file that sigfile.py "
+                             "reads and converts (default: text).")
+    durability = parser.add_argument_group("output durability")
+    durability.add_argument("--flush-blocks", type=int, default=1,
+                            help="Commit the output and checkpoint every N blocks (default: 1).")
+    durability.add_argument("--flush-interval", type=float,
+                            help="Also commit once this many seconds have passed since the last commit.")
+    durability.add_argument("--fsync", action="store_true",
+                            help="fsync the output and the checkpoint at every commit, so a commit survives a "
+                                 "power loss (also applies to --format binary).")
+    durability.add_argument("--compress", choices=("gzip", "zstd"),
+                            help="Compress the output stream; zstd needs the zstandard package.")
+    durability.add_argument("--shard-blocks", type=int,
+                            help="Rotate the output into one file per range of this many block heights, named "
+                                 "<output_file stem>.<first>-<last><extension>.")
+    follow_group = parser.add_argument_group("follow mode")
+    follow_group.add_argument("--follow", action="store_true",
+                              help="Scan up to the chain tip, then keep running and scan every new block as it "
+                                   "arrives. Chain reorganizations roll the output and the --r-index back.")
+    follow_group.add_argument("--poll-interval", type=float, default=10,
+                              help="Seconds each wait for a new block lasts before it is renewed (default: 10).")
+    follow_group.add_argument("--reorg-depth", type=int, default=DEFAULT_REORG_DEPTH,
+                              help=f"Recent blocks whose hashes are kept to detect and undo reorganizations "
+                                   f"(default: {DEFAULT_REORG_DEPTH}).")
+    resilience = parser.add_argument_group("node failures")
+    resilience.add_argument("--retry-rounds", type=int, default=DEFAULT_RETRY_ROUNDS,
+                            help=f"Rounds of retries, after the range, for blocks that could not be fetched "
+                                 f"(default: {DEFAULT_RETRY_ROUNDS}). Blocks still failing are retried on the next run.")
+    resilience.add_argument("--breaker-cooldown", type=float, default=30,
+                            help="Seconds all workers pause after repeated RPC failures before probing the node "
+                                 "again (default: 30).")
+    instrumentation = parser.add_argument_group("metrics")
+    instrumentation.add_argument("--progress-interval", type=float, default=1.0,
+                                 help="Seconds between progress line updates (default: 1).")
+    instrumentation.add_argument("--metrics-file",
+                                 help="Periodically write stage timings, counters and rates to this file: "
+                                      "JSON if it ends in .json, else the Prometheus text format.")
+    instrumentation.add_argument("--metrics-interval", type=float, default=10.0,
+                                 help="Seconds between --metrics-file updates (default: 10).")
+    instrumentation.add_argument("--profile-blocks", type=int, default=0, metavar="N",
+                                 help="Run cProfile on every N-th block.")
+    instrumentation.add_argument("--profile-output",
+                                 help="cProfile stats file (default: <output_file>.prof; worker processes "
+                                      "append their pid).")
+    return parser
+
+if __name__ == "__main__":
+    parser = setup_arg_parser()
+    args = parser.parse_args()
+    if args.format == "binary" and (args.compress or args.shard_blocks):
+        parser.error("--compress and --shard-blocks apply to the text format only")
+    if args.follow and (args.end_block is not None or args.format == "binary"):
+        parser.error("--follow takes no end_block and writes the text format")
+    if not args.follow and args.end_block is None:
+        parser.error("end_block is required unless --follow is given")
+    rpc_client.set_pool_size(max(rpc_client.pool_size, args.in_flight))
+    rpc_client.breaker_cooldown = args.breaker_cooldown
+    scan_options = dict(batch_size=args.batch_size, in_flight=args.in_flight, workers=args.workers,
+                        raw_blocks=args.raw_blocks, with_z=args.with_z, prevout_cache_size=args.prevout_cache_size,
+                        prevout_cache_dir=args.prevout_cache_dir, cache_dir=args.cache_dir,
+                        cache_size=args.cache_size << 20, r_index_dir=args.r_index, output_format=args.format,
+                        flush_blocks=args.flush_blocks, flush_interval=args.flush_interval, fsync=args.fsync,
+                        compression=args.compress, shard_blocks=args.shard_blocks, retry_rounds=args.retry_rounds,
+                        progress_interval=args.progress_interval, metrics_file=args.metrics_file,
+                        metrics_interval=args.metrics_interval, profile_blocks=args.profile_blocks,
+                        profile_output=args.profile_output)
+    if args.follow:
+        follow(args.start_block, args.output_file, args.poll_interval, reorg_depth=args.reorg_depth, **scan_options)
+    else:
+        main(args.start_block, args.end_block, args.output_file, **scan_options)
@@ -1,202 +1,278 @@
-# -*- coding: utf-8 -*-
-"""
-Bitcoin Transaction Signature Analyzer 
-Author: https://github.com/8891689
-"""
-import sys
-import hashlib
-import argparse
-import json
-from urllib import request, error
-from io import BytesIO
-
-def setup_arg_parser():
-    """Sets up the command-line argument parser."""
-    parser = argparse.ArgumentParser(
-        description="A tool to extract ECDSA signature components (r, s, z) from a Bitcoin transaction.",
-        epilog="BTC Tip Jar: bc1qt3nh2e6gjsfkfacnkglt5uqghzvlrr6jahyj2k"
-    )
-    parser.add_argument("-d", "--txid", help="Transaction ID. Fetches the raw transaction from a public API.", type=str)
-    parser.add_argument("-x", "--rawtx", help="The full raw transaction in hexadecimal format.", type=str)
-    return parser
-
-def fetch_raw_tx_from_api(txid: str) -> str:
-    """Fetches raw transaction hex from a block explorer API."""
-    url = f"https://blockstream.info/api/tx/{txid}/hex"
-    print(f"Fetching raw transaction for txid: {txid}...")
-    try:
-        with request.urlopen(url, timeout=20) as response:
-            if response.status == 200:
-                print("Successfully fetched raw transaction.")
-                return response.read().decode('utf-8')
-            else:
-                print(f"Error: API returned status code {response.status}")
-    except error.URLError as e:
-        print(f"Network error: Unable to connect to API. Details: {e.reason}")
-    sys.exit(1)
-
-class TxDataStream:
-    """A stream-like reader for raw transaction hex data."""
-    def __init__(self, raw_hex: str):
-        self._stream = BytesIO(bytes.fromhex(raw_hex))
-
-    def read_bytes(self, num_bytes: int) -> bytes:
-        data = self._stream.read(num_bytes)
-        if len(data) < num_bytes:
-            raise EOFError("Stream ended unexpectedly.")
-        return data
-
-    def read_hex(self, num_bytes: int) -> str:
-        return self.read_bytes(num_bytes).hex()
-
-    def read_varint(self) -> int:
-        val = int.from_bytes(self.read_bytes(1), 'little')
-        if val < 0xfd:
-            return val
-        if val == 0xfd:
-            return int.from_bytes(self.read_bytes(2), 'little')
-        if val == 0xfe:
-            return int.from_bytes(self.read_bytes(4), 'little')
-        if val == 0xff:
-            return int.from_bytes(self.read_bytes(8), 'little')
-        
-    def get_remaining_data_hex(self) -> str:
-        return self._stream.read().hex()
-
-def parse_der_signature(der_sig_bytes: bytes) -> (str, str):
-    """
-    Parses a DER-encoded signature to extract r and s values.
-    """
-    if der_sig_bytes[0] != 0x30:
-        raise ValueError("Signature is not a valid DER sequence.")
-    
-    r_marker_pos = 2
-    if der_sig_bytes[r_marker_pos] != 0x02:
-        raise ValueError("R component marker not found.")
-    r_len = der_sig_bytes[r_marker_pos + 1]
-    r_start = r_marker_pos + 2
-    r_val = der_sig_bytes[r_start : r_start + r_len]
-    
-    s_marker_pos = r_start + r_len
-    if der_sig_bytes[s_marker_pos] != 0x02:
-        raise ValueError("S component marker not found.")
-    s_len = der_sig_bytes[s_marker_pos + 1]
-    s_start = s_marker_pos + 2
-    s_val = der_sig_bytes[s_start : s_start + s_len]
-    
-    if r_val.startswith(b'\x00'): r_val = r_val[1:]
-    if s_val.startswith(b'\x00'): s_val = s_val[1:]
-
-    return r_val.hex(), s_val.hex()
-
-
-def double_sha256_hex(hex_str: str) -> str:
-    """Computes the double SHA-256 hash and returns a hex string."""
-    hash1 = hashlib.sha256(bytes.fromhex(hex_str)).digest()
-    hash2 = hashlib.sha256(hash1).digest()
-    return hash2.hex()
-
-def hash160_hex(hex_str: str) -> str:
-    """Computes the HASH160 and returns a hex string."""
-    sha_hash = hashlib.sha256(bytes.fromhex(hex_str)).digest()
-    ripemd_hash = hashlib.new('ripemd160', sha_hash).hexdigest()
-    return ripemd_hash
-
-def analyze_transaction_signatures(raw_tx_hex: str):
-    """
-    Analyzes a raw transaction to extract signature components for each input.
-    """
-    stream = TxDataStream(raw_tx_hex)
-    
-    version_hex = stream.read_hex(4)
-
-    possible_marker = stream._stream.read(2)
-    if possible_marker == b'\x00\x01':
-        print("Unsupported Transaction Type: SegWit transactions are not handled.")
-        sys.exit(1)
-    
-    stream._stream.seek(stream._stream.tell() - 2)
-
-    input_count = stream.read_varint()
-    
-    inputs_data = []
-    for _ in range(input_count):
-        prev_txid_rev = stream.read_hex(32)
-        output_index_hex = stream.read_hex(4)
-        
-        script_len = stream.read_varint()
-        script_stream = TxDataStream(stream.read_hex(script_len))
-        
-        sig_pushdata_len = script_stream.read_varint()
-        full_sig_bytes = script_stream.read_bytes(sig_pushdata_len)
-        
-        der_sig_bytes = full_sig_bytes[:-1]
-        r, s = parse_der_signature(der_sig_bytes)
-        
-        pubkey_pushdata_len = script_stream.read_varint()
-        pubkey_hex = script_stream.read_hex(pubkey_pushdata_len)
-
-        sequence = stream.read_hex(4)
-        
-        inputs_data.append({
-            "prev_tx": prev_txid_rev,
-            "prev_out_index": output_index_hex,
-            "pubkey": pubkey_hex,
-            "sequence": sequence,
-            "r": r,
-            "s": s
-        })
-    
-    outputs_and_locktime = stream.get_remaining_data_hex()
-    
-    base_tx_part1 = f"{version_hex}{input_count:02x}"
-    base_tx_part3 = f"{outputs_and_locktime}01000000"
-
-    for i, data in enumerate(inputs_data):
-        middle_part = ""
-        for j, other_data in enumerate(inputs_data):
-            middle_part += other_data["prev_tx"]
-            middle_part += other_data["prev_out_index"]
-            if i == j:
-                pubkey_hash = hash160_hex(data["pubkey"])
-                script_pubkey = f"76a914{pubkey_hash}88ac"
-                middle_part += f"{len(bytes.fromhex(script_pubkey)):02x}{script_pubkey}"
-            else:
-                middle_part += "00"
-            middle_part += other_data["sequence"]
-
-        tx_to_sign = base_tx_part1 + middle_part + base_tx_part3
-        data['z'] = double_sha256_hex(tx_to_sign)
-    
-    return inputs_data
-
-def main():
-    parser = setup_arg_parser()
-    args = parser.parse_args()
-
-    if not args.txid and not args.rawtx:
-        parser.print_help()
-        sys.exit(1)
-
-    raw_tx_hex = args.rawtx if args.rawtx else fetch_raw_tx_from_api(args.txid)
-    
-    if not raw_tx_hex:
-        print("Could not obtain raw transaction data. Exiting.")
-        return
-
-    print("\nAnalyzing Transaction...")
-    analysis_results = analyze_transaction_signatures(raw_tx_hex)
-
-    for i, result in enumerate(analysis_results):
-        print("=" * 70)
-        print(f"[Input Index #: {i}]")
-        print(f"     R: {result['r']}")
-        print(f"     S: {result['s']}")
-        print(f"     Z: {result['z']}")
-        print(f"PubKey: {result['pubkey']}")
-        
-    print("=" * 70)
-    print("\nAnalysis complete.")
-
-if __name__ == '__main__':
-    main()
+# -*- coding: utf-8 -*-
+"""
+Bitcoin Transaction Signature Analyzer 
+Author: https://github.com/8891689
+"""
+import sys
+import hashlib
+import argparse
+import json
+from urllib import request, error
+
+import script_parser
+from script_parser import ByteReader, strip_integer_padding
+from block_parser import parse_transaction
+from sighash import transaction_z_values
+from prevouts import DictPrevoutProvider, RPCPrevoutProvider, EsploraPrevoutProvider
+from signature_records import InputSignature
+
+DEFAULT_API_URL = "https://blockstream.info/api"
+BATCH_FIELDS = ["txid", "input_index", "r", "s", "z", "pubkey", "error"]
+
+def setup_arg_parser():
+    """Sets up the command-line argument parser."""
+    parser = argparse.ArgumentParser(
+        description="A tool to extract ECDSA signature components (r, s, z) from a Bitcoin transaction.",
+        epilog="BTC Tip Jar: bc1qt3nh2e6gjsfkfacnkglt5uqghzvlrr6jahyj2k"
+    )
+    parser.add_argument("-d", "--txid", help="Transaction ID. Fetches the raw transaction from a public API.", type=str)
+    parser.add_argument("-x", "--rawtx", help="The full raw transaction in hexadecimal format.", type=str)
+    parser.add_argument("--prevouts", help="JSON fixture of spent outputs, {\"txid:index\": {\"value\": sats, \"script_pubkey\": hex}}.", type=str)
+    parser.add_argument("--rpc-url", help="Look spent outputs up on a local node (requires txindex=1), e.g. http://127.0.0.1:8332.", type=str)
+    parser.add_argument("--rpc-user", help="RPC username for --rpc-url.", type=str, default="")
+    parser.add_argument("--rpc-password", help="RPC password for --rpc-url.", type=str, default="")
+    parser.add_argument("--api-url", help=f"Esplora API used to fetch transactions (default: {DEFAULT_API_URL}).",
+                        type=str, default=DEFAULT_API_URL)
+    parser.add_argument("--cache-dir", help="Keep fetched transactions in an on-disk cache in this directory, so they are only downloaded once.", type=str)
+    parser.add_argument("--cache-size", help="Size cap of the --cache-dir cache in MiB (default: 8192).", type=int, default=8192)
+    batch = parser.add_argument_group("batch mode")
+    batch.add_argument("-f", "--file", help="Analyze every txid or raw transaction hex listed in FILE, one per line ('-' for stdin).", type=str)
+    batch.add_argument("-o", "--output", help="Write batch results to this file instead of stdout.", type=str)
+    batch.add_argument("--format", help="Batch output format (default: jsonl).", choices=["jsonl", "csv"], default="jsonl")
+    batch.add_argument("--workers", help="Number of parallel fetch/analysis worker processes (default: 4).", type=int, default=4)
+    return parser
+
+def open_raw_cache(args):
+    """Opens the on-disk transaction cache selected by --cache-dir, if any."""
+    if not args.cache_dir:
+        return None
+    from raw_cache import RawDataCache
+    return RawDataCache(args.cache_dir, args.cache_size << 20)
+
+def build_rpc_client(args, cache=None, **kwargs):
+    """Connects to the node given by --rpc-url, answering from the cache first when there is one."""
+    if cache is not None:
+        from raw_cache import CachingRPCClient
+        return CachingRPCClient(args.rpc_url, args.rpc_user, args.rpc_password, cache, **kwargs)
+    from rpc_client import RPCClient
+    return RPCClient(args.rpc_url, args.rpc_user, args.rpc_password, **kwargs)
+
+def build_prevout_provider(args, cache=None):
+    """
+    Chooses where SegWit input amounts come from: a fixture file, a local node,
+    or the public API already used for -d.
+    """
+    if args.prevouts:
+        return DictPrevoutProvider.from_json(args.prevouts)
+    if args.rpc_url:
+        return RPCPrevoutProvider(build_rpc_client(args, cache))
+    if args.txid or getattr(args, "file", None):
+        return EsploraPrevoutProvider(args.api_url, cache=cache)
+    return None
+
+class TxFetchError(Exception):
+    """Raised when a raw transaction cannot be fetched."""
+
+def fetch_raw_tx(txid: str, api_url: str = DEFAULT_API_URL, cache=None) -> str:
+    """
+    Fetches raw transaction hex from a block explorer API, raising TxFetchError
+    on failure. Transactions found in the cache are not downloaded again.
+    """
+    if cache is not None:
+        raw_tx_hex = cache.get_raw_tx(txid)
+        if raw_tx_hex is not None:
+            return raw_tx_hex
+    try:
+        with request.urlopen(f"{api_url.rstrip('/')}/tx/{txid}/hex", timeout=20) as response:
+            if response.status == 200:
+                raw_tx_hex = response.read().decode('utf-8').strip()
+                if cache is not None:
+                    cache.put_raw_tx(txid, raw_tx_hex)
+                return raw_tx_hex
+            raise TxFetchError(f"API returned status code {response.status}")
+    except error.URLError as e:
+        raise TxFetchError(f"Unable to connect to API. Details: {e.reason}")
+
+def fetch_raw_tx_from_api(txid: str, api_url: str = DEFAULT_API_URL, cache=None) -> str:
+    """Fetches raw transaction hex from a block explorer API."""
+    print(f"Fetching raw transaction for txid: {txid}...")
+    try:
+        raw_tx_hex = fetch_raw_tx(txid, api_url, cache)
+    except TxFetchError as e:
+        print(f"Network error: {e}")
+        sys.exit(1)
+    print("Successfully fetched raw transaction.")
+    return raw_tx_hex
+
+class TxDataStream(ByteReader):
+    """A stream-like reader for raw transaction data, given as hex or as bytes."""
+    def read_bytes(self, num_bytes: int) -> bytes:
+        return bytes(self.read(num_bytes))
+
+    def read_hex(self, num_bytes: int) -> str:
+        return self.read(num_bytes).hex()
+
+    def get_remaining_data_hex(self) -> str:
+        data = self.remaining()
+        self.pos = len(self.view)
+        return data.hex()
+
+    def slice_bytes(self, start: int, end: int) -> bytes:
+        """Returns the raw bytes between two stream positions without moving the stream."""
+        return bytes(self.slice(start, end))
+
+def parse_der_signature(der_sig_bytes: bytes) -> (str, str):
+    """
+    Parses a DER-encoded signature (without sighash byte) to extract r and s values.
+    """
+    r_val, s_val, _ = script_parser.parse_der_signature(der_sig_bytes, strict=False, has_sighash=False)
+    return strip_integer_padding(r_val).hex(), strip_integer_padding(s_val).hex()
+
+
+def double_sha256_hex(hex_str: str) -> str:
+    """Computes the double SHA-256 hash and returns a hex string."""
+    hash1 = hashlib.sha256(bytes.fromhex(hex_str)).digest()
+    hash2 = hashlib.sha256(hash1).digest()
+    return hash2.hex()
+
+def hash160_hex(hex_str: str) -> str:
+    """Computes the HASH160 and returns a hex string."""
+    sha_hash = hashlib.sha256(bytes.fromhex(hex_str)).digest()
+    ripemd_hash = hashlib.new('ripemd160', sha_hash).hexdigest()
+    return ripemd_hash
+
+def analyze_transaction_signatures(raw_tx_hex: str, prevout_provider=None):
+    """
+    Analyzes a raw transaction to extract signature components for each input.
+    SegWit inputs need prevout_provider to look up the amounts they spend.
+    Returns InputSignature records holding raw bytes; to_dict() gives the hex form.
+    """
+    tx = parse_transaction(TxDataStream(raw_tx_hex))
+
+    inputs_data = []
+    for i, (signatures, pubkey) in enumerate(transaction_z_values(tx, prevout_provider)):
+        tx_input = tx["vin"][i]
+        prev_txid = bytes(tx_input["prev_txid"])
+        pubkey = bytes(pubkey) if pubkey is not None else None
+        for r_val, s_val, z in signatures:
+            inputs_data.append(InputSignature(tx["txid"], i, prev_txid, tx_input["prev_index"], tx_input["sequence"],
+                                              pubkey, bytes(strip_integer_padding(r_val)),
+                                              bytes(strip_integer_padding(s_val)), z))
+
+    return inputs_data
+
+def init_batch_worker(args):
+    """Prepares the transaction source and prevout provider of one batch worker process."""
+    global batch_args, batch_cache, batch_rpc_client, batch_prevout_provider
+    # Diagnostics go to stderr so they never interleave with results streamed to stdout
+    sys.stdout = sys.stderr
+    batch_args = args
+    batch_cache = open_raw_cache(args)
+    batch_rpc_client = None
+    if args.rpc_url:
+        batch_rpc_client = build_rpc_client(args, batch_cache, pool_size=1, retry_delay=1)
+    batch_prevout_provider = build_prevout_provider(args, batch_cache)
+
+def analyze_batch_entry(entry: str) -> list:
+    """
+    Worker: fetches (for a txid) and analyzes one batch entry. Errors are
+    reported as a record instead of stopping the run.
+    """
+    is_txid = len(entry) == 64
+    try:
+        if not is_txid:
+            raw_tx_hex = entry
+        elif batch_rpc_client is not None:
+            raw_tx_hex = batch_rpc_client.call('getrawtransaction', [entry, False])
+            if not raw_tx_hex:
+                raise TxFetchError("Transaction not found on the node.")
+        else:
+            raw_tx_hex = fetch_raw_tx(entry, batch_args.api_url, batch_cache)
+        results = analyze_transaction_signatures(raw_tx_hex, batch_prevout_provider)
+        if not results:
+            return [{"txid": entry if is_txid else None, "error": "No signatures found."}]
+        return results
+    except Exception as e:
+        return [{"txid": entry if is_txid else None, "error": f"{type(e).__name__}: {e}"}]
+
+def read_batch_entries(path: str):
+    """Yields non-empty, non-comment lines of a file, or of stdin for '-'."""
+    source = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        for line in source:
+            entry = line.strip()
+            if entry and not entry.startswith('#'):
+                yield entry
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+def run_batch(args):
+    """Analyzes many transactions in a worker pool and streams one record per signature."""
+    import csv
+    from multiprocessing import Pool
+
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    writer = None
+    if args.format == "csv":
+        writer = csv.DictWriter(out, fieldnames=BATCH_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+
+    processed = failed = 0
+    try:
+        with Pool(args.workers, initializer=init_batch_worker, initargs=(args,)) as pool:
+            # imap keeps at most a few chunks in flight and yields results in input order
+            for records in pool.imap(analyze_batch_entry, read_batch_entries(args.file), chunksize=4):
+                processed += 1
+                for record in records:
+                    # Hex conversion happens here, at the output; error records are already dicts
+                    if isinstance(record, InputSignature):
+                        record = record.to_dict()
+                    failed += "error" in record
+                    if writer is not None:
+                        writer.writerow(record)
+                    else:
+                        out.write(json.dumps({field: record.get(field) for field in BATCH_FIELDS if field in record}) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"Processed {processed} transactions, {failed} failed.", file=sys.stderr)
+
+def main():
+    parser = setup_arg_parser()
+    args = parser.parse_args()
+
+    if args.file:
+        run_batch(args)
+        return
+
+    if not args.txid and not args.rawtx:
+        parser.print_help()
+        sys.exit(1)
+
+    cache = open_raw_cache(args)
+    raw_tx_hex = args.rawtx if args.rawtx else fetch_raw_tx_from_api(args.txid, args.api_url, cache)
+    
+    if not raw_tx_hex:
+        print("Could not obtain raw transaction data. Exiting.")
+        return
+
+    print("\nAnalyzing Transaction...")
+    analysis_results = analyze_transaction_signatures(raw_tx_hex, build_prevout_provider(args, cache))
+
+    for result in map(InputSignature.to_dict, analysis_results):
+        print("=" * 70)
+        print(f"[Input Index #: {result['input_index']}]")
+        print(f"     R: {result['r']}")
+        print(f"     S: {result['s']}")
+        print(f"     Z: {result['z'] or 'unavailable (prevout amount or script unknown)'}")
+        if result['pubkey']:
+            print(f"PubKey: {result['pubkey']}")
+        
+    print("=" * 70)
+    print("\nAnalysis complete.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Stage Timers, Throughput Rates and Metrics Export for Extraction Runs
+Author: https://github.com/8891689
+
+Every stage of a scan (RPC round trip, JSON decode, block and script
+parsing, sighash computation, output writes) is timed into a histogram with
+power-of-two microsecond buckets. The histograms and the block and
+signature counters live in one flat array. With shared_state() that array
+is shared by the worker processes, so the main process sees the totals of
+all of them without any messages.
+
+ProgressReporter rate-limits the progress line, adds rolling and overall
+blocks/s and sigs/s, and periodically writes a snapshot as JSON (a path
+ending in .json) or in the Prometheus text format (anything else, e.g. for
+the node_exporter textfile collector).
+
+BlockProfiler runs cProfile for every n-th block and keeps the accumulated
+stats in a file that `python -m pstats` reads.
+"""
+import cProfile
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# Stages nest where the work does: parse includes sighash and the prevout lookups of --with-z (also timed as rpc)
+STAGES = ("rpc", "decode", "parse", "sighash", "write")
+COUNTERS = ("blocks", "signatures")
+# Bucket b counts durations of less than 2 ** b microseconds (and at least 2 ** (b - 1)); the last one is open
+BUCKETS = 32
+# count, total seconds, max seconds, then the buckets
+STAGE_WIDTH = 3 + BUCKETS
+STATE_SIZE = len(STAGES) * STAGE_WIDTH + len(COUNTERS)
+
+
+def shared_state():
+    """Returns metrics state that Metrics instances in several processes can share."""
+    return multiprocessing.Array('d', STATE_SIZE)
+
+
+def bucket_bound(bucket: int) -> float:
+    """Upper bound of a histogram bucket in seconds."""
+    return (1 << bucket) / 1e6
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """Stage histograms and counters of a scan; see shared_state for several processes."""
+    def __init__(self, state=None):
+        self.use_state(state)
+
+    def use_state(self, state=None):
+        """Starts over on state (from shared_state), or on a fresh state of this process only."""
+        if state is None:
+            state = [0.0] * STATE_SIZE
+            lock = threading.Lock()
+        else:
+            lock = state.get_lock()
+        self._state = state
+        self._lock = lock
+
+    def timer(self, stage: str) -> _Timer:
+        """A context manager that records the time spent inside it under stage."""
+        return _Timer(self, stage)
+
+    def record(self, stage: str, seconds: float):
+        base = STAGES.index(stage) * STAGE_WIDTH
+        bucket = min(BUCKETS - 1, int(seconds * 1e6).bit_length())
+        state = self._state
+        with self._lock:
+            state[base] += 1
+            state[base + 1] += seconds
+            if seconds > state[base + 2]:
+                state[base + 2] = seconds
+            state[base + 3 + bucket] += 1
+
+    def count(self, counter: str, amount: int = 1):
+        index = len(STAGES) * STAGE_WIDTH + COUNTERS.index(counter)
+        with self._lock:
+            self._state[index] += amount
+
+    def counters(self) -> dict:
+        base = len(STAGES) * STAGE_WIDTH
+        return {counter: int(self._state[base + index]) for index, counter in enumerate(COUNTERS)}
+
+    def stage(self, stage: str) -> dict:
+        """count, total, mean, max and approximate p50/p90/p99 (bucket upper bounds) of a stage, in seconds."""
+        base = STAGES.index(stage) * STAGE_WIDTH
+        with self._lock:
+            values = list(self._state[base:base + STAGE_WIDTH])
+        count, total, maximum, buckets = int(values[0]), values[1], values[2], values[3:]
+        summary = {'count': count, 'total': total, 'mean': total / count if count else 0.0, 'max': maximum,
+                   'buckets': [int(bucket) for bucket in buckets]}
+        for name, quantile in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+            summary[name] = self._quantile(buckets, count, quantile, maximum)
+        return summary
+
+    @staticmethod
+    def _quantile(buckets, count: int, quantile: float, maximum: float) -> float:
+        if not count:
+            return 0.0
+        seen = 0
+        for bucket, bucket_count in enumerate(buckets):
+            seen += bucket_count
+            if seen >= quantile * count:
+                return min(bucket_bound(bucket), maximum)
+        return maximum
+
+    def snapshot(self) -> dict:
+        return {'counters': self.counters(), 'stages': {stage: self.stage(stage) for stage in STAGES}}
+
+
+# The metrics of this process; scan workers switch it to the state shared with the main process
+METRICS = Metrics()
+
+
+def format_prometheus(snapshot: dict, prefix: str = "rsz_extract") -> str:
+    """Renders a snapshot in the Prometheus text exposition format."""
+    lines = []
+    for counter, value in snapshot['counters'].items():
+        lines.append(f"# TYPE {prefix}_{counter}_total counter")
+        lines.append(f"{prefix}_{counter}_total {value}")
+    for name, value in snapshot.get('rates', {}).items():
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        lines.append(f"{prefix}_{name} {value:.6g}")
+    for name in ('done', 'total'):
+        if name in snapshot:
+            lines.append(f"{prefix}_progress_{name} {snapshot[name]}")
+    metric = f"{prefix}_stage_seconds"
+    lines.append(f"# TYPE {metric} histogram")
+    for stage, summary in snapshot['stages'].items():
+        cumulative = 0
+        for bucket, bucket_count in enumerate(summary['buckets'][:-1]):
+            cumulative += bucket_count
+            lines.append(f'{metric}_bucket{{stage="{stage}",le="{bucket_bound(bucket):g}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {summary["count"]}')
+        lines.append(f'{metric}_sum{{stage="{stage}"}} {summary["total"]:.6f}')
+        lines.append(f'{metric}_count{{stage="{stage}"}} {summary["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(path: str, snapshot: dict):
+    """Writes a snapshot as JSON or Prometheus text, replacing the file atomically."""
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w') as f:
+        if path.endswith('.json'):
+            json.dump(snapshot, f, indent=1)
+        else:
+            f.write(format_prometheus(snapshot))
+    os.replace(tmp_file, path)
+
+
+def format_stage_table(snapshot: dict) -> str:
+    """A table of the stage timings, for the end of a run."""
+    lines = [f"{'stage':<10}{'count':>10}{'total s':>11}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+    for stage, summary in snapshot['stages'].items():
+        if summary['count']:
+            lines.append(f"{stage:<10}{summary['count']:>10}{summary['total']:>11.2f}{summary['mean'] * 1e3:>10.2f}"
+                         f"{summary['p50'] * 1e3:>10.2f}{summary['p99'] * 1e3:>10.2f}{summary['max'] * 1e3:>10.2f}")
+    return '\n'.join(lines)
+
+
+class ProgressReporter:
+    """
+    Decides when the progress line is due (at most every interval seconds,
+    and always at the end), computes the rates for it, and exports a
+    snapshot every export_interval seconds when export_path is set. The
+    rolling rates cover the last window seconds.
+    """
+    def __init__(self, metrics: Metrics, total: int, interval: float = 1.0, export_path: str = None,
+                 export_interval: float = 10.0, window: float = 30.0):
+        self.metrics = metrics
+        self.total = total
+        self.interval = interval
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self.window = window
+        self.done = 0
+        self.start = time.monotonic()
+        self._samples = deque([(self.start, 0, 0)])
+        self._last_print = None
+        self._last_export = self.start
+
+    def tick(self, done: int):
+        """Records progress; returns the rates text when a progress line is due, else None."""
+        self.done = done
+        now = time.monotonic()
+        if self.export_path and now - self._last_export >= self.export_interval:
+            self.export()
+        if self._last_print is not None and now - self._last_print < self.interval and done < self.total:
+            return None
+        self._last_print = now
+        rates = self.rates(now)
+        return (f"{rates['blocks_per_second']:.1f} blocks/s, {rates['signatures_per_second']:.0f} sigs/s "
+                f"(overall {rates['overall_blocks_per_second']:.1f} blocks/s)")
+
+    def rates(self, now: float = None) -> dict:
+        now = time.monotonic() if now is None else now
+        counters = self.metrics.counters()
+        samples = self._samples
+        samples.append((now, counters['blocks'], counters['signatures']))
+        while len(samples) > 2 and now - samples[1][0] >= self.window:
+            samples.popleft()
+        first_time, first_blocks, first_signatures = samples[0]
+        recent = max(now - first_time, 1e-9)
+        elapsed = max(now - self.start, 1e-9)
+        return {
+            'blocks_per_second': (counters['blocks'] - first_blocks) / recent,
+            'signatures_per_second': (counters['signatures'] - first_signatures) / recent,
+            'overall_blocks_per_second': counters['blocks'] / elapsed,
+            'overall_signatures_per_second': counters['signatures'] / elapsed,
+        }
+
+    def snapshot(self) -> dict:
+        snapshot = self.metrics.snapshot()
+        snapshot.update(time=time.time(), elapsed=time.monotonic() - self.start, done=self.done,
+                        total=self.total, rates=self.rates())
+        return snapshot
+
+    def export(self):
+        self._last_export = time.monotonic()
+        write_metrics(self.export_path, self.snapshot())
+
+    def close(self) -> dict:
+        """Writes the final snapshot and returns it."""
+        snapshot = self.snapshot()
+        if self.export_path:
+            write_metrics(self.export_path, snapshot)
+        return snapshot
+
+
+class BlockProfiler:
+    """
+    Profiles every sample_every-th block with cProfile (sample_every 0:
+    never). The accumulated stats are written to path after each profiled
+    block, so they survive a worker process that is terminated.
+    """
+    def __init__(self, path: str = None, sample_every: int = 0):
+        self.path = path
+        self.sample_every = sample_every if path else 0
+        self._profile = None
+
+    def profile(self, height: int):
+        """A context manager that profiles the block at height if it is sampled."""
+        if not self.sample_every or height % self.sample_every:
+            return nullcontext()
+        return self._profiling()
+
+    @contextmanager
+    def _profiling(self):
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+        self._profile.enable()
+        try:
+            yield
+        finally:
+            self._profile.disable()
+            self._profile.dump_stats(self.path)
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Previous Output (Prevout) Providers
+Author: https://github.com/8891689
+
+SegWit signature hashes commit to the amount being spent, which is not part
+of the spending transaction. A provider maps outpoints (txid hex, output
+index) to (value in satoshis, scriptPubKey bytes) in batches.
+"""
+import json
+import sqlite3
+from collections import OrderedDict
+from urllib import request, error
+
+from block_parser import parse_transaction
+from script_parser import ByteReader
+
+
+class PrevoutProvider:
+    """Base class: subclasses return {(txid, index): (value, script_pubkey)} for the outpoints they know."""
+    def get_prevouts(self, outpoints) -> dict:
+        raise NotImplementedError
+
+    def get_prevout(self, txid: str, index: int):
+        return self.get_prevouts([(txid, index)]).get((txid, index))
+
+
+def outputs_from_raw_tx(raw_tx) -> list:
+    """Returns [(value, script_pubkey bytes)] for each output of a raw transaction."""
+    tx = parse_transaction(ByteReader(raw_tx))
+    return [(o["value"], bytes(o["script_pubkey"])) for o in tx["vout"]]
+
+
+class DictPrevoutProvider(PrevoutProvider):
+    """Fixture-backed provider holding prevouts in memory."""
+    def __init__(self, prevouts=None):
+        self.prevouts = dict(prevouts or {})
+
+    def add(self, txid: str, index: int, value: int, script_pubkey: bytes):
+        self.prevouts[(txid, index)] = (value, bytes(script_pubkey))
+
+    def add_transaction(self, raw_tx):
+        """Registers every output of a raw transaction."""
+        tx = parse_transaction(ByteReader(raw_tx))
+        for index, output in enumerate(tx["vout"]):
+            self.add(tx["txid"], index, output["value"], output["script_pubkey"])
+
+    def get_prevouts(self, outpoints) -> dict:
+        return {outpoint: self.prevouts[outpoint] for outpoint in outpoints if outpoint in self.prevouts}
+
+    @classmethod
+    def from_json(cls, path: str):
+        """
+        Loads a fixture file of the form
+        {"<txid>:<index>": {"value": <satoshis>, "script_pubkey": "<hex>"}}.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        provider = cls()
+        for key, entry in data.items():
+            txid, index = key.rsplit(':', 1)
+            provider.add(txid, int(index), int(entry["value"]), bytes.fromhex(entry["script_pubkey"]))
+        return provider
+
+
+class RPCPrevoutProvider(PrevoutProvider):
+    """
+    Looks prevouts up on a local node (requires txindex=1). The parent
+    transactions of a batch are fetched as raw hex in JSON-RPC batch requests.
+    """
+    def __init__(self, rpc_client, batch_size: int = 100):
+        self.rpc_client = rpc_client
+        self.batch_size = batch_size
+
+    def get_prevouts(self, outpoints) -> dict:
+        txids = list(dict.fromkeys(txid for txid, _ in outpoints))
+        raw_txs = self.rpc_client.batch_chunked('getrawtransaction', [[txid, False] for txid in txids], self.batch_size)
+        outputs = {txid: outputs_from_raw_tx(raw_tx) for txid, raw_tx in zip(txids, raw_txs) if raw_tx}
+        prevouts = {}
+        for txid, index in outpoints:
+            if txid in outputs and index < len(outputs[txid]):
+                prevouts[(txid, index)] = outputs[txid][index]
+        return prevouts
+
+
+class EsploraPrevoutProvider(PrevoutProvider):
+    """
+    Looks prevouts up through an Esplora block explorer API (blockstream.info
+    by default). With a RawDataCache, parent transactions are only fetched once.
+    """
+    def __init__(self, base_url: str = "https://blockstream.info/api", timeout: float = 20, cache=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache = cache
+
+    def fetch_raw_tx(self, txid: str):
+        if self.cache is not None:
+            raw_tx = self.cache.get_raw_tx(txid)
+            if raw_tx is not None:
+                return raw_tx
+        try:
+            with request.urlopen(f"{self.base_url}/tx/{txid}/hex", timeout=self.timeout) as response:
+                if response.status == 200:
+                    raw_tx = response.read().decode('utf-8').strip()
+                    if self.cache is not None:
+                        self.cache.put_raw_tx(txid, raw_tx)
+                    return raw_tx
+                print(f"Error: API returned status code {response.status}")
+        except error.URLError as e:
+            print(f"Network error: Unable to fetch transaction {txid}. Details: {e.reason}")
+        return None
+
+    def get_prevouts(self, outpoints) -> dict:
+        outputs = {}
+        prevouts = {}
+        for txid, index in outpoints:
+            if txid not in outputs:
+                raw_tx = self.fetch_raw_tx(txid)
+                outputs[txid] = outputs_from_raw_tx(raw_tx) if raw_tx else []
+            if index < len(outputs[txid]):
+                prevouts[(txid, index)] = outputs[txid][index]
+        return prevouts
+
+
+class PrevoutCache(PrevoutProvider):
+    """
+    A bounded LRU cache of prevouts for block scans. Outputs of scanned
+    transactions are added as they are seen and discarded once spent, so the
+    cache holds the recently created, still unspent outputs. Entries evicted
+    from memory spill to an SQLite file; lookups that miss both are fetched
+    from the fallback provider in one batch.
+    """
+    def __init__(self, fallback=None, max_entries: int = 1000000, spill_path: str = None,
+                 spill_batch: int = 10000):
+        self.fallback = fallback
+        self.max_entries = max_entries
+        self.spill_batch = spill_batch
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.spill_hits = 0
+        self.fallback_lookups = 0
+        self.db = None
+        if spill_path:
+            self.db = sqlite3.connect(spill_path)
+            self.db.execute("PRAGMA journal_mode=OFF")
+            self.db.execute("PRAGMA synchronous=OFF")
+            self.db.execute("CREATE TABLE IF NOT EXISTS prevouts (outpoint BLOB PRIMARY KEY, value INTEGER, script BLOB)")
+
+    @staticmethod
+    def _disk_key(outpoint) -> bytes:
+        txid, index = outpoint
+        return bytes.fromhex(txid) + index.to_bytes(4, 'little')
+
+    def add(self, txid: str, index: int, value: int, script_pubkey):
+        self.memory[(txid, index)] = (value, bytes(script_pubkey))
+        if len(self.memory) > self.max_entries:
+            self._evict()
+
+    def add_transaction(self, tx: dict):
+        """Registers every output of a parsed transaction."""
+        for index, output in enumerate(tx["vout"]):
+            self.add(tx["txid"], index, output["value"], output["script_pubkey"])
+
+    def _evict(self):
+        """Moves the least recently used entries to disk, or drops them when there is no spill file."""
+        count = min(len(self.memory), max(self.spill_batch, len(self.memory) - self.max_entries))
+        evicted = [self.memory.popitem(last=False) for _ in range(count)]
+        if self.db is not None:
+            self.db.executemany("INSERT OR REPLACE INTO prevouts VALUES (?, ?, ?)",
+                                [(self._disk_key(outpoint), value, script) for outpoint, (value, script) in evicted])
+
+    def discard(self, outpoints):
+        """Forgets spent outpoints."""
+        on_disk = []
+        for outpoint in outpoints:
+            if self.memory.pop(outpoint, None) is None and self.db is not None:
+                on_disk.append((self._disk_key(outpoint),))
+        if on_disk:
+            self.db.executemany("DELETE FROM prevouts WHERE outpoint = ?", on_disk)
+
+    def _lookup_disk(self, outpoints) -> dict:
+        found = {}
+        keys = {self._disk_key(outpoint): outpoint for outpoint in outpoints}
+        key_list = list(keys)
+        for start in range(0, len(key_list), 500):
+            chunk = key_list[start:start + 500]
+            rows = self.db.execute(
+                f"SELECT outpoint, value, script FROM prevouts WHERE outpoint IN ({','.join('?' * len(chunk))})", chunk)
+            for key, value, script in rows:
+                found[keys[key]] = (value, script)
+        return found
+
+    def get_prevouts(self, outpoints) -> dict:
+        prevouts = {}
+        missing = []
+        for outpoint in outpoints:
+            entry = self.memory.get(outpoint)
+            if entry is None:
+                missing.append(outpoint)
+            else:
+                self.memory.move_to_end(outpoint)
+                prevouts[outpoint] = entry
+        self.hits += len(prevouts)
+
+        if missing and self.db is not None:
+            from_disk = self._lookup_disk(missing)
+            self.spill_hits += len(from_disk)
+            prevouts.update(from_disk)
+            missing = [outpoint for outpoint in missing if outpoint not in from_disk]
+
+        if missing and self.fallback is not None:
+            self.fallback_lookups += len(missing)
+            prevouts.update(self.fallback.get_prevouts(missing))
+        return prevouts
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
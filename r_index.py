@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent, Incrementally Updatable R Value Index
+Author: https://github.com/8891689
+
+Maps each 32-byte R value to every place it was seen (txid, input index,
+block height), so new signatures can be checked against all history
+without re-reading old output files.
+
+Layout of the index directory:
+  occurrences.dat  append-only fixed-width records (R, txid, input index,
+                   height, previous record with the same R)
+  table.dat        memory-mapped open-addressing hash table from R to the
+                   newest record of its chain
+
+Each batch is appended to occurrences.dat first; its slot updates are held
+in memory until then, and only afterwards written to the table together
+with the committed record count. Records past that count (a batch
+interrupted by a crash) are replayed when the index is opened. A table with
+a head past the committed records (left by an older version, or by a crash
+between the slot writes and the count) is rebuilt from occurrences.dat.
+Adding an occurrence that is already indexed is a no-op, so re-scanning
+blocks after a resume does not produce false collisions; a second
+signature with the same R in one input (multisig) is still indexed. rollback removes
+the occurrences above a height again, for chain reorganizations.
+"""
+import argparse
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+
+TABLE_MAGIC = b'RIDX0001'
+TABLE_HEADER = struct.Struct('<8sQQQ')      # magic, capacity, used slots, committed records
+SLOT = struct.Struct('<QQ')                 # fingerprint, newest record number + 1 (0 = empty)
+RECORD = struct.Struct('<32s32sIiQ')        # R, txid, input index, height, previous record number + 1
+INITIAL_CAPACITY = 1 << 16
+# Records read at a time when the table is rebuilt
+REBUILD_BATCH = 1 << 16
+UNKNOWN_HEIGHT = -1
+
+
+def normalize_r(r) -> bytes:
+    """Returns R as exactly 32 big-endian bytes, from hex or bytes with or without the DER pad byte."""
+    if isinstance(r, str):
+        r = bytes.fromhex(r)
+    return int.from_bytes(r, 'big').to_bytes(32, 'big')
+
+
+class RIndex:
+    """An on-disk R value index with O(1) membership lookups and append-only updates."""
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        table_path = os.path.join(directory, "table.dat")
+        if not os.path.exists(table_path):
+            self._create_table(table_path, INITIAL_CAPACITY)
+        self._open_table(table_path)
+
+        self.records_file = open(os.path.join(directory, "occurrences.dat"), 'a+b')
+        self._pending = bytearray()
+        # Slot position -> (fingerprint, head) of the batch being added, written to the table on commit
+        self._pending_slots = {}
+        self._recover()
+
+    # --- table file ---------------------------------------------------------
+
+    @staticmethod
+    def _create_table(path: str, capacity: int, records: int = 0):
+        with open(path, 'wb') as f:
+            f.write(TABLE_HEADER.pack(TABLE_MAGIC, capacity, 0, records))
+            f.truncate(TABLE_HEADER.size + capacity * SLOT.size)
+
+    def _open_table(self, path: str):
+        self.table_file = open(path, 'r+b')
+        self.table = mmap.mmap(self.table_file.fileno(), 0)
+        magic, self.capacity, self.used, self.records = TABLE_HEADER.unpack_from(self.table, 0)
+        if magic != TABLE_MAGIC:
+            raise ValueError(f"{path} is not an R index table.")
+        self.mask = self.capacity - 1
+
+    def _close_table(self):
+        self.table.close()
+        self.table_file.close()
+
+    def _find_slot(self, r: bytes):
+        """Returns (slot position, newest record number + 1) for R; the head is 0 when R is not indexed."""
+        fingerprint = int.from_bytes(r[:8], 'big')
+        position = fingerprint & self.mask
+        table = self.table
+        pending_slots = self._pending_slots
+        while True:
+            slot = pending_slots.get(position)
+            if slot is None:
+                slot = SLOT.unpack_from(table, TABLE_HEADER.size + position * SLOT.size)
+            slot_fingerprint, head = slot
+            if head == 0:
+                return position, 0
+            # The fingerprint is only a hint; the record holds the full R value
+            if slot_fingerprint == fingerprint and self._record(head - 1)[0] == r:
+                return position, head
+            position = (position + 1) & self.mask
+
+    def _set_slot(self, position: int, r: bytes, head: int):
+        """Writes a slot to the table; only for heads whose records are already in occurrences.dat."""
+        SLOT.pack_into(self.table, TABLE_HEADER.size + position * SLOT.size, int.from_bytes(r[:8], 'big'), head)
+
+    def _delete_slot(self, position: int):
+        """Empties a slot, moving later entries of its probe run back so they stay reachable."""
+        table = self.table
+        hole = position
+        current = position
+        while True:
+            current = (current + 1) & self.mask
+            fingerprint, head = SLOT.unpack_from(table, TABLE_HEADER.size + current * SLOT.size)
+            if head == 0:
+                break
+            # An entry may fill the hole unless its home slot lies between the hole and itself
+            if (current - (fingerprint & self.mask)) & self.mask >= (current - hole) & self.mask:
+                SLOT.pack_into(table, TABLE_HEADER.size + hole * SLOT.size, fingerprint, head)
+                hole = current
+        SLOT.pack_into(table, TABLE_HEADER.size + hole * SLOT.size, 0, 0)
+
+    def _grow(self):
+        """Doubles the table capacity, reinserting every chain head into a new file."""
+        path = os.path.join(self.directory, "table.dat")
+        new_path = path + ".tmp"
+        self._create_table(new_path, self.capacity * 2, self.records)
+        with open(new_path, 'r+b') as f, mmap.mmap(f.fileno(), 0) as new_table:
+            new_mask = self.capacity * 2 - 1
+            for position in range(self.capacity):
+                fingerprint, head = SLOT.unpack_from(self.table, TABLE_HEADER.size + position * SLOT.size)
+                if head == 0:
+                    continue
+                new_position = fingerprint & new_mask
+                while SLOT.unpack_from(new_table, TABLE_HEADER.size + new_position * SLOT.size)[1]:
+                    new_position = (new_position + 1) & new_mask
+                SLOT.pack_into(new_table, TABLE_HEADER.size + new_position * SLOT.size, fingerprint, head)
+            TABLE_HEADER.pack_into(new_table, 0, TABLE_MAGIC, self.capacity * 2, self.used, self.records)
+            new_table.flush()
+        self._close_table()
+        os.replace(new_path, path)
+        self._open_table(path)
+
+    # --- occurrence records -------------------------------------------------
+
+    def _record(self, number: int):
+        """Reads record number (0-based), from the file or from the batch being added."""
+        if number >= self.records:
+            return RECORD.unpack_from(self._pending, (number - self.records) * RECORD.size)
+        return RECORD.unpack(os.pread(self.records_file.fileno(), RECORD.size, number * RECORD.size))
+
+    def _count_before(self, head: int, end: int, txid: bytes, input_index: int) -> int:
+        """Counts the records of a chain numbered below end that are for txid and input_index."""
+        count = 0
+        while head:
+            record = self._record(head - 1)
+            if head <= end and record[1] == txid and record[2] == input_index:
+                count += 1
+            head = record[4]
+        return count
+
+    def _chain(self, head: int) -> list:
+        """Returns the records of a chain, oldest first."""
+        chain = []
+        while head:
+            record = self._record(head - 1)
+            chain.append(record)
+            head = record[4]
+        chain.reverse()
+        return chain
+
+    @staticmethod
+    def _occurrence(record) -> dict:
+        return {
+            "txid": record[1].hex(),
+            "input_index": record[2],
+            "height": None if record[3] == UNKNOWN_HEIGHT else record[3]
+        }
+
+    def _heads_committed(self) -> bool:
+        """Whether every head in the table points at a committed record."""
+        slots = memoryview(self.table)[TABLE_HEADER.size:]
+        try:
+            return all(head <= self.records for _, head in SLOT.iter_unpack(slots))
+        finally:
+            slots.release()
+
+    def _rebuild_table(self, complete: int):
+        """
+        Rebuilds the table from the first complete records of occurrences.dat.
+        Each record already links to the previous one with the same R, so the
+        newest record of every R becomes its head.
+        """
+        path = os.path.join(self.directory, "table.dat")
+        self._close_table()
+        self._create_table(path, INITIAL_CAPACITY)
+        self._open_table(path)
+        self.records = complete
+        self.used = 0
+        for start in range(0, complete, REBUILD_BATCH):
+            count = min(REBUILD_BATCH, complete - start)
+            data = os.pread(self.records_file.fileno(), count * RECORD.size, start * RECORD.size)
+            for number, record in enumerate(RECORD.iter_unpack(data), start):
+                position, head = self._find_slot(record[0])
+                self._set_slot(position, record[0], number + 1)
+                if not head:
+                    self.used += 1
+                    if self.used * 2 > self.capacity:
+                        self._grow()
+        TABLE_HEADER.pack_into(self.table, 0, TABLE_MAGIC, self.capacity, self.used, self.records)
+        self.table.flush()
+
+    def _recover(self):
+        """
+        Replays records written after the last committed batch and drops a
+        partially written record; rebuilds the table if it points past the
+        committed records.
+        """
+        size = os.fstat(self.records_file.fileno()).st_size
+        complete = size // RECORD.size
+        if size % RECORD.size:
+            self.records_file.truncate(complete * RECORD.size)
+        if not self._heads_committed():
+            print(f"R index table in {self.directory} points past its committed records; rebuilding it.")
+            self._rebuild_table(complete)
+        if complete > self.records:
+            replay = [RECORD.unpack(os.pread(self.records_file.fileno(), RECORD.size, number * RECORD.size))
+                      for number in range(self.records, complete)]
+            self.records_file.truncate(self.records * RECORD.size)
+            self.add((r, txid, input_index, height) for r, txid, input_index, height, _ in replay)
+
+    # --- public API ---------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self.records
+
+    def __contains__(self, r) -> bool:
+        return self._find_slot(normalize_r(r))[1] != 0
+
+    def distinct(self) -> int:
+        return self.used
+
+    def lookup(self, r) -> list:
+        """Returns every indexed occurrence of R, oldest first."""
+        return [self._occurrence(record) for record in self._chain(self._find_slot(normalize_r(r))[1])]
+
+    def add(self, entries) -> list:
+        """
+        Indexes (r, txid, input_index, height) entries as one batch. r and txid
+        are hex strings or bytes; height may be None when it is unknown.
+
+        Returns (r hex, occurrences) for every R that occurs more than once
+        because of this batch, listing all its occurrences oldest first.
+        """
+        collided = {}
+        batch_start = next_number = self.records
+        # Occurrences of (r, txid, input_index) seen so far in this batch, for those indexed before it
+        seen = {}
+        for r, txid, input_index, height in entries:
+            try:
+                r = normalize_r(r)
+            except OverflowError:
+                # Not a valid secp256k1 R value (lax pre-BIP66 encodings)
+                continue
+            txid = bytes.fromhex(txid) if isinstance(txid, str) else bytes(txid)
+            height = UNKNOWN_HEIGHT if height is None else height
+
+            position, head = self._find_slot(r)
+            if head:
+                # The n-th signature with this R in an input is new only if fewer than n were indexed before
+                indexed = self._count_before(head, batch_start, txid, input_index)
+                if indexed:
+                    key = (r, txid, input_index)
+                    ordinal = seen.get(key, 0)
+                    seen[key] = ordinal + 1
+                    if ordinal < indexed:
+                        continue
+            self._pending += RECORD.pack(r, txid, input_index, height, head)
+            next_number += 1
+            self._pending_slots[position] = (int.from_bytes(r[:8], 'big'), next_number)
+            if head:
+                collided[r] = next_number
+            else:
+                self.used += 1
+                if self.used * 2 > self.capacity:
+                    self._commit()
+                    self._grow()
+
+        self._commit()
+        return [(r.hex(), [self._occurrence(record) for record in self._chain(head)])
+                for r, head in collided.items()]
+
+    def _first_above(self, height: int, since: int):
+        """The number of the first record from since on whose height is above height, or None."""
+        for start in range(since, self.records, REBUILD_BATCH):
+            count = min(REBUILD_BATCH, self.records - start)
+            data = os.pread(self.records_file.fileno(), count * RECORD.size, start * RECORD.size)
+            for number, record in enumerate(RECORD.iter_unpack(data), start):
+                if record[3] > height:
+                    return number
+        return None
+
+    def rollback(self, height: int, since: int = 0) -> int:
+        """
+        Removes every occurrence above height, for the blocks of an orphaned
+        branch. Returns the number removed.
+
+        Blocks are mostly indexed in height order, but a block that failed
+        and was retried is added later, after higher ones. So the index is cut
+        at the first occurrence above height, and the occurrences after it
+        that are at or below height are indexed again. Only records from
+        number since on are read; since must be a record count at which no
+        occurrence above height was indexed yet (extract_data.py journals
+        one with every commit). The default reads the whole index.
+
+        The table is published before occurrences.dat is cut, so a rollback
+        interrupted by a crash is undone by the replay on open and can be
+        repeated.
+        """
+        self._commit()
+        first = self._first_above(height, min(since, self.records))
+        if first is None:
+            return 0
+        tail = list(RECORD.iter_unpack(os.pread(self.records_file.fileno(), (self.records - first) * RECORD.size,
+                                                first * RECORD.size)))
+        # Newest first, so every removed record is the head of its chain when it is unlinked
+        for r, _, _, _, previous in reversed(tail):
+            position, _ = self._find_slot(r)
+            if previous:
+                self._set_slot(position, r, previous)
+            else:
+                self._delete_slot(position)
+                self.used -= 1
+        self.records = first
+        TABLE_HEADER.pack_into(self.table, 0, TABLE_MAGIC, self.capacity, self.used, self.records)
+        self.table.flush()
+        self.records_file.truncate(first * RECORD.size)
+        kept = [(r, txid, input_index, record_height) for r, txid, input_index, record_height, _ in tail
+                if record_height <= height]
+        self.add(kept)
+        return len(tail) - len(kept)
+
+    def _commit(self):
+        if not self._pending:
+            return
+        # Records reach the file before the table points at them
+        self.records_file.seek(0, os.SEEK_END)
+        self.records_file.write(self._pending)
+        self.records_file.flush()
+        self.records += len(self._pending) // RECORD.size
+        self._pending.clear()
+        for position, slot in self._pending_slots.items():
+            SLOT.pack_into(self.table, TABLE_HEADER.size + position * SLOT.size, *slot)
+        self._pending_slots.clear()
+        TABLE_HEADER.pack_into(self.table, 0, TABLE_MAGIC, self.capacity, self.used, self.records)
+        self.table.flush()
+
+    def close(self):
+        self._commit()
+        self._close_table()
+        self.records_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Lines written by extract_data.py / extract_blk.py
+TXID_LINE = re.compile(r'Transaction ID: ([0-9a-fA-F]{64})')
+R_VALUE = re.compile(r'R: ?([0-9a-fA-F]{1,66})')
+
+
+def iter_output_file_entries(path: str):
+    """
+    Yields (r, txid, position, None) for the signatures of an extraction output
+    file. The text format holds neither the input index nor the block height,
+    so the position of the signature within its transaction stands in for the
+    input index and the height is unknown. These positions differ from the
+    input indexes a scan with --r-index stores, so an index must be fed
+    either from output files or by the scan, not both: the same signature
+    added both ways would be reported as a collision.
+    """
+    txid = None
+    position = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            match = TXID_LINE.search(line)
+            if match:
+                txid, position = match.group(1), 0
+                continue
+            match = R_VALUE.search(line)
+            if match and txid:
+                yield match.group(1), txid, position, None
+                position += 1
+
+
+def format_collision(r: str, occurrences) -> list:
+    """
+    Renders a collision as output lines. The R is labelled "Reused R value",
+    which the duplicate finder's R_PATTERN does not match, so a report in a
+    scanned folder does not count its R values again.
+    """
+    lines = [f"Reused R value {r}, Occurrences: {len(occurrences)}\n"]
+    for occurrence in occurrences:
+        height = "unknown" if occurrence["height"] is None else occurrence["height"]
+        lines.append(f"  Transaction ID: {occurrence['txid']}, Input: {occurrence['input_index']}, Height: {height}\n")
+    return lines
+
+
+def setup_arg_parser():
+    """Sets up the command-line argument parser."""
+    parser = argparse.ArgumentParser(description="Maintain a persistent index of signature R values.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_parser = subparsers.add_parser("add", help="Index extraction output files and report the new collisions.")
+    add_parser.add_argument("index_dir", help="Index directory (created if missing).")
+    add_parser.add_argument("files", nargs="+", help="Output files of extract_data.py or extract_blk.py.")
+    lookup_parser = subparsers.add_parser("lookup", help="List the indexed occurrences of R values.")
+    lookup_parser.add_argument("index_dir", help="Index directory.")
+    lookup_parser.add_argument("r_values", nargs="+", help="R values in hex.")
+    rollback_parser = subparsers.add_parser("rollback", help="Remove the occurrences above a block height.")
+    rollback_parser.add_argument("index_dir", help="Index directory.")
+    rollback_parser.add_argument("height", type=int, help="Last block height to keep.")
+    stats_parser = subparsers.add_parser("stats", help="Show the size of the index.")
+    stats_parser.add_argument("index_dir", help="Index directory.")
+    return parser
+
+
+def main():
+    args = setup_arg_parser().parse_args()
+    with RIndex(args.index_dir) as index:
+        if args.command == "add":
+            before = len(index)
+            start = time.perf_counter()
+            collisions = []
+            for path in args.files:
+                collisions.extend(index.add(iter_output_file_entries(path)))
+            elapsed = time.perf_counter() - start
+            for r, occurrences in collisions:
+                sys.stdout.writelines(format_collision(r, occurrences))
+            added = len(index) - before
+            print(f"Indexed {added} new signatures in {elapsed:.2f}s ({added / max(elapsed, 1e-9):,.0f}/s), "
+                  f"{len(collisions)} new collisions.")
+        elif args.command == "lookup":
+            for r in args.r_values:
+                occurrences = index.lookup(r)
+                if occurrences:
+                    sys.stdout.writelines(format_collision(normalize_r(r).hex(), occurrences))
+                else:
+                    print(f"R: {normalize_r(r).hex()} not found")
+        elif args.command == "rollback":
+            print(f"Removed {index.rollback(args.height)} occurrences above block {args.height}.")
+        else:
+            print(f"{len(index)} signatures, {index.distinct()} distinct R values, table capacity {index.capacity}")
+
+
+if __name__ == '__main__':
+    main()
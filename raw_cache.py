@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+Content-Addressed On-Disk Cache for Raw Transactions and Blocks
+Author: https://github.com/8891689
+
+Entries are keyed by txid or block hash and stored zlib-compressed in
+append-only segment files. An SQLite index maps each key to its segment and
+offset. Every process appends to its own segment, so scanner workers can
+share one cache directory. When the segments grow past the size cap, the
+oldest segments are deleted as a whole.
+
+Confirmed blocks and transactions never change, so a cached entry is
+served without asking the node again. Height to block hash mappings can
+change in a reorg, so they are only cached once they are deep enough.
+"""
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+from rpc_client import RPCClient
+
+# Segment record header: key, kind, uncompressed length, compressed length
+RECORD_HEADER = struct.Struct('<32sBII')
+
+# Cache kinds: raw blocks and transactions are stored as bytes, other verbosities of the cacheable calls as JSON
+KIND_RAW_BLOCK = 0
+KIND_RAW_TX = 1
+RAW_KINDS = (KIND_RAW_BLOCK, KIND_RAW_TX)
+CACHEABLE_CALLS = {
+    ('getblock', 0): KIND_RAW_BLOCK,
+    ('getrawtransaction', 0): KIND_RAW_TX,
+    ('getblock', 1): 2,
+    ('getblock', 2): 3,
+    ('getblock', 3): 4,
+    ('getrawtransaction', 1): 5,
+    ('getrawtransaction', 2): 6,
+}
+DEFAULT_VERBOSITY = {'getblock': 1, 'getrawtransaction': 0}
+
+
+class RawDataCache:
+    """
+    A size-capped store of raw transactions and blocks.
+
+    get/put take a kind code and a 64-character hex key; values are bytes.
+    """
+    def __init__(self, directory: str, max_bytes: int = 8 << 30, segment_bytes: int = 64 << 20,
+                 compression_level: int = 6):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Eviction works on whole segments, so they stay small relative to the cap
+        self.segment_bytes = max(1 << 20, min(segment_bytes, max_bytes // 8))
+        self.compression_level = compression_level
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+        # Worker threads of RPCClient.imap share the connection and the open segment
+        self._lock = threading.RLock()
+        self.db = sqlite3.connect(os.path.join(directory, "index.sqlite"), timeout=60, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS segments (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                        "name TEXT UNIQUE, size INTEGER)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries (key BLOB, kind INTEGER, segment INTEGER, "
+                        "offset INTEGER, length INTEGER, PRIMARY KEY (key, kind))")
+        self.db.execute("CREATE TABLE IF NOT EXISTS heights (height INTEGER PRIMARY KEY, hash BLOB)")
+        self.db.commit()
+
+        self._segment = None
+        self._segment_id = None
+        self._readers = {}
+
+    def _segment_path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _open_segment(self):
+        """Starts a new segment owned by this process, evicting old segments first if needed."""
+        if self._segment is not None:
+            self._segment.close()
+        self._evict()
+        name = f"{int(time.time() * 1000):013x}-{os.getpid()}.seg"
+        self._segment = open(self._segment_path(name), 'ab')
+        with self.db:
+            self._segment_id = self.db.execute("INSERT INTO segments (name, size) VALUES (?, 0)", (name,)).lastrowid
+
+    def _evict(self):
+        """Deletes the oldest segments and their index entries until the cache fits its cap."""
+        with self.db:
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM segments").fetchone()[0]
+            if total + self.segment_bytes <= self.max_bytes:
+                return
+            for segment_id, name, size in self.db.execute(
+                    "SELECT id, name, size FROM segments ORDER BY id").fetchall():
+                if total + self.segment_bytes <= self.max_bytes:
+                    break
+                self.db.execute("DELETE FROM entries WHERE segment = ?", (segment_id,))
+                self.db.execute("DELETE FROM segments WHERE id = ?", (segment_id,))
+                reader = self._readers.pop(segment_id, None)
+                if reader is not None:
+                    reader.close()
+                try:
+                    os.remove(self._segment_path(name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def put_many(self, kind: int, items):
+        """Appends (hex key, bytes value) pairs to the current segment and indexes them."""
+        with self._lock:
+            if self._segment is None:
+                self._open_segment()
+            rows = []
+            for key, value in items:
+                if self._segment.tell() >= self.segment_bytes:
+                    self._commit_rows(rows)
+                    rows = []
+                    self._open_segment()
+                compressed = zlib.compress(value, self.compression_level)
+                self._segment.write(RECORD_HEADER.pack(bytes.fromhex(key), kind, len(value), len(compressed)))
+                rows.append((bytes.fromhex(key), kind, self._segment_id, self._segment.tell(), len(compressed)))
+                self._segment.write(compressed)
+            self._commit_rows(rows)
+
+    def _commit_rows(self, rows):
+        if not rows:
+            return
+        # Index entries are only published once their data is in the file
+        self._segment.flush()
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", rows)
+            self.db.execute("UPDATE segments SET size = ? WHERE id = ?", (self._segment.tell(), self._segment_id))
+
+    def put(self, kind: int, key: str, value: bytes):
+        self.put_many(kind, [(key, value)])
+
+    def _read(self, segment_id: int, name: str, offset: int, length: int):
+        reader = self._readers.get(segment_id)
+        if reader is None:
+            try:
+                reader = self._readers[segment_id] = open(self._segment_path(name), 'rb')
+            except FileNotFoundError:
+                return None
+        reader.seek(offset)
+        data = reader.read(length)
+        if len(data) != length:
+            return None
+        return zlib.decompress(data)
+
+    def get_many(self, kind: int, keys) -> dict:
+        """Returns {hex key: bytes value} for the keys that are cached."""
+        found = {}
+        with self._lock:
+            key_list = list(dict.fromkeys(keys))
+            for start in range(0, len(key_list), 500):
+                chunk = key_list[start:start + 500]
+                rows = self.db.execute(
+                    "SELECT entries.key, entries.segment, segments.name, entries.offset, entries.length "
+                    "FROM entries JOIN segments ON segments.id = entries.segment "
+                    f"WHERE entries.kind = ? AND entries.key IN ({','.join('?' * len(chunk))})",
+                    [kind] + [bytes.fromhex(key) for key in chunk]).fetchall()
+                for key, segment_id, name, offset, length in rows:
+                    value = self._read(segment_id, name, offset, length)
+                    if value is not None:
+                        found[key.hex()] = value
+            self.hits += len(found)
+            self.misses += len(key_list) - len(found)
+        return found
+
+    def get(self, kind: int, key: str):
+        return self.get_many(kind, [key]).get(key)
+
+    def get_raw_tx(self, txid: str):
+        """Returns a cached raw transaction as hex, or None."""
+        value = self.get(KIND_RAW_TX, txid)
+        return None if value is None else value.hex()
+
+    def put_raw_tx(self, txid: str, raw_tx_hex: str):
+        self.put(KIND_RAW_TX, txid, bytes.fromhex(raw_tx_hex))
+
+    def get_block_hashes(self, heights) -> dict:
+        """Returns {height: block hash hex} for the cached heights."""
+        with self._lock:
+            heights = list(heights)
+            found = {}
+            for start in range(0, len(heights), 500):
+                chunk = heights[start:start + 500]
+                rows = self.db.execute(
+                    f"SELECT height, hash FROM heights WHERE height IN ({','.join('?' * len(chunk))})", chunk)
+                found.update((height, block_hash.hex()) for height, block_hash in rows)
+            return found
+
+    def put_block_hashes(self, hashes: dict):
+        with self._lock, self.db:
+            self.db.executemany("INSERT OR REPLACE INTO heights VALUES (?, ?)",
+                                [(height, bytes.fromhex(block_hash)) for height, block_hash in hashes.items()])
+
+    def close(self):
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+            for reader in self._readers.values():
+                reader.close()
+            self._readers.clear()
+            self.db.close()
+
+
+def cache_kind(method: str, params):
+    """Returns the cache kind of an RPC call, or None when its result is not cacheable."""
+    if method not in DEFAULT_VERBOSITY or not params or not isinstance(params[0], str) or len(params[0]) != 64:
+        return None
+    verbosity = int(params[1]) if len(params) > 1 else DEFAULT_VERBOSITY[method]
+    return CACHEABLE_CALLS.get((method, verbosity))
+
+
+def encode_result(kind: int, result) -> bytes:
+    if kind in RAW_KINDS:
+        return bytes.fromhex(result)
+    return json.dumps(result, separators=(',', ':')).encode('utf-8')
+
+
+def decode_result(kind: int, value: bytes):
+    if kind in RAW_KINDS:
+        return value.hex()
+    return json.loads(value)
+
+
+class CachingRPCClient(RPCClient):
+    """
+    An RPCClient that answers getblock, getrawtransaction and (for blocks at
+    least min_confirmations deep) getblockhash from a RawDataCache, and only
+    asks the node for what is missing. Single calls, batches and imap all go
+    through the cache.
+    """
+    def __init__(self, url: str, user: str, password: str, cache: RawDataCache,
+                 min_confirmations: int = 6, **kwargs):
+        super().__init__(url, user, password, **kwargs)
+        self.cache = cache
+        self.min_confirmations = min_confirmations
+        self._tip = None
+        self._tip_time = 0
+
+    def _cached(self, method: str, params):
+        """Returns (found, result) for one call."""
+        if method == 'getblockhash' and params:
+            block_hash = self.cache.get_block_hashes([params[0]]).get(params[0])
+            return block_hash is not None, block_hash
+        kind = cache_kind(method, params)
+        if kind is None:
+            return False, None
+        value = self.cache.get(kind, params[0])
+        return value is not None, None if value is None else decode_result(kind, value)
+
+    def _store(self, calls, results):
+        """Caches the successful results of (method, params) calls fetched from the node."""
+        by_kind = {}
+        heights = {}
+        for (method, params), result in zip(calls, results):
+            if result is None:
+                continue
+            if method == 'getblockhash' and params:
+                heights[params[0]] = result
+                continue
+            kind = cache_kind(method, params)
+            if kind is not None:
+                by_kind.setdefault(kind, []).append((params[0], encode_result(kind, result)))
+        for kind, items in by_kind.items():
+            self.cache.put_many(kind, items)
+        if heights:
+            # Recent heights can still be reorganized away; only deep ones are remembered
+            tip = self._chain_tip()
+            if tip is not None:
+                self.cache.put_block_hashes({height: block_hash for height, block_hash in heights.items()
+                                             if height <= tip - self.min_confirmations + 1})
+
+    def _chain_tip(self):
+        """The node's block count, refreshed at most once a minute."""
+        if self._tip is None or time.monotonic() - self._tip_time > 60:
+            self._tip = super().call('getblockcount')
+            self._tip_time = time.monotonic()
+        return self._tip
+
+    def call(self, method: str, params=None, timeout: float = None):
+        found, result = self._cached(method, params)
+        if found:
+            return result
+        result = super().call(method, params, timeout)
+        self._store([(method, params)], [result])
+        return result
+
+    def batch(self, calls) -> list:
+        calls = list(calls)
+        results = [None] * len(calls)
+        missing = []
+        for position, (method, params) in enumerate(calls):
+            found, result = self._cached(method, params)
+            if found:
+                results[position] = result
+            else:
+                missing.append(position)
+        if missing:
+            fetched = super().batch([calls[position] for position in missing])
+            for position, result in zip(missing, fetched):
+                results[position] = result
+            self._store([calls[position] for position in missing], fetched)
+        return results
+
+    def close(self):
+        super().close()
+        self.cache.close()
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Pooled, batched JSON-RPC client for Bitcoin Core
+Author: https://github.com/8891689
+
+Failed requests are retried with exponential backoff and full jitter, with a
+longer timeout on every attempt so a slow getblock gets the time it needs.
+A circuit breaker stops all requests for a cool-down period after
+BREAKER_THRESHOLD consecutive failures, then lets a probe through. Its state
+and the failure counters can be shared between processes (shared_state), so
+a node restart pauses every scanner process together instead of each one
+hammering the node on its own.
+"""
+import itertools
+import json
+import multiprocessing
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import METRICS
+
+
+class RPCConnectionError(Exception):
+    """Raised when the node cannot be reached after all retry attempts."""
+
+
+class RPCAuthError(Exception):
+    """Raised when the node refuses the request (HTTP 401 or 403); no retry can succeed."""
+
+
+COUNTERS = ("requests", "failures", "retries", "breaker_trips")
+BREAKER_THRESHOLD = 5
+AUTH_ERRORS = {
+    401: "the RPC user or password is wrong (RPC_USER, RPC_PASSWORD)",
+    403: "this address is not allowed to use RPC (rpcallowip)",
+}
+
+
+def shared_state():
+    """Returns breaker and counter state that RPC clients in several processes can share."""
+    return multiprocessing.Array('d', 1 + len(COUNTERS))
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff: a random delay up to base * 2 ** attempt, at most cap."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Opens after threshold consecutive failures and keeps every request waiting
+    for cooldown seconds. The first request after that is a probe: one more
+    failure opens the breaker again, a success closes it. The open-until
+    time lives in slot 0 of state, which may be a shared_state() array.
+    """
+    def __init__(self, state, lock, threshold: int = BREAKER_THRESHOLD, cooldown: float = 30):
+        self.state = state
+        self.lock = lock
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+
+    def wait(self):
+        """Blocks while the breaker is open."""
+        while True:
+            remaining = self.state[0] - time.time()
+            if remaining <= 0:
+                return
+            sleep(remaining)
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+
+    def record_failure(self) -> bool:
+        """Counts a failure; returns True if it opened the breaker."""
+        # The connection pool's threads report concurrently; the count is only changed under the lock
+        with self.lock:
+            self.failures += 1
+            if self.failures < self.threshold:
+                return False
+            # Half-open afterwards: the next failure trips it again
+            self.failures = self.threshold - 1
+            if self.state[0] > time.time():
+                # Another thread or process opened it already
+                return False
+            self.state[0] = time.time() + self.cooldown
+        return True
+
+
+class RPCClient:
+    """
+    A JSON-RPC client that keeps a pool of keep-alive connections to the node.
+
+    Single calls, JSON-RPC batch arrays and a bounded number of concurrent
+    requests all share the same connection pool.
+    """
+    def __init__(self, url: str, user: str, password: str, pool_size: int = 8,
+                 timeout: float = 10, retries: int = 3, retry_delay: float = 5,
+                 on_exhausted=None, max_retry_delay: float = 60, breaker_cooldown: float = 30, state=None):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        # Called when every retry has failed; returning lets the request be tried again.
+        # Without it, RPCConnectionError is raised.
+        self.on_exhausted = on_exhausted
+        self.breaker_cooldown = breaker_cooldown
+        self.use_state(state)
+
+        self.session = requests.Session()
+        self.session.auth = (user, password)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+        self._ids = itertools.count()
+        self._executor = None
+        self.set_pool_size(pool_size)
+
+    def use_state(self, state=None):
+        """Keeps the breaker and counters in state (from shared_state) instead of this process only."""
+        if state is None:
+            state = [0.0] * (1 + len(COUNTERS))
+            lock = threading.Lock()
+        else:
+            lock = state.get_lock()
+        self._state = state
+        self._state_lock = lock
+        self.breaker = CircuitBreaker(state, lock, cooldown=self.breaker_cooldown)
+
+    def _count(self, counter: str):
+        with self._state_lock:
+            self._state[1 + COUNTERS.index(counter)] += 1
+
+    def counters(self) -> dict:
+        """Requests, failures, retries and breaker trips so far (of all processes sharing the state)."""
+        return {counter: int(self._state[1 + index]) for index, counter in enumerate(COUNTERS)}
+
+    def set_pool_size(self, pool_size: int):
+        """Sets the number of keep-alive connections and concurrent worker threads."""
+        self.pool_size = pool_size
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _payload(self, method: str, params=None) -> dict:
+        return {
+            "jsonrpc": "1.0",
+            "id": next(self._ids),
+            "method": method,
+            "params": params or []
+        }
+
+    def _post(self, payload, timeout: float = None):
+        """
+        Posts a JSON payload, retrying on connection failures with backoff.
+        A refused request raises RPCAuthError at once: it is not retried and
+        does not count towards the circuit breaker.
+        """
+        body = json.dumps(payload)
+        while True:
+            for attempt in range(self.retries):
+                self.breaker.wait()
+                self._count("requests")
+                try:
+                    # Each attempt waits longer, so a slow response is not cut off the same way again
+                    with METRICS.timer("rpc"):
+                        response = self.session.post(self.url, data=body,
+                                                     timeout=(timeout or self.timeout) * (attempt + 1))
+                    if response.status_code in AUTH_ERRORS:
+                        raise RPCAuthError(f"The node at {self.url} refused the request with HTTP "
+                                           f"{response.status_code}: {AUTH_ERRORS[response.status_code]}")
+                    with METRICS.timer("decode"):
+                        result = response.json()
+                    self.breaker.record_success()
+                    return result
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    print(f"RPC request failed: {e}")
+                    self._count("failures")
+                    if self.breaker.record_failure():
+                        self._count("breaker_trips")
+                        print(f"Node unreachable, pausing all requests for {self.breaker.cooldown:.0f}s")
+                    if attempt + 1 < self.retries:
+                        self._count("retries")
+                        sleep(backoff_delay(attempt, self.retry_delay, self.max_retry_delay))
+            print("All retry attempts exhausted.")
+            if self.on_exhausted is None:
+                raise RPCConnectionError(f"Could not reach RPC node at {self.url}")
+            self.on_exhausted()
+
+    def call(self, method: str, params=None, timeout: float = None):
+        """
+        Performs a single RPC call. Returns None if the node reports an error.
+        timeout overrides the client's timeout, e.g. for calls that wait inside the node.
+        """
+        response_data = self._post(self._payload(method, params), timeout)
+        if response_data.get('error'):
+            print(f"RPC Error: {response_data['error']}")
+            return None
+        return response_data.get('result')
+
+    def batch(self, calls) -> list:
+        """
+        Sends several (method, params) calls as one JSON-RPC batch array.
+        Results are returned in call order; failed entries are None.
+        """
+        payloads = [self._payload(method, params) for method, params in calls]
+        if not payloads:
+            return []
+        response_data = self._post(payloads)
+        if isinstance(response_data, dict):
+            # The node rejected the batch as a whole
+            print(f"RPC Error: {response_data.get('error')}")
+            return [None] * len(payloads)
+
+        by_id = {item.get('id'): item for item in response_data}
+        results = []
+        for payload in payloads:
+            item = by_id.get(payload['id'])
+            if item is None or item.get('error'):
+                if item is not None:
+                    print(f"RPC Error: {item['error']}")
+                results.append(None)
+            else:
+                results.append(item.get('result'))
+        return results
+
+    def batch_chunked(self, method: str, params_list, batch_size: int = 100) -> list:
+        """Runs the same method over many parameter lists, batch_size calls per request."""
+        params_list = list(params_list)
+        results = []
+        for start in range(0, len(params_list), batch_size):
+            chunk = params_list[start:start + batch_size]
+            results.extend(self.batch([(method, params) for params in chunk]))
+        return results
+
+    def imap(self, method: str, params_iter, max_in_flight: int = None, return_exceptions: bool = False):
+        """
+        Yields results of method(*params) for each entry of params_iter, in order,
+        keeping at most max_in_flight requests outstanding at any time. With
+        return_exceptions, a failed call yields its exception instead of
+        ending the iteration; RPCAuthError still ends it.
+        """
+        max_in_flight = max_in_flight or self.pool_size
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size)
+
+        def result(future):
+            error = future.exception()
+            if return_exceptions and error is not None and not isinstance(error, RPCAuthError):
+                return error
+            return future.result()
+
+        pending = deque()
+        for params in params_iter:
+            pending.append(self._executor.submit(self.call, method, params))
+            if len(pending) >= max_in_flight:
+                yield result(pending.popleft())
+        while pending:
+            yield result(pending.popleft())
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.session.close()
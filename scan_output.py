@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+Group-Commit Writer for Scan Output
+Author: https://github.com/8891689
+
+The scanners hand over the output lines of one block at a time. The writer
+collects whole blocks and commits them as a group: the data is written and
+flushed (optionally fsync'ed), then the checkpoint is replaced. The
+checkpoint is the commit marker. It names the last committed height and the
+size of its output file at that point, so a resumed run cuts the file back
+to exactly the committed blocks.
+
+A group is committed every flush_blocks blocks, or once flush_interval
+seconds have passed since the last commit, whichever comes first. The output
+can be gzip or zstd compressed. Every commit ends a gzip member or zstd
+frame, and concatenated members or frames are themselves a valid stream, so
+a cut at a commit marker is always readable. With shard_blocks, the output
+rotates into one file per height range.
+
+Blocks that could not be fetched are listed in the checkpoint as failed, so
+a resumed run retries them. A block that is retried later is appended out of
+height order to the shard of its height. For every earlier shard that still
+has failed blocks, the checkpoint also records its committed size, so a
+resumed run cuts a retry that was not committed out of that shard too.
+
+With journal_depth, the checkpoint also journals the hashes of the recent
+blocks and the recent commit points (height, offset, failed heights, and
+index_records when the scan sets it). The follow mode uses them to notice
+a chain reorganization and to cut the output back to the last commit
+below the fork.
+"""
+import json
+import os
+import time
+import zlib
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def read_checkpoint(checkpoint_file):
+    # Returns the checkpoint as a dict with at least 'height' and 'offset', or None
+    try:
+        with open(checkpoint_file, 'r') as f:
+            checkpoint = json.load(f)
+        if not {'height', 'offset'} <= checkpoint.keys():
+            raise KeyError('height and offset are required')
+        return checkpoint
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, AttributeError) as e:
+        print(f"Ignoring unreadable checkpoint file {checkpoint_file}: {e}")
+        return None
+
+
+def load_checkpoint(checkpoint_file):
+    # Returns (last completed height, output size at that height) or None
+    checkpoint = read_checkpoint(checkpoint_file)
+    return (checkpoint['height'], checkpoint['offset']) if checkpoint else None
+
+
+def save_checkpoint(checkpoint_file, height, offset, fsync=False, journal=None):
+    # Written to a temporary file and renamed so a crash never leaves a half-written checkpoint
+    tmp_file = checkpoint_file + '.tmp'
+    checkpoint = {'height': height, 'offset': offset}
+    if journal:
+        checkpoint.update(journal)
+    with open(tmp_file, 'w') as f:
+        json.dump(checkpoint, f)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_file, checkpoint_file)
+    if fsync:
+        # The rename itself is only durable once the directory is synced
+        directory = os.open(os.path.dirname(os.path.abspath(checkpoint_file)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+
+def rollback_point(checkpoint, fork_height: int):
+    """
+    Returns the newest journaled commit, [height, offset, failed heights], at
+    or below fork_height, or None when the journal does not reach back that far.
+    """
+    commits = [commit for commit in checkpoint.get('commits', []) if commit[0] <= fork_height]
+    return commits[-1] if commits else None
+
+
+def save_rollback(checkpoint_file, checkpoint, commit, fsync=False):
+    """Moves the commit marker back to an earlier commit; the next resume cuts the output there."""
+    height, offset, failed = (list(commit) + [[]])[:3]
+    journal = {
+        'blocks': [block for block in checkpoint.get('blocks', []) if block[0] <= height],
+        'commits': [entry for entry in checkpoint.get('commits', []) if entry[0] <= height],
+        'failed': failed,
+    }
+    save_checkpoint(checkpoint_file, height, offset, fsync, journal)
+
+
+class GzipMembers:
+    """Compresses each commit into its own gzip member."""
+    def __init__(self, level=None):
+        self.level = 6 if level is None else level
+        self._compressor = None
+
+    def compress(self, data: bytes) -> bytes:
+        if self._compressor is None:
+            self._compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        if self._compressor is None:
+            return b''
+        data = self._compressor.flush()
+        self._compressor = None
+        return data
+
+
+class ZstdFrames:
+    """Compresses each commit into its own zstd frame. Needs the zstandard package."""
+    def __init__(self, level=None):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstd compression needs the zstandard package (pip install zstandard).")
+        self._factory = zstandard.ZstdCompressor(level=3 if level is None else level)
+        self._compressor = None
+
+    def compress(self, data: bytes) -> bytes:
+        if self._compressor is None:
+            self._compressor = self._factory.compressobj()
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        if self._compressor is None:
+            return b''
+        data = self._compressor.flush()
+        self._compressor = None
+        return data
+
+
+COMPRESSORS = {"gzip": GzipMembers, "zstd": ZstdFrames}
+
+
+class GroupCommitWriter:
+    """
+    Writes scan output in groups of whole blocks, with the checkpoint at
+    <output_file>.checkpoint as commit marker. Call resume first, then
+    add_block for every block in height order, and close at the end.
+    """
+    def __init__(self, output_file: str, flush_blocks: int = 1, flush_interval: float = None, fsync: bool = False,
+                 compression: str = None, compression_level: int = None, shard_blocks: int = None,
+                 journal_depth: int = 0):
+        self.output_file = output_file
+        self.checkpoint_file = output_file + '.checkpoint'
+        self.flush_blocks = max(1, flush_blocks)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.compression = compression
+        self.compression_level = compression_level
+        self.shard_blocks = shard_blocks
+        self.journal_depth = journal_depth
+        self.block_hashes = []
+        self.commits = []
+        # Set by the scan to the size of its R index, journaled with each commit for rollbacks
+        self.index_records = None
+        self.failed = set()
+        # Committed sizes of the closed shards, for the retries appended to them
+        self.shard_sizes = {}
+        self.height = None
+        self.file = None
+        self._shard = None
+        self._compressor = None
+        self._buffer = []
+        self._pending_blocks = 0
+        self._last_commit = time.monotonic()
+
+    def shard_of(self, height: int):
+        return height // self.shard_blocks if self.shard_blocks else None
+
+    def shard_path(self, height: int) -> str:
+        """The output file holding a height."""
+        path = self.output_file
+        if self.shard_blocks:
+            root, extension = os.path.splitext(path)
+            low = self.shard_of(height) * self.shard_blocks
+            path = f"{root}.{low:09d}-{low + self.shard_blocks - 1:09d}{extension}"
+        suffix = COMPRESSION_SUFFIXES.get(self.compression, '')
+        if suffix and not path.endswith(suffix):
+            path += suffix
+        return path
+
+    def resume(self, start_block: int, end_block: int) -> int:
+        """
+        Cuts the output back to the last commit marker inside the range and
+        returns the first height still to be written.
+        """
+        checkpoint = read_checkpoint(self.checkpoint_file)
+        if checkpoint and start_block - 1 <= checkpoint['height'] <= end_block:
+            height, offset = checkpoint['height'], checkpoint['offset']
+            self.height = height
+            self.failed = {failed for failed in checkpoint.get('failed', []) if start_block <= failed <= end_block}
+            for shard, shard_size in checkpoint.get('shards', []):
+                self.shard_sizes[shard] = shard_size
+                shard_path = self.shard_path(shard * self.shard_blocks)
+                if os.path.exists(shard_path) and os.path.getsize(shard_path) > shard_size:
+                    os.truncate(shard_path, shard_size)
+            if self.journal_depth:
+                self.block_hashes = checkpoint.get('blocks', [])
+                self.commits = checkpoint.get('commits', [])
+            path = self.shard_path(height)
+            size = os.path.getsize(path) if os.path.exists(path) else -1
+            if self.shard_of(height + 1) != self.shard_of(height):
+                # The last commit closed its shard; the next block starts a fresh one
+                self.shard_sizes[self.shard_of(height)] = offset
+                self._open(height + 1, 0)
+                return height + 1
+            if 0 <= offset <= size:
+                self._open(height + 1, offset)
+                return height + 1
+        self.height = None
+        self.failed = set()
+        self.shard_sizes = {}
+        self._open(start_block, 0)
+        return start_block
+
+    def _open(self, height: int, offset: int):
+        path = self.shard_path(height)
+        if offset:
+            self.file = open(path, 'r+b')
+            self.file.truncate(offset)
+            self.file.seek(offset)
+        else:
+            self.file = open(path, 'wb')
+        self._shard = self.shard_of(height)
+        self._compressor = COMPRESSORS[self.compression](self.compression_level) if self.compression else None
+
+    def add_block(self, height: int, lines, block_hash: str = None) -> bool:
+        """
+        Adds the output lines of one complete block, or of a failed block
+        retried later. Returns True if this committed a group.
+        """
+        if self.shard_blocks and self.shard_of(height) > self._shard:
+            self.commit()
+            self.shard_sizes[self._shard] = self.file.tell()
+            self.file.close()
+            self._open(height, 0)
+        data = ''.join(lines).encode('utf-8')
+        if self.shard_blocks and self.shard_of(height) < self._shard:
+            self._add_to_closed_shard(height, data)
+        elif data:
+            if self._compressor is not None:
+                self.file.write(self._compressor.compress(data))
+            else:
+                self._buffer.append(data)
+        self.failed.discard(height)
+        if self.journal_depth:
+            self.block_hashes.append([height, block_hash])
+            if len(self.block_hashes) > 1 and self.block_hashes[-2][0] > height:
+                self.block_hashes.sort(key=lambda block: block[0])
+        return self._added(height)
+
+    def _add_to_closed_shard(self, height: int, data: bytes):
+        """Appends a retried block to the closed shard of its height, at that shard's committed size."""
+        self.commit()
+        shard = self.shard_of(height)
+        path = self.shard_path(height)
+        size = self.shard_sizes.get(shard)
+        if size is None:
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+        if data and self.compression:
+            compressor = COMPRESSORS[self.compression](self.compression_level)
+            data = compressor.compress(data) + compressor.finish()
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.truncate(size)
+            f.seek(size)
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+            self.shard_sizes[shard] = f.tell()
+
+    def add_failed(self, height: int) -> bool:
+        """Marks a block that could not be fetched; it is committed as failed and retried later."""
+        self.failed.add(height)
+        return self._added(height)
+
+    def _added(self, height: int) -> bool:
+        self._pending_blocks += 1
+        self.height = height if self.height is None else max(self.height, height)
+        if self._pending_blocks >= self.flush_blocks or (
+                self.flush_interval is not None and time.monotonic() - self._last_commit >= self.flush_interval):
+            self.commit()
+            return True
+        return False
+
+    def commit(self):
+        """Writes the pending blocks and moves the commit marker past them."""
+        if not self._pending_blocks:
+            return
+        if self._compressor is not None:
+            self.file.write(self._compressor.finish())
+        elif self._buffer:
+            self.file.write(b''.join(self._buffer))
+            self._buffer = []
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        save_checkpoint(self.checkpoint_file, self.height, self.file.tell(), self.fsync, self._journal())
+        self._pending_blocks = 0
+        self._last_commit = time.monotonic()
+
+    def _journal(self):
+        """Records the commit being made and trims the journal to the last journal_depth heights."""
+        journal = {'failed': sorted(self.failed)} if self.failed else {}
+        shards = sorted({self.shard_of(height) for height in self.failed if self.shard_of(height) in self.shard_sizes})
+        if shards:
+            journal['shards'] = [[shard, self.shard_sizes[shard]] for shard in shards]
+        if not self.journal_depth:
+            return journal
+        commit = [self.height, self.file.tell(), sorted(self.failed)]
+        if self.index_records is not None:
+            commit.append(self.index_records)
+        self.commits.append(commit)
+        floor = self.height - self.journal_depth
+        # The newest commit at or below the floor stays as the deepest possible rollback point
+        base = max((index for index, commit in enumerate(self.commits) if commit[0] <= floor), default=0)
+        self.commits = self.commits[base:]
+        self.block_hashes = [block for block in self.block_hashes if block[0] > floor]
+        journal.update(blocks=self.block_hashes, commits=self.commits)
+        return journal
+
+    def close(self):
+        """Commits the remaining blocks and closes the output file."""
+        if self.file is not None:
+            self.commit()
+            self.file.close()
+            self.file = None
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Zero-copy Script and DER Signature Parsing
+Author: https://github.com/8891689
+
+All readers work on memoryview offsets: slices returned here share memory
+with the input buffer, and hex conversion is left to the caller.
+"""
+
+OP_0 = 0x00
+OP_PUSHDATA1 = 0x4c
+OP_PUSHDATA2 = 0x4d
+OP_PUSHDATA4 = 0x4e
+
+SIGHASH_ALL = 0x01
+SIGHASH_NONE = 0x02
+SIGHASH_SINGLE = 0x03
+SIGHASH_ANYONECANPAY = 0x80
+
+
+class ScriptError(ValueError):
+    """Raised when a script or serialized structure is truncated or malformed."""
+
+
+class DERError(ValueError):
+    """Raised when a signature is not a valid DER encoding."""
+
+
+class ByteReader:
+    """A cursor over a bytes-like buffer that hands out memoryview slices instead of copies."""
+    def __init__(self, data):
+        if isinstance(data, str):
+            data = bytes.fromhex(data)
+        self.view = memoryview(data)
+        self.pos = 0
+
+    def read(self, num_bytes: int) -> memoryview:
+        end = self.pos + num_bytes
+        if end > len(self.view):
+            raise EOFError("Stream ended unexpectedly.")
+        data = self.view[self.pos:end]
+        self.pos = end
+        return data
+
+    def peek(self, num_bytes: int) -> memoryview:
+        return self.view[self.pos:self.pos + num_bytes]
+
+    def read_uint(self, num_bytes: int) -> int:
+        return int.from_bytes(self.read(num_bytes), 'little')
+
+    def read_varint(self) -> int:
+        value, self.pos = read_varint(self.view, self.pos)
+        return value
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, pos: int):
+        self.pos = pos
+
+    def slice(self, start: int, end: int) -> memoryview:
+        return self.view[start:end]
+
+    def remaining(self) -> memoryview:
+        return self.view[self.pos:]
+
+
+def read_varint(buf, offset: int = 0):
+    """Reads a CompactSize integer at offset. Returns (value, next offset)."""
+    if offset >= len(buf):
+        raise EOFError("Stream ended unexpectedly.")
+    prefix = buf[offset]
+    if prefix < 0xfd:
+        return prefix, offset + 1
+    size = 2 if prefix == 0xfd else 4 if prefix == 0xfe else 8
+    end = offset + 1 + size
+    if end > len(buf):
+        raise EOFError("Stream ended unexpectedly.")
+    return int.from_bytes(buf[offset + 1:end], 'little'), end
+
+
+def iter_pushes(script):
+    """
+    Yields (opcode, data) for each element of a script. data is a memoryview
+    slice for push opcodes (including OP_PUSHDATA1/2/4) and None otherwise.
+    """
+    view = memoryview(script)
+    length = len(view)
+    pos = 0
+    while pos < length:
+        opcode = view[pos]
+        pos += 1
+        if opcode > OP_PUSHDATA4:
+            yield opcode, None
+            continue
+        if opcode < OP_PUSHDATA1:
+            size = opcode
+        else:
+            width = 1 if opcode == OP_PUSHDATA1 else 2 if opcode == OP_PUSHDATA2 else 4
+            if pos + width > length:
+                raise ScriptError("Push length extends past the end of the script.")
+            size = int.from_bytes(view[pos:pos + width], 'little')
+            pos += width
+        if pos + size > length:
+            raise ScriptError("Push data extends past the end of the script.")
+        yield opcode, view[pos:pos + size]
+        pos += size
+
+
+def parse_der_signature(sig, strict: bool = True, has_sighash: bool = True):
+    """
+    Parses a DER-encoded ECDSA signature, optionally followed by a sighash byte.
+
+    Returns (r, s, sighash) where r and s are memoryview slices of the DER
+    integers exactly as encoded (a leading 0x00 pad byte is kept) and sighash
+    is None when has_sighash is False.
+
+    Length fields are always checked against the buffer. strict additionally
+    enforces the BIP66 encoding rules (total length, no negative or
+    unnecessarily padded integers); pre-BIP66 blocks contain signatures that
+    only pass the non-strict check.
+    """
+    view = memoryview(sig)
+    total = len(view)
+    der_len = total - 1 if has_sighash else total
+    if der_len < 8 or view[0] != 0x30:
+        raise DERError("Signature is not a valid DER sequence.")
+    if view[2] != 0x02:
+        raise DERError("R component marker not found.")
+    r_len = view[3]
+    s_marker_pos = 4 + r_len
+    if r_len == 0 or s_marker_pos + 2 > der_len:
+        raise DERError("R length exceeds the signature.")
+    if view[s_marker_pos] != 0x02:
+        raise DERError("S component marker not found.")
+    s_len = view[s_marker_pos + 1]
+    s_start = s_marker_pos + 2
+    if s_len == 0 or s_start + s_len > der_len:
+        raise DERError("S length exceeds the signature.")
+
+    r = view[4:s_marker_pos]
+    s = view[s_start:s_start + s_len]
+
+    if strict:
+        if der_len > 72 or view[1] != der_len - 2 or s_start + s_len != der_len:
+            raise DERError("Signature length fields are inconsistent.")
+        for value in (r, s):
+            if value[0] & 0x80:
+                raise DERError("Signature integer is negative.")
+            if len(value) > 1 and value[0] == 0x00 and not value[1] & 0x80:
+                raise DERError("Signature integer has unnecessary padding.")
+
+    sighash = view[total - 1] if has_sighash else None
+    return r, s, sighash
+
+
+def strip_integer_padding(value):
+    """Drops the leading 0x00 that DER adds to integers with the high bit set."""
+    return value[1:] if len(value) > 1 and value[0] == 0x00 else value
+
+
+def extract_script_signatures(script, strict: bool = True) -> list:
+    """
+    Returns (r, s, sighash) for every push of a scriptSig that holds a
+    signature: the single signature of P2PK/P2PKH spends as well as each
+    signature of bare or P2SH multisig spends.
+    """
+    signatures = []
+    for _, data in iter_pushes(script):
+        if data is None or len(data) < 9 or data[0] != 0x30:
+            continue
+        try:
+            signatures.append(parse_der_signature(data, strict))
+        except DERError:
+            continue
+    return signatures
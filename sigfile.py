@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+"""
+Compact Binary Columnar Signature Files
+Author: https://github.com/8891689
+
+A signature file is a header, a run of chunks and a footer index:
+
+  header   b'SIGF0001', format version, record width
+  chunk    a chunk header followed by one column per field, each holding
+           the values of every record of the chunk:
+             txid, r, s, z          32 bytes each (big-endian values,
+                                    txid in display byte order)
+             input_index            uint32 (0xffffffff = unknown)
+             height                 int32 (-1 = unknown)
+             pubkey_ref             uint32 index into the chunk's pubkey
+                                    table (0xffffffff = none)
+             r_len, s_len           uint8 length of the DER integers as
+                                    encoded, so the text form round-trips
+             flags                  uint8, FLAG_HAS_Z / FLAG_TRUNCATED /
+                                    FLAG_TX_START (first signature of a
+                                    'Transaction ID' group)
+           then the pubkey table (1 length byte + 65 bytes per key).
+           Chunks hold whole blocks and are padded to 8 bytes.
+  footer   (offset, record count, first height, last height) per chunk,
+           then the index offset, the chunk count and b'SIGFEND1'.
+
+All integers are little-endian. A file whose footer is missing (the writer
+was interrupted) is still readable: the chunks are self-describing and are
+found by walking their headers.
+"""
+import argparse
+import os
+import re
+import struct
+import sys
+
+FILE_MAGIC = b'SIGF0001'
+FILE_HEADER = struct.Struct('<8sHHI')                # magic, version, record width, reserved
+CHUNK_MAGIC = b'CHNK'
+CHUNK_HEADER = struct.Struct('<4sIIiiIQ')            # magic, records, pubkeys, first height, last height, reserved, size
+INDEX_ENTRY = struct.Struct('<QIii')                 # chunk offset, records, first height, last height
+FOOTER = struct.Struct('<QI8s')                      # index offset, chunk count, magic
+FOOTER_MAGIC = b'SIGFEND1'
+FORMAT_VERSION = 1
+
+# Column name, bytes per record, memoryview format
+COLUMNS = (
+    ("txid", 32, 'B'),
+    ("r", 32, 'B'),
+    ("s", 32, 'B'),
+    ("z", 32, 'B'),
+    ("input_index", 4, 'I'),
+    ("height", 4, 'i'),
+    ("pubkey_ref", 4, 'I'),
+    ("r_len", 1, 'B'),
+    ("s_len", 1, 'B'),
+    ("flags", 1, 'B'),
+)
+RECORD_WIDTH = sum(width for _, width, _ in COLUMNS)
+NUMPY_DTYPES = {'B': 'u1', 'I': '<u4', 'i': '<i4'}
+PUBKEY_SLOT = 66
+UNKNOWN_INDEX = 0xffffffff
+UNKNOWN_HEIGHT = -1
+NO_PUBKEY = 0xffffffff
+FLAG_HAS_Z = 0x01
+FLAG_TRUNCATED = 0x02
+FLAG_TX_START = 0x04
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _integer_field(value):
+    """Returns (32-byte value, encoded length, truncated) for a DER integer given as hex or bytes."""
+    if isinstance(value, str):
+        value = bytes.fromhex(value)
+    length = len(value)
+    stripped = value.lstrip(b'\x00') if length > 32 else value
+    if len(stripped) > 32:
+        return bytes(stripped[-32:]), min(length, 255), True
+    return bytes(stripped).rjust(32, b'\x00'), length, False
+
+
+def _integer_text(value: bytes, length: int) -> str:
+    """Inverse of _integer_field: the integer as it appeared in the DER encoding, in hex."""
+    if length <= 32:
+        return value[32 - length:].hex()
+    return (bytes(length - 32) + value).hex()
+
+
+class SigFileWriter:
+    """
+    Appends signature records to a signature file in chunks of whole blocks.
+
+    records are (txid, input_index, r, s, z, pubkey) tuples; txid, r, s, z
+    and pubkey are hex or bytes, z and pubkey may be None and input_index
+    may be None when it is unknown. A new transaction group starts at every
+    block and wherever the txid changes. A chunk is written once it holds at
+    least chunk_records records; offset resumes an existing file at a chunk
+    boundary returned by data_end.
+    """
+    def __init__(self, path: str, offset: int = 0, chunk_records: int = 65536):
+        self.chunk_records = chunk_records
+        if offset:
+            self.file = open(path, 'r+b')
+            self.file.truncate(offset)
+            self.file.seek(offset)
+            reader = SigFileReader(path, scan=True, limit=offset)
+            self.index = [(chunk.offset, chunk.count, chunk.first_height, chunk.last_height)
+                          for chunk in reader.chunks()]
+            reader.close()
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(FILE_HEADER.pack(FILE_MAGIC, FORMAT_VERSION, RECORD_WIDTH, 0))
+            self.index = []
+        self.data_end = self.file.tell()
+        self.last_height = max((entry[3] for entry in self.index), default=None)
+        self._pending = []
+        self._pending_first = None
+        self._pending_last = None
+
+    def add_block(self, height: int, records) -> bool:
+        """
+        Adds the records of one block. Returns True when this completed a
+        chunk, i.e. everything up to this block is now in the file.
+        """
+        previous_txid = None
+        for record in records:
+            txid = record[0]
+            self._pending.append((height, txid != previous_txid) + tuple(record))
+            previous_txid = txid
+        # Blocks retried after a failure arrive out of order; a chunk records its lowest and highest height
+        if self._pending_first is None:
+            self._pending_first = self._pending_last = height
+        self._pending_first = min(self._pending_first, height)
+        self._pending_last = max(self._pending_last, height)
+        if len(self._pending) >= self.chunk_records:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        """Writes the pending blocks as one chunk."""
+        if self._pending_last is None:
+            return
+        pending = self._pending
+        count = len(pending)
+        pubkeys = {}
+        columns = {name: bytearray() for name, _, _ in COLUMNS}
+        for height, tx_start, txid, input_index, r, s, z, pubkey in pending:
+            r_value, r_len, r_truncated = _integer_field(r)
+            s_value, s_len, s_truncated = _integer_field(s)
+            flags = FLAG_TRUNCATED if r_truncated or s_truncated else 0
+            if tx_start:
+                flags |= FLAG_TX_START
+            if z is not None:
+                flags |= FLAG_HAS_Z
+                z = bytes.fromhex(z) if isinstance(z, str) else bytes(z)
+            if pubkey is not None:
+                pubkey = bytes.fromhex(pubkey) if isinstance(pubkey, str) else bytes(pubkey)
+                pubkey_ref = pubkeys.setdefault(pubkey, len(pubkeys))
+            else:
+                pubkey_ref = NO_PUBKEY
+            columns["txid"] += bytes.fromhex(txid) if isinstance(txid, str) else txid
+            columns["r"] += r_value
+            columns["s"] += s_value
+            columns["z"] += z if z is not None else bytes(32)
+            columns["input_index"] += (UNKNOWN_INDEX if input_index is None else input_index).to_bytes(4, 'little')
+            columns["height"] += height.to_bytes(4, 'little', signed=True)
+            columns["pubkey_ref"] += pubkey_ref.to_bytes(4, 'little')
+            columns["r_len"].append(r_len)
+            columns["s_len"].append(s_len)
+            columns["flags"].append(flags)
+
+        body = b''.join(columns[name] for name, _, _ in COLUMNS)
+        body += bytes(_align(len(body)) - len(body))
+        table = b''.join(bytes((len(pubkey),)) + pubkey.ljust(PUBKEY_SLOT - 1, b'\x00') for pubkey in pubkeys)
+        table += bytes(_align(len(table)) - len(table))
+        size = CHUNK_HEADER.size + len(body) + len(table)
+
+        offset = self.data_end
+        self.file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, count, len(pubkeys), self._pending_first,
+                                          self._pending_last, 0, size) + body + table)
+        self.index.append((offset, count, self._pending_first, self._pending_last))
+        self.data_end = offset + size
+        self.last_height = self._pending_last if self.last_height is None else max(self.last_height, self._pending_last)
+        self._pending = []
+        self._pending_first = self._pending_last = None
+
+    def sync(self):
+        """Makes the chunks written so far durable."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        """Writes the remaining records and the footer index."""
+        self.flush()
+        self.file.seek(self.data_end)
+        self.file.write(b''.join(INDEX_ENTRY.pack(*entry) for entry in self.index))
+        self.file.write(FOOTER.pack(self.data_end, len(self.index), FOOTER_MAGIC))
+        self.file.truncate()
+        self.file.close()
+
+
+class SigChunk:
+    """One chunk of a mapped signature file. Columns are zero-copy views of the mapping."""
+    def __init__(self, view: memoryview, offset: int):
+        (_, self.count, self.pubkey_count, self.first_height, self.last_height,
+         _, self.size) = CHUNK_HEADER.unpack_from(view, offset)
+        self.offset = offset
+        self._view = view
+        position = offset + CHUNK_HEADER.size
+        self._columns = {}
+        for name, width, _ in COLUMNS:
+            self._columns[name] = (position, width)
+            position += width * self.count
+        self._pubkeys = _align(position)
+
+    def column(self, name: str) -> memoryview:
+        """A column as a memoryview; 32-byte columns have shape (count, 32)."""
+        start, width = self._columns[name]
+        view = self._view[start:start + width * self.count]
+        fmt = dict((column, fmt) for column, _, fmt in COLUMNS)[name]
+        if width == 32:
+            return view.cast('B', [self.count, 32]) if self.count else view
+        if sys.byteorder != 'little' and width > 1:
+            raise NotImplementedError("memoryview columns require a little-endian machine; use numpy_columns().")
+        return view.cast(fmt)
+
+    def numpy_columns(self) -> dict:
+        """The columns as NumPy arrays sharing memory with the mapping."""
+        import numpy as np
+        arrays = {}
+        for name, width, fmt in COLUMNS:
+            start, _ = self._columns[name]
+            if width == 32:
+                arrays[name] = np.frombuffer(self._view, dtype='u1', count=32 * self.count,
+                                             offset=start).reshape(self.count, 32)
+            else:
+                arrays[name] = np.frombuffer(self._view, dtype=NUMPY_DTYPES[fmt], count=self.count, offset=start)
+        return arrays
+
+    def pubkey(self, reference: int):
+        """Resolves a pubkey_ref to the key bytes, or None."""
+        if reference == NO_PUBKEY or reference >= self.pubkey_count:
+            return None
+        start = self._pubkeys + reference * PUBKEY_SLOT
+        return bytes(self._view[start + 1:start + 1 + self._view[start]])
+
+    def records(self, start: int = 0, stop: int = None):
+        """
+        Yields (height, txid, input_index, r, s, z, pubkey, tx_start) per
+        record (or records start to stop), with r and s in hex as they were
+        encoded.
+        """
+        txid, r, s, z = (self._columns[name][0] for name in ("txid", "r", "s", "z"))
+        input_index = self.column("input_index")
+        height = self.column("height")
+        pubkey_ref = self.column("pubkey_ref")
+        r_len, s_len, flags = self.column("r_len"), self.column("s_len"), self.column("flags")
+        view = self._view
+        for index in range(start, self.count if stop is None else min(stop, self.count)):
+            field = index * 32
+            yield (
+                None if height[index] == UNKNOWN_HEIGHT else height[index],
+                bytes(view[txid + field:txid + field + 32]),
+                None if input_index[index] == UNKNOWN_INDEX else input_index[index],
+                _integer_text(bytes(view[r + field:r + field + 32]), r_len[index]),
+                _integer_text(bytes(view[s + field:s + field + 32]), s_len[index]),
+                bytes(view[z + field:z + field + 32]) if flags[index] & FLAG_HAS_Z else None,
+                self.pubkey(pubkey_ref[index]),
+                bool(flags[index] & FLAG_TX_START),
+            )
+
+
+class SigFileReader:
+    """Memory-maps a signature file and gives access to its chunks."""
+    def __init__(self, path: str, scan: bool = False, limit: int = None):
+        import mmap
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.view = memoryview(self.map)
+        if len(self.view) < FILE_HEADER.size or FILE_HEADER.unpack_from(self.view, 0)[0] != FILE_MAGIC:
+            raise ValueError(f"{path} is not a signature file.")
+        self.offsets = None if scan else self._read_footer()
+        if self.offsets is None:
+            self.offsets = self._scan(limit or len(self.view))
+
+    def _read_footer(self):
+        if len(self.view) < FILE_HEADER.size + FOOTER.size:
+            return None
+        index_offset, count, magic = FOOTER.unpack_from(self.view, len(self.view) - FOOTER.size)
+        if magic != FOOTER_MAGIC or index_offset + count * INDEX_ENTRY.size + FOOTER.size != len(self.view):
+            return None
+        return [INDEX_ENTRY.unpack_from(self.view, index_offset + entry * INDEX_ENTRY.size)[0]
+                for entry in range(count)]
+
+    def _scan(self, limit: int) -> list:
+        """Finds the chunks by walking their headers, stopping at the first incomplete one."""
+        offsets = []
+        offset = FILE_HEADER.size
+        while offset + CHUNK_HEADER.size <= limit:
+            magic, _, _, _, _, _, size = CHUNK_HEADER.unpack_from(self.view, offset)
+            if magic != CHUNK_MAGIC or offset + size > limit:
+                break
+            offsets.append(offset)
+            offset += size
+        return offsets
+
+    def chunks(self):
+        for offset in self.offsets:
+            yield SigChunk(self.view, offset)
+
+    def records(self):
+        for chunk in self.chunks():
+            yield from chunk.records()
+
+    def __len__(self) -> int:
+        return sum(SigChunk(self.view, offset).count for offset in self.offsets)
+
+    def close(self):
+        self.view.release()
+        if self.map:
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def is_signature_file(path: str) -> bool:
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(FILE_MAGIC)) == FILE_MAGIC
+    except OSError:
+        return False
+
+
+def format_records_as_text(records) -> list:
+    """Renders records from SigChunk.records as extract_data.py output lines."""
+    lines = []
+    for _, txid, _, r, s, z, _, tx_start in records:
+        if tx_start:
+            lines.append(f"Transaction ID: {txid.hex()}\n")
+        if z is None:
+            lines.append(f"  Signature - R: {r}, S: {s}\n")
+        else:
+            lines.append(f"  Signature - R: {r}, S: {s}, Z: {z.hex()}\n")
+    return lines
+
+
+TEXT_SIGNATURE = re.compile(r'R: ([0-9a-fA-F]+), S: ([0-9a-fA-F]+)(?:, Z: ([0-9a-fA-F]{64}))?')
+
+
+def iter_text_transactions(path: str):
+    """
+    Yields the (txid, input_index, r, s, z, pubkey) records of an
+    extract_data.py text output file, one list per 'Transaction ID' group.
+    The text form holds no input indexes, heights or pubkeys, so these are
+    left unknown.
+    """
+    txid = None
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith("Transaction ID: "):
+                if records:
+                    yield records
+                txid = line[16:].strip()
+                records = []
+                continue
+            match = TEXT_SIGNATURE.search(line)
+            if match and txid:
+                records.append((txid, None, match.group(1), match.group(2), match.group(3), None))
+    if records:
+        yield records
+
+
+def text_to_signature_file(text_path: str, sig_path: str, chunk_records: int = 65536) -> int:
+    writer = SigFileWriter(sig_path, chunk_records=chunk_records)
+    count = 0
+    for records in iter_text_transactions(text_path):
+        writer.add_block(UNKNOWN_HEIGHT, records)
+        count += len(records)
+    writer.close()
+    return count
+
+
+def signature_file_to_text(sig_path: str, text_path: str) -> int:
+    count = 0
+    with SigFileReader(sig_path) as reader, open(text_path, 'w') as out:
+        for chunk in reader.chunks():
+            out.writelines(format_records_as_text(chunk.records()))
+            count += chunk.count
+    return count
+
+
+def setup_arg_parser():
+    """Sets up the command-line argument parser."""
+    parser = argparse.ArgumentParser(description="Inspect and convert binary signature files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    to_text = subparsers.add_parser("to-text", help="Convert a signature file to the text output format.")
+    to_text.add_argument("input_file")
+    to_text.add_argument("output_file")
+    from_text = subparsers.add_parser("from-text", help="Convert a text output file to a signature file.")
+    from_text.add_argument("input_file")
+    from_text.add_argument("output_file")
+    info = subparsers.add_parser("info", help="Show the chunks of a signature file.")
+    info.add_argument("input_file")
+    return parser
+
+
+def main():
+    args = setup_arg_parser().parse_args()
+    if args.command == "to-text":
+        count = signature_file_to_text(args.input_file, args.output_file)
+        print(f"Wrote {count} signatures to {args.output_file}")
+    elif args.command == "from-text":
+        count = text_to_signature_file(args.input_file, args.output_file)
+        print(f"Wrote {count} signatures to {args.output_file}")
+    else:
+        with SigFileReader(args.input_file) as reader:
+            for chunk in reader.chunks():
+                print(f"offset {chunk.offset}: {chunk.count} signatures, heights {chunk.first_height}-"
+                      f"{chunk.last_height}, {chunk.pubkey_count} pubkeys")
+            print(f"{len(reader)} signatures in {len(reader.offsets)} chunks")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+Signature Hash (z) Computation for Legacy Inputs
+Author: https://github.com/8891689
+
+The shared parts of the transaction are serialized once into a template in
+which every input script is empty. The preimage of input i is that template
+with the signing input's scriptCode patched in, so the Python work per input
+is constant. The prefix hash is carried forward as a SHA-256 midstate; only
+the part after the patched slot is hashed again for each input.
+"""
+import hashlib
+from functools import lru_cache
+
+from block_parser import double_sha256
+from script_parser import (iter_pushes, parse_der_signature, DERError, ScriptError,
+                           SIGHASH_ALL, SIGHASH_NONE, SIGHASH_SINGLE, SIGHASH_ANYONECANPAY)
+
+# uint256 one as Bitcoin Core stores it: least significant byte first, so the signed digest is 01 00 .. 00
+SIGHASH_SINGLE_BUG = b'\x01' + bytes(31)
+
+
+def encode_varint(value: int) -> bytes:
+    """Serializes an integer as a CompactSize."""
+    if value < 0xfd:
+        return bytes((value,))
+    if value <= 0xffff:
+        return b'\xfd' + value.to_bytes(2, 'little')
+    if value <= 0xffffffff:
+        return b'\xfe' + value.to_bytes(4, 'little')
+    return b'\xff' + value.to_bytes(8, 'little')
+
+
+@lru_cache(maxsize=65536)
+def hash160(data: bytes) -> bytes:
+    """RIPEMD160(SHA256(data)), cached per distinct public key."""
+    return hashlib.new('ripemd160', hashlib.sha256(data).digest()).digest()
+
+
+def p2pkh_script_code(pubkey) -> bytes:
+    """The scriptPubKey a P2PKH input signs for the given public key."""
+    return b'\x76\xa9\x14' + hash160(bytes(pubkey)) + b'\x88\xac'
+
+
+def serialize_input(tx_input: dict, script: bytes, sequence=None) -> bytes:
+    sequence = tx_input["sequence"] if sequence is None else sequence
+    return (bytes(tx_input["prev_txid"]) + tx_input["prev_index"].to_bytes(4, 'little')
+            + encode_varint(len(script)) + script + sequence.to_bytes(4, 'little'))
+
+
+def serialize_output(tx_output: dict) -> bytes:
+    script = bytes(tx_output["script_pubkey"])
+    return tx_output["value"].to_bytes(8, 'little') + encode_varint(len(script)) + script
+
+
+def is_pubkey(data) -> bool:
+    return len(data) in (33, 65) and data[0] in (0x02, 0x03, 0x04)
+
+
+def collect_signatures(items) -> list:
+    """Returns (r, s, sighash) for every item that parses as a DER signature with a sighash byte."""
+    signatures = []
+    for data in items:
+        if len(data) >= 9 and data[0] == 0x30:
+            try:
+                signatures.append(parse_der_signature(data, strict=False))
+            except DERError:
+                continue
+    return signatures
+
+
+def legacy_signing_info(script_sig):
+    """
+    Inspects a legacy scriptSig and returns (signatures, script_code, pubkey)
+    where signatures is a list of (r, s, sighash) and script_code is what the
+    signatures commit to: the P2PKH script of the pushed public key, or the
+    redeem script of a P2SH spend. script_code is None when it cannot be
+    derived from the scriptSig alone (e.g. P2PK spends).
+    """
+    pushes = [data for _, data in iter_pushes(script_sig) if data is not None]
+    signatures = collect_signatures(pushes)
+    if not signatures:
+        return signatures, None, None
+
+    last = pushes[-1]
+    if len(pushes) == 2 and is_pubkey(last):
+        return signatures, p2pkh_script_code(last), last
+    if len(signatures) < len(pushes) and len(last) and last[0] != 0x30:
+        # P2SH: the redeem script is the last push
+        return signatures, bytes(last), None
+    return signatures, None, None
+
+
+def witness_signing_info(witness):
+    """
+    Inspects a witness stack and returns (signatures, script_code, pubkey):
+    P2WPKH (and P2SH-P2WPKH) stacks sign the P2PKH script of their public
+    key, P2WSH (and P2SH-P2WSH) stacks sign their witness script. Taproot
+    stacks carry Schnorr signatures and yield no ECDSA signatures.
+    """
+    signatures = collect_signatures(witness[:-1])
+    if not signatures:
+        return signatures, None, None
+    last = witness[-1]
+    if len(witness) == 2 and len(last) == 33 and is_pubkey(last):
+        return signatures, p2pkh_script_code(last), last
+    return signatures, bytes(last), None
+
+
+class LegacySighashEngine:
+    """Computes legacy (pre-SegWit) signature hashes for every input of one transaction."""
+    def __init__(self, tx: dict):
+        self.tx = tx
+        self.inputs = tx["vin"]
+        self.outputs = tx["vout"]
+        self.version = tx["version"].to_bytes(4, 'little')
+        self.locktime = tx["locktime"].to_bytes(4, 'little')
+        self.outputs_blob = encode_varint(len(self.outputs)) + b''.join(serialize_output(o) for o in self.outputs)
+
+        # Template with every input script empty; slots[i] is the offset of input i's 0x00 script length
+        template = bytearray(self.version + encode_varint(len(self.inputs)))
+        self.slots = []
+        for tx_input in self.inputs:
+            template += bytes(tx_input["prev_txid"]) + tx_input["prev_index"].to_bytes(4, 'little')
+            self.slots.append(len(template))
+            template += b'\x00' + tx_input["sequence"].to_bytes(4, 'little')
+        template += self.outputs_blob + self.locktime
+        self.template = template
+        self._template_view = memoryview(template)
+
+        self._prefix_hash = hashlib.sha256()
+        self._prefix_end = 0
+
+    def _prefix_midstate(self, index: int):
+        """SHA-256 state after the template bytes preceding input index's script slot."""
+        slot = self.slots[index]
+        if slot < self._prefix_end:
+            self._prefix_hash = hashlib.sha256()
+            self._prefix_end = 0
+        self._prefix_hash.update(self._template_view[self._prefix_end:slot])
+        self._prefix_end = slot
+        return self._prefix_hash.copy()
+
+    def sighash(self, index: int, script_code: bytes, sighash_type: int = SIGHASH_ALL) -> bytes:
+        """Returns the 32-byte signature hash (z) for input index, big-endian like the hex z values."""
+        base_type = sighash_type & 0x1f
+        if base_type == SIGHASH_SINGLE and index >= len(self.outputs):
+            # Consensus quirk: SIGHASH_SINGLE without a matching output signs the value 1
+            return SIGHASH_SINGLE_BUG
+        type_bytes = (sighash_type & 0xff).to_bytes(4, 'little')
+
+        if base_type not in (SIGHASH_NONE, SIGHASH_SINGLE) and not sighash_type & SIGHASH_ANYONECANPAY:
+            h = self._prefix_midstate(index)
+            h.update(encode_varint(len(script_code)))
+            h.update(script_code)
+            h.update(self._template_view[self.slots[index] + 1:])
+            h.update(type_bytes)
+            return hashlib.sha256(h.digest()).digest()
+
+        preimage = self._custom_preimage(index, script_code, sighash_type, type_bytes)
+        return hashlib.sha256(hashlib.sha256(preimage).digest()).digest()
+
+    def _custom_preimage(self, index, script_code, sighash_type, type_bytes) -> bytes:
+        """Builds the preimage for SIGHASH_NONE, SIGHASH_SINGLE and ANYONECANPAY variants."""
+        base_type = sighash_type & 0x1f
+        parts = [self.version]
+        if sighash_type & SIGHASH_ANYONECANPAY:
+            parts.append(b'\x01')
+            parts.append(serialize_input(self.inputs[index], script_code))
+        else:
+            parts.append(encode_varint(len(self.inputs)))
+            # Other inputs' sequences are not signed under NONE and SINGLE
+            other_sequence = 0 if base_type in (SIGHASH_NONE, SIGHASH_SINGLE) else None
+            for i, tx_input in enumerate(self.inputs):
+                if i == index:
+                    parts.append(serialize_input(tx_input, script_code))
+                else:
+                    parts.append(serialize_input(tx_input, b'', other_sequence))
+
+        if base_type == SIGHASH_NONE:
+            parts.append(b'\x00')
+        elif base_type == SIGHASH_SINGLE:
+            parts.append(encode_varint(index + 1))
+            # Outputs before the signed one are blanked: value -1 and an empty script
+            parts.append((b'\xff' * 8 + b'\x00') * index)
+            parts.append(serialize_output(self.outputs[index]))
+        else:
+            parts.append(self.outputs_blob)
+        parts.append(self.locktime)
+        parts.append(type_bytes)
+        return b''.join(parts)
+
+
+def legacy_z_values(tx: dict) -> list:
+    """
+    Returns one entry per input: a list of (r, s, z) for the signatures of
+    that input (r and s as memoryview, z as 32 bytes), or None for inputs
+    whose scriptCode cannot be derived from the scriptSig.
+    """
+    engine = LegacySighashEngine(tx)
+    results = []
+    for index, tx_input in enumerate(tx["vin"]):
+        signatures, script_code, _ = legacy_signing_info(tx_input["script_sig"])
+        if script_code is None:
+            results.append(None)
+            continue
+        results.append([(r, s, engine.sighash(index, script_code, sighash)) for r, s, sighash in signatures])
+    return results
+
+
+class SegwitSighashEngine:
+    """
+    Computes BIP143 signature hashes for the witness inputs of one transaction.
+    hashPrevouts, hashSequence and hashOutputs are computed once and reused
+    for every input.
+    """
+    def __init__(self, tx: dict):
+        self.inputs = tx["vin"]
+        self.outputs = tx["vout"]
+        self.version = tx["version"].to_bytes(4, 'little')
+        self.locktime = tx["locktime"].to_bytes(4, 'little')
+        self.outpoints = [bytes(i["prev_txid"]) + i["prev_index"].to_bytes(4, 'little') for i in self.inputs]
+        self.hash_prevouts = double_sha256(b''.join(self.outpoints))
+        self.hash_sequence = double_sha256(b''.join(i["sequence"].to_bytes(4, 'little') for i in self.inputs))
+        self.hash_outputs = double_sha256(b''.join(serialize_output(o) for o in self.outputs))
+
+    def sighash(self, index: int, script_code: bytes, amount: int, sighash_type: int = SIGHASH_ALL) -> bytes:
+        """Returns the 32-byte BIP143 signature hash (z) for input index spending amount satoshis."""
+        base_type = sighash_type & 0x1f
+        anyone_can_pay = sighash_type & SIGHASH_ANYONECANPAY
+        zero = b'\x00' * 32
+
+        hash_prevouts = zero if anyone_can_pay else self.hash_prevouts
+        if anyone_can_pay or base_type in (SIGHASH_NONE, SIGHASH_SINGLE):
+            hash_sequence = zero
+        else:
+            hash_sequence = self.hash_sequence
+        if base_type not in (SIGHASH_NONE, SIGHASH_SINGLE):
+            hash_outputs = self.hash_outputs
+        elif base_type == SIGHASH_SINGLE and index < len(self.outputs):
+            hash_outputs = double_sha256(serialize_output(self.outputs[index]))
+        else:
+            hash_outputs = zero
+
+        preimage = b''.join((
+            self.version, hash_prevouts, hash_sequence, self.outpoints[index],
+            encode_varint(len(script_code)), script_code, amount.to_bytes(8, 'little'),
+            self.inputs[index]["sequence"].to_bytes(4, 'little'), hash_outputs, self.locktime,
+            (sighash_type & 0xff).to_bytes(4, 'little')
+        ))
+        return double_sha256(preimage)
+
+
+def transaction_signing_infos(tx: dict) -> list:
+    """Returns (is_witness, signatures, script_code, pubkey) for each input of a transaction."""
+    infos = []
+    for tx_input in tx["vin"]:
+        if tx_input["witness"]:
+            infos.append((True,) + witness_signing_info(tx_input["witness"]))
+            continue
+        try:
+            infos.append((False,) + legacy_signing_info(tx_input["script_sig"]))
+        except ScriptError:
+            # Non-standard scriptSigs in old blocks need not be valid push sequences
+            infos.append((False, [], None, None))
+    return infos
+
+
+def required_outpoints(tx: dict, infos: list) -> list:
+    """
+    Outpoints whose prevout is needed for z: witness inputs need the amount
+    they spend, legacy inputs that do not reveal their scriptCode (P2PK)
+    need the previous scriptPubKey.
+    """
+    return [
+        (tx_input["prev_txid"][::-1].hex(), tx_input["prev_index"])
+        for tx_input, (is_witness, signatures, script_code, _) in zip(tx["vin"], infos)
+        if signatures and (is_witness or script_code is None)
+    ]
+
+
+def compute_z_values(tx: dict, infos: list, prevouts: dict) -> list:
+    """Computes (signatures, pubkey) per input from signing infos and already fetched prevouts."""
+    legacy_engine = None
+    segwit_engine = None
+    results = []
+    for index, (tx_input, (is_witness, signatures, script_code, pubkey)) in enumerate(zip(tx["vin"], infos)):
+        prevout = prevouts.get((tx_input["prev_txid"][::-1].hex(), tx_input["prev_index"])) if prevouts else None
+        entries = []
+        for r, s, sighash_type in signatures:
+            z = None
+            if is_witness:
+                if prevout is not None:
+                    segwit_engine = segwit_engine or SegwitSighashEngine(tx)
+                    z = segwit_engine.sighash(index, script_code, prevout[0], sighash_type)
+            else:
+                code = script_code if script_code is not None else (bytes(prevout[1]) if prevout else None)
+                if code is not None:
+                    legacy_engine = legacy_engine or LegacySighashEngine(tx)
+                    z = legacy_engine.sighash(index, code, sighash_type)
+            entries.append((r, s, z))
+        results.append((entries, pubkey))
+    return results
+
+
+def transaction_z_values(tx: dict, prevout_provider=None) -> list:
+    """
+    Returns one (signatures, pubkey) entry per input, where signatures is a
+    list of (r, s, z) and pubkey is the single public key of P2PKH/P2WPKH
+    spends (None otherwise).
+
+    The prevouts listed by required_outpoints are looked up through
+    prevout_provider in one batch. z is None when the provider is missing or
+    does not know the prevout.
+    """
+    infos = transaction_signing_infos(tx)
+    wanted = required_outpoints(tx, infos)
+    prevouts = prevout_provider.get_prevouts(wanted) if prevout_provider and wanted else {}
+    return compute_z_values(tx, infos, prevouts)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Compact Signature Records
+Author: https://github.com/8891689
+
+Record types for the extraction hot path. Values are kept as raw bytes and
+only converted to hex where they are written out:
+
+  Signature       one signature of extract_data.py (r, s, input index)
+  InputSignature  one signature of extract_rszp.py with its input fields
+  SignatureBatch  all signatures of a block in a few contiguous buffers
+
+A dict of hex strings per signature costs several hundred bytes and half a
+dozen allocations. The slotted classes have no per-instance dict, and a
+SignatureBatch holds a whole block in one bytearray and a few arrays, which
+also pickle as a handful of buffers when a worker sends a block back.
+"""
+from array import array
+
+# Per signature, the end offsets of r, s, z and pubkey in SignatureBatch.data
+BATCH_FIELDS = 4
+NO_INPUT_INDEX = -1
+
+
+class Signature:
+    """A signature of a scriptSig: r and s as encoded (bytes) and the input it was found in."""
+    __slots__ = ('r', 's', 'input_index')
+
+    def __init__(self, r: bytes, s: bytes, input_index: int = None):
+        self.r = r
+        self.s = s
+        self.input_index = input_index
+
+    def __repr__(self):
+        return f"Signature(r={self.r.hex()}, s={self.s.hex()}, input_index={self.input_index})"
+
+
+class InputSignature:
+    """A signature of a transaction input with the input's fields, as analyzed by extract_rszp.py."""
+    __slots__ = ('txid', 'input_index', 'prev_txid', 'prev_index', 'sequence', 'pubkey', 'r', 's', 'z')
+
+    def __init__(self, txid: str, input_index: int, prev_txid: bytes, prev_index: int, sequence: int,
+                 pubkey, r: bytes, s: bytes, z):
+        self.txid = txid
+        self.input_index = input_index
+        self.prev_txid = prev_txid
+        self.prev_index = prev_index
+        self.sequence = sequence
+        self.pubkey = pubkey
+        self.r = r
+        self.s = s
+        self.z = z
+
+    def to_dict(self) -> dict:
+        """The record with hex fields, as extract_rszp.py prints and writes it."""
+        return {
+            "txid": self.txid,
+            "input_index": self.input_index,
+            "prev_tx": self.prev_txid.hex(),
+            "prev_out_index": self.prev_index.to_bytes(4, 'little').hex(),
+            "pubkey": self.pubkey.hex() if self.pubkey is not None else None,
+            "sequence": self.sequence.to_bytes(4, 'little').hex(),
+            "r": self.r.hex(),
+            "s": self.s.hex(),
+            "z": self.z.hex() if self.z is not None else None,
+        }
+
+
+class SignatureBatch:
+    """
+    The signatures of one block. Transaction ids are listed once; per
+    signature there is a transaction number, an input index and the end
+    offsets of r, s, z and pubkey, whose bytes are appended to one
+    bytearray. Iterating yields (txid, input_index, r, s, z, pubkey)
+    records, the form SigFileWriter.add_block and RIndex.add take.
+    """
+    __slots__ = ('txids', 'tx_numbers', 'input_indexes', 'ends', 'data')
+
+    def __init__(self):
+        self.txids = []
+        self.tx_numbers = array('I')
+        self.input_indexes = array('i')
+        self.ends = array('I')
+        self.data = bytearray()
+
+    def add(self, txid: str, input_index, r, s, z=None, pubkey=None):
+        """Appends a signature; r, s, z and pubkey are bytes-like, z and pubkey may be None."""
+        txids = self.txids
+        if not txids or txids[-1] != txid:
+            txids.append(txid)
+        self.tx_numbers.append(len(txids) - 1)
+        self.input_indexes.append(NO_INPUT_INDEX if input_index is None else input_index)
+        data = self.data
+        ends = self.ends
+        data += r
+        ends.append(len(data))
+        data += s
+        ends.append(len(data))
+        if z is not None:
+            data += z
+        ends.append(len(data))
+        if pubkey is not None:
+            data += pubkey
+        ends.append(len(data))
+
+    def __len__(self) -> int:
+        return len(self.tx_numbers)
+
+    def __iter__(self):
+        data = bytes(self.data)
+        ends = iter(self.ends)
+        txids = self.txids
+        start = 0
+        for tx_number, input_index, r_end, s_end, z_end, pubkey_end in zip(self.tx_numbers, self.input_indexes,
+                                                                            *[ends] * BATCH_FIELDS):
+            yield (txids[tx_number], None if input_index == NO_INPUT_INDEX else input_index,
+                   data[start:r_end], data[r_end:s_end], data[s_end:z_end] or None, data[z_end:pubkey_end] or None)
+            start = pubkey_end
+
+    def text_lines(self) -> list:
+        """Renders the batch as extract_data.py output lines; the buffer is converted to hex in one call."""
+        digits = self.data.hex()
+        ends = iter(self.ends)
+        txids = self.txids
+        lines = []
+        current = None
+        start = 0
+        for tx_number, r_end, s_end, z_end, pubkey_end in zip(self.tx_numbers, *[ends] * BATCH_FIELDS):
+            if tx_number != current:
+                lines.append(f"Transaction ID: {txids[tx_number]}\n")
+                current = tx_number
+            if z_end == s_end:
+                lines.append(f"  Signature - R: {digits[2 * start:2 * r_end]}, S: {digits[2 * r_end:2 * s_end]}\n")
+            else:
+                lines.append(f"  Signature - R: {digits[2 * start:2 * r_end]}, S: {digits[2 * r_end:2 * s_end]}, "
+                             f"Z: {digits[2 * s_end:2 * z_end]}\n")
+            start = pubkey_end
+        return lines
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized Signature Quality Statistics
+Author: https://github.com/8891689
+
+Audits extracted signatures for statistical problems beyond repeated R
+values. The report has these parts:
+  - DER lengths of R and S. Short values have a leading zero byte,
+    which DER strips (about 1 in 256 for a good nonce).
+  - High-S versus low-S. BIP 62/146 wallets only produce S <= n/2.
+  - R and S values of zero or at least the curve order n. These are
+    never valid.
+  - A histogram of R bit lengths for each range of block heights.
+
+The signatures are handled as columnar NumPy arrays. R and S are (count,
+32) big-endian byte matrices, and every statistic is a vectorized
+operation over a batch. Binary signature files (sigfile.py) are
+memory-mapped chunk by chunk. Text output is parsed in batches of lines,
+so datasets larger than RAM are processed in bounded memory. Text output
+has no block heights, and neither has a signature file converted from it
+with `sigfile.py from-text`, so their R bit lengths are reported as a
+single range of unknown heights. Per-range histograms need a signature
+file written by `extract_data.py --format binary`.
+
+Needs NumPy (pip install numpy).
+"""
+import argparse
+import itertools
+import json
+import re
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from sigfile import SigFileReader, FLAG_TRUNCATED, UNKNOWN_HEIGHT, is_signature_file
+
+SECP256K1_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+HALF_N = SECP256K1_N // 2
+DEFAULT_RANGE_SIZE = 10000
+TEXT_BATCH_LINES = 1 << 20
+SIGNATURE_PATTERN = re.compile(r'R: ?([0-9a-fA-F]+), ?S: ?([0-9a-fA-F]+)')
+BYTE_BIT_LENGTHS = np.array([value.bit_length() for value in range(256)]) if np is not None else None
+
+
+def _words(value: int):
+    """An integer as the four big-endian 64-bit words of a 32-byte value."""
+    return np.frombuffer(value.to_bytes(32, 'big'), dtype='>u8')
+
+
+def compare_values(values, constant: int):
+    """Returns (greater, equal) masks of (count, 32) big-endian values against a constant."""
+    words = values.view('>u8')
+    limits = _words(constant)
+    greater = np.zeros(len(words), dtype=bool)
+    equal = np.ones(len(words), dtype=bool)
+    for index in range(4):
+        greater |= equal & (words[:, index] > limits[index])
+        equal &= words[:, index] == limits[index]
+    return greater, equal
+
+
+def bit_lengths(values):
+    """The bit length of each (count, 32) big-endian value; 0 for zero."""
+    nonzero = values != 0
+    first = nonzero.argmax(axis=1)
+    top = values[np.arange(len(values)), first]
+    lengths = (32 - first) * 8 - 8 + BYTE_BIT_LENGTHS[top]
+    return np.where(nonzero.any(axis=1), lengths, 0)
+
+
+class SignatureStats:
+    """Counters over batches of signatures; add batches, then call report."""
+    def __init__(self, range_size: int = DEFAULT_RANGE_SIZE):
+        if np is None:
+            raise RuntimeError("signature_stats needs the numpy package (pip install numpy).")
+        self.range_size = range_size
+        self.count = 0
+        self.r_length = np.zeros(256, dtype=np.int64)
+        self.s_length = np.zeros(256, dtype=np.int64)
+        self.high_s = 0
+        self.invalid_r = 0
+        self.invalid_s = 0
+        self.truncated = 0
+        # range index (None: unknown heights) -> [signatures, high S, short R, R bit length histogram]
+        self.ranges = {}
+
+    def add(self, r, s, r_length, s_length, heights=None, flags=None):
+        """
+        Adds a batch: r and s as (count, 32) uint8 big-endian arrays, their
+        DER lengths, and optionally block heights and sigfile flags.
+        """
+        count = len(r)
+        if not count:
+            return
+        self.count += count
+        self.r_length += np.bincount(r_length, minlength=256)[:256]
+        self.s_length += np.bincount(s_length, minlength=256)[:256]
+        high_s = compare_values(s, HALF_N)[0]
+        self.high_s += int(high_s.sum())
+        for values, attribute in ((r, 'invalid_r'), (s, 'invalid_s')):
+            greater, equal = compare_values(values, SECP256K1_N)
+            zero = ~values.any(axis=1)
+            setattr(self, attribute, getattr(self, attribute) + int((greater | equal | zero).sum()))
+        if flags is not None:
+            self.truncated += int(np.count_nonzero(flags & FLAG_TRUNCATED))
+
+        r_bits = bit_lengths(r)
+        short_r = r_length < 32
+        if heights is None:
+            self._add_range(None, r_bits, high_s, short_r)
+            return
+        # Records without a height go to the range of unknown heights
+        unknown = heights == UNKNOWN_HEIGHT
+        if unknown.any():
+            self._add_range(None, r_bits[unknown], high_s[unknown], short_r[unknown])
+        range_indexes = heights // self.range_size
+        for range_index in np.unique(range_indexes[~unknown]):
+            mask = range_indexes == range_index
+            self._add_range(int(range_index), r_bits[mask], high_s[mask], short_r[mask])
+
+    def _add_range(self, range_index, r_bits, high_s, short_r):
+        entry = self.ranges.get(range_index)
+        if entry is None:
+            entry = self.ranges[range_index] = [0, 0, 0, np.zeros(257, dtype=np.int64)]
+        entry[0] += len(r_bits)
+        entry[1] += int(high_s.sum())
+        entry[2] += int(short_r.sum())
+        entry[3] += np.bincount(r_bits, minlength=257)
+
+    def report(self) -> dict:
+        def lengths(histogram):
+            return {int(length): int(count) for length, count in enumerate(histogram) if count}
+
+        ranges = []
+        for range_index in sorted(self.ranges, key=lambda index: -1 if index is None else index):
+            signatures, high_s, short_r, r_bits = self.ranges[range_index]
+            ranges.append({
+                'first_height': None if range_index is None else range_index * self.range_size,
+                'last_height': None if range_index is None else (range_index + 1) * self.range_size - 1,
+                'signatures': signatures,
+                'high_s': high_s,
+                'short_r': short_r,
+                'r_bits': lengths(r_bits),
+            })
+        return {
+            'signatures': self.count,
+            'r_length': lengths(self.r_length),
+            's_length': lengths(self.s_length),
+            'short_r': int(self.r_length[:32].sum()),
+            'short_s': int(self.s_length[:32].sum()),
+            'high_s': self.high_s,
+            'low_s': self.count - self.high_s,
+            'invalid_r': self.invalid_r,
+            'invalid_s': self.invalid_s,
+            'truncated': self.truncated,
+            'ranges': ranges,
+        }
+
+
+def add_signature_file(stats: SignatureStats, path: str):
+    """Adds every chunk of a binary signature file; each chunk is memory-mapped, not copied."""
+    with SigFileReader(path) as reader:
+        for chunk in reader.chunks():
+            columns = chunk.numpy_columns()
+            stats.add(columns['r'], columns['s'], columns['r_len'], columns['s_len'], columns['height'],
+                      columns['flags'])
+            # The arrays share memory with the mapping, which cannot close while they exist
+            del columns
+
+
+def _integer_columns(hex_values):
+    """32-byte big-endian values and DER lengths of hex integers, as arrays."""
+    values = bytearray()
+    lengths = []
+    for value in hex_values:
+        raw = bytes.fromhex(value if len(value) % 2 == 0 else '0' + value)
+        lengths.append(min(len(raw), 255))
+        values += raw[-32:].rjust(32, b'\x00')
+    return np.frombuffer(bytes(values), dtype=np.uint8).reshape(-1, 32), np.array(lengths, dtype=np.int64)
+
+
+def add_text_file(stats: SignatureStats, path: str, batch_lines: int = TEXT_BATCH_LINES):
+    """Adds the signatures of a text output file, batch_lines lines at a time."""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        while True:
+            text = ''.join(itertools.islice(f, batch_lines))
+            if not text:
+                return
+            pairs = SIGNATURE_PATTERN.findall(text)
+            if pairs:
+                r, r_length = _integer_columns(pair[0] for pair in pairs)
+                s, s_length = _integer_columns(pair[1] for pair in pairs)
+                stats.add(r, s, r_length, s_length)
+
+
+def analyze_files(paths, range_size: int = DEFAULT_RANGE_SIZE) -> dict:
+    """The report over binary signature files and text output files."""
+    stats = SignatureStats(range_size)
+    for path in paths:
+        if is_signature_file(path):
+            add_signature_file(stats, path)
+        else:
+            add_text_file(stats, path)
+    return stats.report()
+
+
+def _share(count: int, total: int) -> str:
+    return f"{count:,} ({count / total:.3%})" if total else "0"
+
+
+def format_report(report: dict) -> str:
+    total = report['signatures']
+    lines = [
+        f"Signatures: {total:,}",
+        f"High S (> n/2): {_share(report['high_s'], total)}, low S: {_share(report['low_s'], total)}",
+        f"Short R (< 32 bytes): {_share(report['short_r'], total)}, "
+        f"short S: {_share(report['short_s'], total)}",
+        f"Invalid R (0 or >= n): {report['invalid_r']:,}, invalid S: {report['invalid_s']:,}, "
+        f"truncated encodings: {report['truncated']:,}",
+        "R lengths: " + ", ".join(f"{length}: {count:,}" for length, count in report['r_length'].items()),
+        "S lengths: " + ", ".join(f"{length}: {count:,}" for length, count in report['s_length'].items()),
+        "",
+        f"{'heights':<24}{'signatures':>12}{'high S':>10}{'short R':>10}  R bit lengths (most common)",
+    ]
+    unknown = "all" if len(report['ranges']) == 1 else "unknown"
+    for entry in report['ranges']:
+        heights = unknown if entry['first_height'] is None else f"{entry['first_height']}-{entry['last_height']}"
+        common = sorted(entry['r_bits'].items(), key=lambda item: -item[1])[:4]
+        lines.append(f"{heights:<24}{entry['signatures']:>12,}{entry['high_s']:>10,}{entry['short_r']:>10,}  "
+                     + ", ".join(f"{bits}: {count:,}" for bits, count in common))
+    return '\n'.join(lines)
+
+
+def setup_arg_parser():
+    """Sets up the command-line argument parser."""
+    parser = argparse.ArgumentParser(description="Report R/S length, high-S and R bit length statistics of "
+                                                 "extracted signatures (text output or binary signature files).")
+    parser.add_argument("files", nargs="+", help="Output files of extract_data.py, extract_blk.py or sigfile.py.")
+    parser.add_argument("--range-size", type=int, default=DEFAULT_RANGE_SIZE,
+                        help=f"Block heights per R bit length histogram (default: {DEFAULT_RANGE_SIZE}).")
+    parser.add_argument("--json", help="Also write the full report, with every histogram, to this JSON file.")
+    return parser
+
+
+def main():
+    args = setup_arg_parser().parse_args()
+    try:
+        report = analyze_files(args.files, args.range_size)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
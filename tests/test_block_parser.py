@@ -0,0 +1,93 @@
+import hashlib
+
+import extract_data
+from benchmarks.synthetic_chain import SyntheticChain
+from block_parser import parse_block, parse_transaction
+from script_parser import ByteReader
+
+# Block 170, transaction 1: the first bitcoin transfer, a P2PK spend
+FIRST_TRANSFER = (
+    "0100000001c997a5e56e104102fa209c6a852dd90660a20b2d9c352423edce25857fcd3704000000004847304402204e45e16932b8af"
+    "514961a1d3a1a25fdf3f4f7732e9d624c6c61548ab5fb8cd410220181522ec8eca07de4860a4acdd12909d831cc56cbbac4622082221"
+    "a8768d1d0901ffffffff0200ca9a3b00000000434104ae1a62fe09c5f51b13905f07f06b99a2f7159b2225f374cd378d71302fa28414"
+    "e7aab37397f554a7df5f142c21c1b7303b8a0626f1baded5c72a704f7e6cd84cac00286bee0000000043410411db93e1dcdb8a016b49"
+    "840f8c53bc1eb68a382e97b1482ecad7b148a6909a5cb2e0eaddfb84ccf9744464f82e160bfa9b8b64f9d4c03f999b8643f656b412a3"
+    "ac00000000")
+FIRST_TRANSFER_R = "4e45e16932b8af514961a1d3a1a25fdf3f4f7732e9d624c6c61548ab5fb8cd41"
+FIRST_TRANSFER_S = "181522ec8eca07de4860a4acdd12909d831cc56cbbac4622082221a8768d1d09"
+
+# The transaction as getblock with verbosity 2 reports it (fields the scanners do not read left out)
+FIRST_TRANSFER_VERBOSE = {
+    "txid": "f4184fc596403b9d638783cf57adfe4c75c605f6356fbc91338530e9831e9e16",
+    "hash": "f4184fc596403b9d638783cf57adfe4c75c605f6356fbc91338530e9831e9e16",
+    "version": 1,
+    "locktime": 0,
+    "vin": [{
+        "txid": "0437cd7f8525ceed2324359c2d0ba26006d92d856a9c20fa0241106ee5a597c9",
+        "vout": 0,
+        "scriptSig": {
+            "asm": f"30440220{FIRST_TRANSFER_R}0220{FIRST_TRANSFER_S}[ALL]",
+            "hex": f"4730440220{FIRST_TRANSFER_R}0220{FIRST_TRANSFER_S}01",
+        },
+        "sequence": 4294967295,
+    }],
+    "vout": [
+        {"value": 10.0, "n": 0, "scriptPubKey": {
+            "hex": "4104ae1a62fe09c5f51b13905f07f06b99a2f7159b2225f374cd378d71302fa28414e7aab37397f554a7df5f142c21c1b"
+                   "7303b8a0626f1baded5c72a704f7e6cd84cac"}},
+        {"value": 40.0, "n": 1, "scriptPubKey": {
+            "hex": "410411db93e1dcdb8a016b49840f8c53bc1eb68a382e97b1482ecad7b148a6909a5cb2e0eaddfb84ccf9744464f82e16"
+                   "0bfa9b8b64f9d4c03f999b8643f656b412a3ac"}},
+    ],
+}
+
+# The signed P2SH-P2WPKH example of BIP143
+SEGWIT_SPEND = (
+    "01000000000101db6b1b20aa0fd7b23880be2ecbd4a98130974cf4748fb66092ac4d3ceb1a5477010000001716001479091972186c44"
+    "9eb1ded22b78e40d009bdf0089feffffff02b8b4eb0b000000001976a914a457b684d7f0d539a46a45bbc043f35b59d0d96388ac0008"
+    "af2f000000001976a914fd270b1ee6abcaea97fea7ad0402e8bd8ad6d77c88ac02473044022047ac8e878352d3ebbde1c94ce3a10d05"
+    "7c24175747116f8288e5d794d12d482f0220217f36a485cae903c713331d877c1f64677e3622ad4010726870540656fe9dcb012103ad"
+    "1d8e89212f0b92c74d23bb710c00662ad1470198ac48c43f7d6f93a2a2687392040000")
+
+
+def verbose_fields(tx: dict) -> dict:
+    """The fields of a getblock verbosity 2 transaction that the scanners read."""
+    fields = {key: tx[key] for key in ("txid", "version", "locktime")}
+    fields["vin"] = [{key: value for key, value in tx_input.items() if key != "scriptSig"}
+                     | {"scriptSig": tx_input["scriptSig"]["hex"]} for tx_input in tx["vin"]]
+    fields["vout"] = [(output["value"], output["n"], output["scriptPubKey"]["hex"]) for output in tx["vout"]]
+    return fields
+
+
+def test_raw_transaction_matches_getblock_verbose_output():
+    tx = parse_transaction(ByteReader(bytes.fromhex(FIRST_TRANSFER)))
+    assert not tx["is_segwit"]
+    assert verbose_fields(SyntheticChain.decode_transaction(tx)) == verbose_fields(FIRST_TRANSFER_VERBOSE)
+
+
+def test_segwit_transaction_has_the_txid_of_its_stripped_serialization():
+    raw = bytes.fromhex(SEGWIT_SPEND)
+    tx = parse_transaction(ByteReader(raw))
+    assert tx["is_segwit"] and (tx["version"], tx["locktime"]) == (1, 1170)
+    tx_input, = tx["vin"]
+    assert bytes(tx_input["prev_txid"])[::-1].hex() == \
+        "77541aeb3c4dac9260b68f74f44c973081a9d4cb2ebe8038b2d70faa201b6bdb"
+    assert (tx_input["prev_index"], tx_input["sequence"]) == (1, 0xfffffffe)
+    assert bytes(tx_input["script_sig"]).hex() == "16001479091972186c449eb1ded22b78e40d009bdf0089"
+    assert [len(item) for item in tx_input["witness"]] == [71, 33]
+    assert [output["value"] for output in tx["vout"]] == [199996600, 800000000]
+    # The txid leaves out the marker, flag and witness; the witness is the last 1 + 72 + 34 bytes before nLockTime
+    stripped = raw[:4] + raw[6:-4 - 107] + raw[-4:]
+    assert tx["txid"] == hashlib.sha256(hashlib.sha256(stripped).digest()).digest()[::-1].hex()
+
+
+def test_raw_and_verbose_blocks_give_the_same_signatures():
+    # A block of the one transaction behind a blank header
+    raw_block = bytes(80) + b'\x01' + bytes.fromhex(FIRST_TRANSFER)
+    assert parse_block(raw_block)["tx"][0]["txid"] == FIRST_TRANSFER_VERBOSE["txid"]
+    raw_lines = extract_data.raw_block_signature_batch(raw_block).text_lines()
+    verbose_lines = extract_data.block_signature_batch({"tx": [FIRST_TRANSFER_VERBOSE]}).text_lines()
+    assert raw_lines == verbose_lines == [
+        f"Transaction ID: {FIRST_TRANSFER_VERBOSE['txid']}\n",
+        f"  Signature - R: {FIRST_TRANSFER_R}, S: {FIRST_TRANSFER_S}\n",
+    ]
@@ -0,0 +1,124 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import time
+
+import pytest
+
+import extract_data
+from benchmarks.mock_node import MockNode
+from benchmarks.synthetic_chain import SyntheticChain
+from coordinator import WorkQueue, unit_name, run_worker, _local_worker, _write_json
+from rpc_client import RPCAuthError
+
+
+def test_leases_expire_and_are_taken_over(tmp_path):
+    queue = WorkQueue.plan(str(tmp_path), 0, 29, unit_size=10)
+    assert queue.units == [(0, 9), (10, 19), (20, 29)]
+
+    assert queue.take("a", 0.5) == ((0, 9), 1)
+    assert queue.take("b", 60) == ((10, 19), 1)
+    assert queue.renew((0, 9), 1, "a", 0.5)
+    assert queue.status()['workers'] == {"a": [unit_name(0, 9)], "b": [unit_name(10, 19)]}
+
+    # a stops renewing: once its lease expires, the unit goes to the next worker with a new lease number
+    assert queue.take("c", 60) == ((20, 29), 1)
+    assert queue.take("c", 60) is None
+    time.sleep(0.6)
+    assert queue.take("c", 60) == ((0, 9), 2)
+    assert not queue.renew((0, 9), 1, "a", 60)
+
+    # A released lease can be taken at once; an unfinished shard cannot complete its unit
+    queue.release((10, 19), 1, "b")
+    assert queue.take("a", 60) == ((10, 19), 2)
+    assert not queue.complete((10, 19), "a")
+    assert queue.status() == {'units': 3, 'done': 0, 'leased': 3, 'open': 0,
+                              'workers': {"a": [unit_name(10, 19)], "c": [unit_name(0, 9), unit_name(20, 29)]}}
+
+
+def _take_and_die(directory):
+    # A worker that leases a unit and dies without renewing or releasing it
+    WorkQueue(directory).take("dead", 1.0)
+    os._exit(0)
+
+
+def test_workers_take_over_a_dead_lease_and_merge_matches_single_scan(tmp_path, monkeypatch):
+    chain = SyntheticChain(30, 10, seed=2)
+    directory = str(tmp_path / "work")
+    queue = WorkQueue.plan(directory, 0, len(chain) - 1, unit_size=4)
+    context = multiprocessing.get_context()
+
+    with MockNode(chain) as node:
+        dead = context.Process(target=_take_and_die, args=(directory,))
+        dead.start()
+        dead.join()
+        dead_unit = queue.units[0]
+        assert queue.current_lease(dead_unit)[1]['worker'] == "dead"
+
+        workers = [context.Process(target=_local_worker, args=(directory, f"w{index}", 1.0, node.url, {}))
+                   for index in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(120)
+        assert [worker.exitcode for worker in workers] == [0, 0, 0]
+
+        status = queue.status()
+        assert status['done'] == status['units'] == 8
+        assert queue.current_lease(dead_unit)[0] == 2
+        assert queue.done(dead_unit)['worker'] != "dead"
+
+        merged = tmp_path / "merged.txt"
+        queue.merge(str(merged))
+        single = tmp_path / "single.txt"
+        monkeypatch.setattr(extract_data.rpc_client, "url", node.url)
+        with contextlib.redirect_stdout(io.StringIO()):
+            extract_data.main(0, len(chain) - 1, str(single))
+
+    assert merged.read_text().count("Transaction ID:") > 100
+    assert merged.read_bytes() == single.read_bytes()
+
+
+def test_merge_refuses_unfinished_units(tmp_path):
+    queue = WorkQueue.plan(str(tmp_path), 0, 9, unit_size=5)
+    with pytest.raises(ValueError):
+        queue.merge(str(tmp_path / "out.txt"))
+
+
+def test_worker_stops_scanning_once_its_lease_is_taken_over(tmp_path, monkeypatch):
+    chain = SyntheticChain(10, 4, seed=8)
+    queue = WorkQueue.plan(str(tmp_path / "work"), 0, len(chain) - 1, unit_size=10)
+    unit = queue.units[0]
+    scan_fetched_block = extract_data.scan_fetched_block
+    scanned = []
+
+    def taken_over_at_block_3(height, *args, **kwargs):
+        scanned.append(height)
+        if height == 3 and scanned.count(3) == 1:
+            # Another worker takes the unit over; its lease runs out again shortly
+            _write_json(queue._path('leases', f"{unit_name(*unit)}.2"),
+                        {'worker': "other", 'expires': time.time() + 0.5})
+            time.sleep(0.3)
+        return scan_fetched_block(height, *args, **kwargs)
+
+    monkeypatch.setattr(extract_data, "scan_fetched_block", taken_over_at_block_3)
+    # run_worker points the client at rpc_url; restored afterwards
+    monkeypatch.setattr(extract_data.rpc_client, "url", extract_data.rpc_client.url)
+    with MockNode(chain) as node, contextlib.redirect_stdout(io.StringIO()) as log:
+        assert run_worker(queue.directory, "w", 0.3, rpc_url=node.url) == 1
+    assert "Stopping before block 3" in log.getvalue()
+    assert "taken over after the lease expired" in log.getvalue()
+    # The first lease ended at block 3; lease 3 resumed from there and completed the unit
+    assert scanned == [0, 1, 2, 3, 3, 4, 5, 6, 7, 8, 9]
+    assert queue.current_lease(unit)[0] == 3 and queue.done(unit)['worker'] == "w"
+
+
+def test_worker_releases_its_lease_when_the_scan_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(extract_data.rpc_client, "url", extract_data.rpc_client.url)
+    queue = WorkQueue.plan(str(tmp_path / "work"), 0, 3, unit_size=4)
+    with MockNode(SyntheticChain(4, 4, seed=8), auth=("other", "password")) as node, \
+            contextlib.redirect_stdout(io.StringIO()), pytest.raises(RPCAuthError):
+        run_worker(queue.directory, "w", 60, rpc_url=node.url)
+    # Without the release, the unit could only be taken after 60 seconds
+    assert queue.take("v", 60) == (queue.units[0], 2)
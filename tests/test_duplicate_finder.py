@@ -0,0 +1,173 @@
+import importlib.util
+import json
+import os
+import random
+from collections import Counter
+
+from duplicate_finder import (R_PATTERN, BloomFilter, find_duplicates, find_duplicate_groups,
+                              find_duplicates_approximate, iter_input_files, plan_chunks)
+from r_index import format_collision
+from sigfile import SigFileReader, SigFileWriter
+
+FILES = 3
+LINES_PER_FILE = 25000
+
+
+def der_hex(r: bytes) -> str:
+    """R as a signature encodes it: leading zero bytes stripped, a 00 pad before a set top bit."""
+    der = r.lstrip(b'\x00') or b'\x00'
+    return ('00' + der.hex()) if der[0] & 0x80 else der.hex()
+
+
+def write_dataset(directory, seed: int = 7):
+    """
+    Text files in the formats the project writes, larger than a scan chunk,
+    and one signature file. R values repeat within and across files, and
+    some are shorter than 32 bytes. Returns the paths and a Counter of R.
+    """
+    rng = random.Random(seed)
+    counts = Counter()
+    pool = []
+
+    def next_r():
+        if pool and rng.random() < 0.02:
+            r = rng.choice(pool)
+        else:
+            r = rng.randbytes(32)
+            if rng.random() < 0.05:
+                zeros = rng.randrange(1, 3)
+                r = bytes(zeros) + r[zeros:]
+            pool.append(r)
+        counts[r.hex()] += 1
+        return r
+
+    paths = []
+    for file_index in range(FILES):
+        lines = []
+        for _ in range(LINES_PER_FILE):
+            r, s = next_r(), rng.randbytes(32).hex()
+            if file_index % 2:
+                lines.append(f"ID: {rng.randbytes(32).hex()}\nR : {der_hex(r).upper()}\nS : {s}\nZ : {s}\n")
+            else:
+                lines.append(f"Transaction ID: {rng.randbytes(32).hex()}\n  Signature - R: {der_hex(r)}, S: {s}\n")
+        path = directory / f"signatures_{file_index}.txt"
+        path.write_text(''.join(lines))
+        paths.append(str(path))
+
+    sig_path = str(directory / "signatures.sig")
+    writer = SigFileWriter(sig_path, chunk_records=1000)
+    for height in range(5):
+        writer.add_block(height, [(rng.randbytes(32).hex(), 0, bytes.fromhex(der_hex(next_r())),
+                                   rng.randbytes(32), None, None) for _ in range(800)])
+    writer.close()
+    paths.append(sig_path)
+    return paths, counts
+
+
+def test_sharded_search_matches_counter(tmp_path):
+    paths, counts = write_dataset(tmp_path)
+    expected = {r: count for r, count in counts.items() if count >= 2}
+    assert any(r.startswith('00') for r in expected)
+    # A small budget splits every text file into several chunks and the values into several ranges
+    memory = 1 << 20
+    assert len(plan_chunks(paths[:FILES], memory, str(tmp_path))) > 2 * FILES
+
+    found = dict(find_duplicates(paths, memory, str(tmp_path), workers=2))
+    assert found == expected
+
+    groups = {group['r']: group['count'] for group in find_duplicate_groups(paths, memory, str(tmp_path), workers=2)}
+    assert groups == expected
+
+
+def test_approximate_search_matches_exact_counts(tmp_path):
+    paths, counts = write_dataset(tmp_path)
+    expected = sorted((r, count) for r, count in counts.items() if count >= 2)
+    for workers in (1, 2):
+        duplicates, stats = find_duplicates_approximate(paths, error_rate=0.001, workers=workers)
+        assert duplicates == expected
+        assert stats["values"] == sum(counts.values())
+        assert stats["false_positives"] <= 0.001 * stats["values"]
+
+
+def test_bloom_filter_positions_are_uniform():
+    rng = random.Random(3)
+    # Sized for about 1.5 * 2 ** 17 bits before rounding up; a modulo would favour the low positions
+    bloom = BloomFilter(20500, 0.01)
+    assert bloom.size == 1 << 18
+    for _ in range(20500):
+        bloom.add(rng.getrandbits(256))
+    half = len(bloom.bits) // 2
+    low, high = (sum(bin(byte).count("1") for byte in part) for part in (bloom.bits[:half], bloom.bits[half:]))
+    assert abs(low - high) < 0.03 * (low + high)
+
+
+def test_collision_reports_are_not_counted_again(tmp_path):
+    r = "7a" * 32
+    output = tmp_path / "signatures.txt"
+    output.write_text(f"Transaction ID: {'01' * 32}\n  Signature - R: {r}, S: {'02' * 32}\n"
+                      f"Transaction ID: {'03' * 32}\n  Signature - R: {r}, S: {'04' * 32}\n")
+    occurrences = [{"txid": "01" * 32, "input_index": 0, "height": 5},
+                   {"txid": "03" * 32, "input_index": 0, "height": None}]
+    report = format_collision(r, occurrences)
+    assert not R_PATTERN.findall(''.join(report).encode())
+    # An --r-index report, and one in the earlier 'R: <hex>' form, sit next to the output they describe
+    (tmp_path / "signatures.txt.collisions").write_text(''.join(report) + f"R: {r}, Occurrences: 2\n")
+
+    paths = list(iter_input_files(str(tmp_path)))
+    assert paths == [str(output)]
+    assert list(find_duplicates(paths, workers=1)) == [(r, 2)]
+
+
+def test_provenance_locates_a_known_collision(tmp_path):
+    rng = random.Random(11)
+    r = rng.randbytes(32)
+    txids = [rng.randbytes(32).hex() for _ in range(3)]
+    s_values = [rng.randbytes(32).hex() for _ in range(3)]
+    z = rng.randbytes(32)
+
+    def filler():
+        return f"Transaction ID: {rng.randbytes(32).hex()}\n  Signature - R: {rng.randbytes(32).hex()}, S: 01\n"
+
+    # The repeated R is the second signature of its transaction in the text file
+    reused_line = f"  Signature - R: {der_hex(r)}, S: {s_values[0]}\n"
+    text = (filler() + f"Transaction ID: {txids[0]}\n  Signature - R: {rng.randbytes(32).hex()}, S: 02\n"
+            + reused_line + filler())
+    (tmp_path / "a.txt").write_text(text)
+    # and the first signature after its 'ID:' line in the C++ tools' format
+    cpp_line = f"R : {der_hex(r).upper()}\n"
+    cpp = f"ID: {rng.randbytes(32).hex()}\nR : {rng.randbytes(32).hex()}\nS : 03\nZ : {'04' * 32}\n" \
+          f"ID: {txids[1]}\n{cpp_line}S : {s_values[1]}\nZ : {z.hex()}\n"
+    (tmp_path / "b.txt").write_text(cpp)
+
+    pubkey = bytes.fromhex("02" + rng.randbytes(32).hex())
+    writer = SigFileWriter(str(tmp_path / "c.sig"), chunk_records=4)
+    writer.add_block(6, [(rng.randbytes(32), 0, rng.randbytes(32), rng.randbytes(32), None, None) for _ in range(5)])
+    writer.add_block(7, [(rng.randbytes(32), 0, rng.randbytes(32), rng.randbytes(32), None, None),
+                         (txids[2], 3, r, bytes.fromhex(s_values[2]), z, pubkey)])
+    writer.close()
+    with SigFileReader(str(tmp_path / "c.sig")) as reader:
+        chunk_offset = reader.offsets[1]
+
+    paths = list(iter_input_files(str(tmp_path)))
+    group, = find_duplicate_groups(paths, workers=1)
+    assert (group['r'], group['count']) == (r.hex(), 3)
+    occurrences = sorted(group['occurrences'], key=lambda occurrence: occurrence['file'])
+    assert occurrences == [
+        {"file": str(tmp_path / "a.txt"), "offset": text.index(reused_line), "record": None, "txid": txids[0],
+         "input_index": 1, "height": None, "pubkey": None, "s": s_values[0], "z": None},
+        {"file": str(tmp_path / "b.txt"), "offset": cpp.index(cpp_line), "record": None, "txid": txids[1],
+         "input_index": 0, "height": None, "pubkey": None, "s": s_values[1], "z": z.hex()},
+        {"file": str(tmp_path / "c.sig"), "offset": chunk_offset, "record": 1, "txid": txids[2],
+         "input_index": 3, "height": 7, "pubkey": pubkey.hex(), "s": s_values[2], "z": z.hex()},
+    ]
+
+    # Check.for.Duplicates.py --provenance writes the same group as one JSON line
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Check.for.Duplicates.py")
+    spec = importlib.util.spec_from_file_location("check_for_duplicates", script)
+    check = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(check)
+    log = tmp_path / "duplicates_log.jsonl"
+    assert check.find_and_log_duplicate_provenance(str(tmp_path), str(log), workers=1) == 1
+    line, = log.read_text().splitlines()
+    logged = json.loads(line)
+    assert sorted(logged['occurrences'], key=lambda occurrence: occurrence['file']) == occurrences
@@ -0,0 +1,41 @@
+import contextlib
+import io
+import random
+
+import pytest
+
+import extract_blk
+import extract_data
+from benchmarks.mock_node import MockNode
+from benchmarks.synthetic_chain import SyntheticChain
+
+
+@pytest.fixture(scope="module")
+def chain():
+    return SyntheticChain(12, 15, seed=4, r_reuse=0.05)
+
+
+@pytest.mark.parametrize("xor_key", [None, bytes.fromhex("a1b2c3d4e5f60718")])
+@pytest.mark.parametrize("raw_blocks", [False, True])
+def test_blk_files_match_rpc_scan(tmp_path, monkeypatch, chain, xor_key, raw_blocks):
+    # Blocks are spread over two files out of height order, as Bitcoin Core stores them after a sync
+    heights = list(range(len(chain)))
+    random.Random(1).shuffle(heights)
+    blocks_dir = tmp_path / "blocks"
+    blocks_dir.mkdir()
+    for number, part in enumerate((heights[:5], heights[5:])):
+        extract_blk.write_blk_file(str(blocks_dir / f"blk{number:05d}.dat"), [chain.raw_block(h) for h in part],
+                                   xor_key=xor_key, padding=4096)
+    if xor_key:
+        (blocks_dir / "xor.dat").write_bytes(xor_key)
+
+    blk_output = tmp_path / "blk.txt"
+    rpc_output = tmp_path / "rpc.txt"
+    with MockNode(chain) as node, contextlib.redirect_stdout(io.StringIO()):
+        extract_blk.main(str(blocks_dir), str(blk_output), workers=2)
+        monkeypatch.setattr(extract_data.rpc_client, "url", node.url)
+        extract_data.main(0, len(chain) - 1, str(rpc_output), raw_blocks=raw_blocks)
+
+    blk_text = blk_output.read_text()
+    assert blk_text.count("Signature - R:") > 100
+    assert blk_text == rpc_output.read_text()
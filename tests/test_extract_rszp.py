@@ -0,0 +1,52 @@
+import csv
+import json
+import sys
+
+import pytest
+
+import extract_rszp
+from benchmarks.mock_node import MockNode
+from benchmarks.synthetic_chain import SyntheticChain
+from block_parser import parse_transaction
+from prevouts import RPCPrevoutProvider
+from rpc_client import RPCClient
+from script_parser import ByteReader
+
+
+@pytest.mark.parametrize("output_format", ["jsonl", "csv"])
+def test_batch_output_matches_single_transactions_in_input_order(tmp_path, monkeypatch, output_format):
+    chain = SyntheticChain(6, 4, seed=9)
+    # Coinbases have no signatures to list
+    txids = [txid for txid, raw_tx in chain.raw_transactions.items()
+             if any(parse_transaction(ByteReader(raw_tx))["vin"][0]["prev_txid"])][-12:]
+    entries = txids[:5] + [chain.raw_transactions[txids[5]].hex(), "00" * 70] + txids[6:]
+    batch_file = tmp_path / "batch.txt"
+    batch_file.write_text("# txids and raw transactions\n\n" + "\n".join(entries) + "\n")
+    output = tmp_path / f"out.{output_format}"
+
+    with MockNode(chain) as node:
+        monkeypatch.setattr(sys, "argv", ["extract_rszp.py", "-f", str(batch_file), "-o", str(output),
+                                          "--format", output_format, "--workers", "2", "--rpc-url", node.url])
+        extract_rszp.main()
+
+        provider = RPCPrevoutProvider(RPCClient(node.url, "", ""))
+        expected = []
+        for entry in entries:
+            if entry == "00" * 70:
+                expected.append(None)
+                continue
+            raw_tx_hex = chain.raw_transactions[entry].hex() if len(entry) == 64 else entry
+            expected.extend(record.to_dict()
+                            for record in extract_rszp.analyze_transaction_signatures(raw_tx_hex, provider))
+
+    with open(output, newline='') as f:
+        records = list(csv.DictReader(f)) if output_format == "csv" else [json.loads(line) for line in f]
+    assert len(records) == len(expected) > len(entries)
+    for record, want in zip(records, expected):
+        if want is None:
+            # A line that does not parse is reported in place and does not stop the run
+            assert record["error"] and not record["txid"]
+            continue
+        assert not record.get("error")
+        for field in ("txid", "input_index", "r", "s", "z", "pubkey"):
+            assert str(record[field]) == ("" if want[field] is None and output_format == "csv" else str(want[field]))
@@ -0,0 +1,78 @@
+import contextlib
+import io
+import time
+import types
+
+import pytest
+
+import extract_data
+from benchmarks.mock_node import MockNode
+from benchmarks.synthetic_chain import SyntheticChain
+
+POLL_INTERVAL = 5
+
+
+class StopFollowing(BaseException):
+    """Ends the follower from its idle sleep; not an Exception, so follow() does not retry it."""
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Records follow()'s sleeps instead of sleeping, and stops it once it idles at the tip."""
+    recorded = []
+
+    def sleep(seconds):
+        recorded.append(seconds)
+        if seconds == POLL_INTERVAL and recorded.count(POLL_INTERVAL) > 1:
+            raise StopFollowing()
+
+    fake_time = types.SimpleNamespace(**{name: getattr(time, name) for name in dir(time) if not name.startswith('_')})
+    fake_time.sleep = sleep
+    monkeypatch.setattr(extract_data, "time", fake_time)
+    return recorded
+
+
+def run_follow(node, output_file, monkeypatch):
+    monkeypatch.setattr(extract_data.rpc_client, "url", node.url)
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        try:
+            extract_data.follow(0, str(output_file), POLL_INTERVAL)
+        except StopFollowing:
+            pass
+    return log.getvalue()
+
+
+def test_follow_logs_scan_errors_and_keeps_going(tmp_path, monkeypatch, sleeps):
+    chain = SyntheticChain(8, 10, seed=3)
+    format_scanned_block = extract_data.format_scanned_block
+    failures = []
+
+    def failing_twice(*args, **kwargs):
+        if len(failures) < 2:
+            failures.append(args)
+            raise OSError("No space left on device")
+        return format_scanned_block(*args, **kwargs)
+
+    monkeypatch.setattr(extract_data, "format_scanned_block", failing_twice)
+    followed = tmp_path / "followed.txt"
+    with MockNode(chain) as node:
+        log = run_follow(node, followed, monkeypatch)
+        monkeypatch.setattr(extract_data, "format_scanned_block", format_scanned_block)
+        single = tmp_path / "single.txt"
+        with contextlib.redirect_stdout(io.StringIO()):
+            extract_data.main(0, len(chain) - 1, str(single))
+
+    assert log.count("Error while following the chain: No space left on device") == 2
+    # Consecutive errors back off: the poll interval, then twice that
+    assert sleeps[:2] == [POLL_INTERVAL, 2 * POLL_INTERVAL]
+    assert followed.read_bytes() == single.read_bytes()
+
+
+def test_follow_exits_on_a_reorganization_deeper_than_the_journal(tmp_path, monkeypatch, sleeps):
+    followed = tmp_path / "followed.txt"
+    with MockNode(SyntheticChain(6, 5, seed=1)) as node:
+        run_follow(node, followed, monkeypatch)
+    sleeps.clear()
+    # The node now serves a different chain: none of the journaled hashes match
+    with MockNode(SyntheticChain(6, 5, seed=2)) as node, pytest.raises(SystemExit):
+        run_follow(node, followed, monkeypatch)
@@ -0,0 +1,77 @@
+import json
+import multiprocessing
+
+import pytest
+
+from metrics import BUCKETS, STAGES, Metrics, bucket_bound, format_prometheus, shared_state, write_metrics
+
+
+def test_durations_land_in_power_of_two_buckets():
+    metrics = Metrics()
+    # 0.5 us -> bucket 0, 1 us -> 1, 3 us -> 2, 1000 us -> 10, an hour -> the open last bucket
+    for seconds in (0.5e-6, 1e-6, 3e-6, 1e-3, 3600.0):
+        metrics.record("rpc", seconds)
+    summary = metrics.stage("rpc")
+    assert [bucket for bucket, count in enumerate(summary['buckets']) if count] == [0, 1, 2, 10, BUCKETS - 1]
+    assert summary['count'] == 5 and summary['max'] == 3600.0
+    assert summary['total'] == pytest.approx(3600.0010045)
+    for seconds in (0.5e-6, 1e-6, 3e-6, 1e-3):
+        bucket = int(seconds * 1e6).bit_length()
+        assert seconds < bucket_bound(bucket)
+    assert metrics.stage("parse")['count'] == 0 and metrics.stage("parse")['p99'] == 0.0
+
+
+def test_quantiles_are_bucket_bounds_capped_at_the_maximum():
+    metrics = Metrics()
+    for _ in range(90):
+        metrics.record("parse", 100e-6)
+    for _ in range(10):
+        metrics.record("parse", 5e-3)
+    summary = metrics.stage("parse")
+    assert summary['p50'] == summary['p90'] == bucket_bound(7)
+    # The 5 ms bucket ends at 8.192 ms, past the largest recorded duration
+    assert summary['p99'] == summary['max'] == 5e-3
+    assert summary['mean'] == pytest.approx((90 * 100e-6 + 10 * 5e-3) / 100)
+
+
+def test_prometheus_histogram_is_cumulative(tmp_path):
+    metrics = Metrics()
+    for seconds in (2e-6, 2e-6, 40e-6, 0.2):
+        metrics.record("write", seconds)
+    metrics.count("blocks", 3)
+    metrics.count("signatures", 11)
+    text = format_prometheus(metrics.snapshot())
+    assert "rsz_extract_blocks_total 3\n" in text and "rsz_extract_signatures_total 11\n" in text
+    buckets = [line for line in text.splitlines() if line.startswith('rsz_extract_stage_seconds_bucket{stage="write"')]
+    counts = [int(line.rsplit(' ', 1)[1]) for line in buckets]
+    assert len(buckets) == BUCKETS and buckets[-1].endswith('le="+Inf"} 4')
+    assert counts == sorted(counts) and counts[2] == 2 and counts[6] == 3 and counts[-2] == 4
+    assert 'rsz_extract_stage_seconds_count{stage="write"} 4' in text
+
+    path = str(tmp_path / "metrics.json")
+    write_metrics(path, metrics.snapshot())
+    with open(path) as f:
+        assert json.load(f)['stages']['write']['buckets'] == metrics.stage("write")['buckets']
+
+
+def record_in_worker(state, stage):
+    metrics = Metrics(state)
+    for _ in range(50):
+        metrics.record(stage, 10e-6)
+        metrics.count("signatures")
+    metrics.count("blocks")
+
+
+def test_shared_state_sums_worker_processes():
+    state = shared_state()
+    workers = [multiprocessing.Process(target=record_in_worker, args=(state, stage))
+               for stage in ("rpc", "rpc", "sighash")]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    metrics = Metrics(state)
+    assert metrics.counters() == {'blocks': 3, 'signatures': 150}
+    assert metrics.stage("rpc")['count'] == 100 and metrics.stage("rpc")['buckets'][4] == 100
+    assert metrics.stage("sighash")['count'] == 50
+    assert sum(metrics.stage(stage)['count'] for stage in STAGES) == 150
@@ -0,0 +1,58 @@
+import contextlib
+import io
+
+import extract_data
+from benchmarks.mock_node import MockNode
+from benchmarks.synthetic_chain import SyntheticChain
+from prevouts import DictPrevoutProvider, PrevoutCache
+
+
+def outpoint(number):
+    return f"{number:064x}", number % 3
+
+
+def test_lru_spills_to_sqlite_and_falls_back(tmp_path):
+    fallback = DictPrevoutProvider({outpoint(100): (100, b'\x51')})
+    cache = PrevoutCache(fallback, max_entries=4, spill_path=str(tmp_path / "spill.sqlite"), spill_batch=2)
+    for number in range(6):
+        cache.add(*outpoint(number), number, bytes([number]))
+    # The fifth entry evicted the two oldest to disk
+    assert list(cache.memory) == [outpoint(number) for number in (2, 3, 4, 5)]
+
+    assert cache.get_prevouts([outpoint(3)]) == {outpoint(3): (3, b'\x03')}
+    cache.add(*outpoint(6), 6, b'\x06')
+    # 3 was used, so 2 and 4 are now the least recently used
+    assert list(cache.memory) == [outpoint(number) for number in (5, 3, 6)]
+
+    wanted = [outpoint(number) for number in (0, 4, 3, 100, 200)]
+    assert cache.get_prevouts(wanted) == {outpoint(0): (0, b'\x00'), outpoint(4): (4, b'\x04'),
+                                          outpoint(3): (3, b'\x03'), outpoint(100): (100, b'\x51')}
+    assert (cache.hits, cache.spill_hits, cache.fallback_lookups) == (2, 2, 2)
+
+    # Spent outputs are forgotten in memory and on disk
+    cache.discard([outpoint(0), outpoint(5)])
+    assert cache.get_prevouts([outpoint(0), outpoint(5), outpoint(2)]) == {outpoint(2): (2, b'\x02')}
+    cache.close()
+
+
+def test_evicted_entries_without_a_spill_file_come_from_the_fallback():
+    fallback = DictPrevoutProvider({outpoint(0): (0, b'\x00')})
+    cache = PrevoutCache(fallback, max_entries=2, spill_batch=1)
+    for number in range(3):
+        cache.add(*outpoint(number), number, bytes([number]))
+    assert cache.get_prevouts([outpoint(0), outpoint(1)]) == {outpoint(0): (0, b'\x00'), outpoint(1): (1, b'\x01')}
+    assert cache.fallback_lookups == 1
+
+
+def test_scan_with_z_is_the_same_with_a_tiny_spilling_cache(tmp_path, monkeypatch):
+    chain = SyntheticChain(10, 15, seed=13)
+    outputs = {}
+    with MockNode(chain) as node, contextlib.redirect_stdout(io.StringIO()):
+        monkeypatch.setattr(extract_data.rpc_client, "url", node.url)
+        for name, size in (("large", 1000000), ("tiny", 8)):
+            path = tmp_path / f"{name}.txt"
+            extract_data.main(0, len(chain) - 1, str(path), with_z=True, prevout_cache_size=size,
+                              prevout_cache_dir=str(tmp_path))
+            outputs[name] = path.read_text()
+    assert outputs["large"].count(", Z: ") > 100
+    assert outputs["tiny"] == outputs["large"]
@@ -0,0 +1,113 @@
+import os
+import random
+
+import pytest
+
+from r_index import RIndex, RECORD, SLOT, TABLE_HEADER
+
+
+def entries(count, seed=0, reuse=()):
+    rng = random.Random(seed)
+    batch = [(rng.randbytes(32), rng.randbytes(32), index, 100) for index in range(count)]
+    batch += [(r, rng.randbytes(32), 0, 101) for r in reuse]
+    return batch
+
+
+def table_heads(directory):
+    with open(os.path.join(directory, "table.dat"), 'rb') as f:
+        data = f.read()
+    return [head for _, head in SLOT.iter_unpack(data[TABLE_HEADER.size:]) if head]
+
+
+def test_interrupted_commit_leaves_no_dangling_heads(tmp_path, monkeypatch):
+    directory = str(tmp_path / "index")
+    first = entries(50)
+    with RIndex(directory) as index:
+        index.add(first)
+
+    index = RIndex(directory)
+
+    def killed(data):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(index.records_file, "write", killed)
+    with pytest.raises(KeyboardInterrupt):
+        index.add(entries(20, seed=1, reuse=[first[0][0]]))
+    # Nothing of the interrupted batch reached the table
+    assert max(table_heads(directory)) <= 50
+    monkeypatch.undo()
+    index.records_file.close()
+    index._close_table()
+
+    with RIndex(directory) as index:
+        assert len(index) == 50
+        assert len(index.lookup(first[0][0])) == 1
+        assert all(r in index for r, _, _, _ in first)
+
+
+def test_table_pointing_past_records_is_rebuilt(tmp_path):
+    directory = str(tmp_path / "index")
+    batch = entries(300)
+    reused = batch[7][0]
+    with RIndex(directory) as index:
+        index.add(batch)
+        index.add(entries(5, seed=2, reuse=[reused]))
+    total = 306
+
+    # A table written by the old code after a crash: a head past the end of occurrences.dat
+    with open(os.path.join(directory, "table.dat"), 'r+b') as f:
+        data = bytearray(f.read())
+        for position in range((len(data) - TABLE_HEADER.size) // SLOT.size):
+            offset = TABLE_HEADER.size + position * SLOT.size
+            fingerprint, head = SLOT.unpack_from(data, offset)
+            if head:
+                SLOT.pack_into(data, offset, fingerprint, total + 10)
+                break
+        f.seek(0)
+        f.write(data)
+
+    with RIndex(directory) as index:
+        assert len(index) == total
+        assert index.distinct() == total - 1
+        assert [occurrence["height"] for occurrence in index.lookup(reused)] == [100, 101]
+        assert all(r in index for r, _, _, _ in batch)
+    assert os.path.getsize(os.path.join(directory, "occurrences.dat")) == total * RECORD.size
+
+
+def test_rollback_removes_blocks_indexed_after_a_retried_block(tmp_path):
+    rng = random.Random(3)
+    blocks = {height: [(rng.randbytes(32), rng.randbytes(32), 0, height) for _ in range(3)] for height in range(1, 11)}
+    reused = blocks[2][0][0]
+    blocks[9].append((reused, rng.randbytes(32), 0, 9))
+    blocks[5].append((reused, rng.randbytes(32), 0, 5))
+    directory = str(tmp_path / "index")
+    with RIndex(directory) as index:
+        # Block 5 failed and was retried after block 10
+        counts = {}
+        for height in [1, 2, 3, 4, 6, 7, 8, 9, 10, 5]:
+            index.add(blocks[height])
+            counts[height] = len(index)
+        assert index.rollback(8, since=counts[8]) == 7
+        assert len(index) == 3 * 8 + 1
+        assert all(r in index for height in range(1, 9) for r, _, _, _ in blocks[height])
+        assert not any(r in index for height in (9, 10) for r, _, _, _ in blocks[height] if r != reused)
+        assert [occurrence["height"] for occurrence in index.lookup(reused)] == [2, 5]
+        # Without a record count the whole index is read; nothing above 6 is left after this
+        assert index.rollback(6) == 6
+    with RIndex(directory) as index:
+        assert len(index) == 3 * 6 + 1
+        assert index.distinct() == 3 * 6
+        assert not any(r in index for height in (7, 8) for r, _, _, _ in blocks[height])
+
+
+def test_same_r_twice_in_one_input_is_reuse_but_a_rescan_is_not(tmp_path):
+    rng = random.Random(4)
+    r, txid = rng.randbytes(32), rng.randbytes(32)
+    # A 2-of-2 multisig input signed twice with the same nonce
+    block = [(r, txid, 0, 7), (r, txid, 0, 7), (rng.randbytes(32), txid, 1, 7)]
+    with RIndex(str(tmp_path / "index")) as index:
+        collisions = index.add(block)
+        assert [(found, len(occurrences)) for found, occurrences in collisions] == [(r.hex(), 2)]
+        assert index.add(block) == []
+        assert len(index) == 3
+        # A third signature with that R in the input is new
+        assert [len(occurrences) for _, occurrences in index.add(block[:1] * 3)] == [3]
@@ -0,0 +1,77 @@
+import os
+import random
+
+from benchmarks.mock_node import MockNode
+from benchmarks.synthetic_chain import SyntheticChain
+from raw_cache import KIND_RAW_BLOCK, KIND_RAW_TX, CachingRPCClient, RawDataCache
+
+VALUE_BYTES = 300 << 10
+
+
+def segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".seg"))
+
+
+def test_segment_index_survives_reopening_and_evicts_oldest_segments(tmp_path):
+    rng = random.Random(14)
+    directory = str(tmp_path / "cache")
+    # Incompressible values, about three to a 1 MiB segment
+    values = {rng.randbytes(32).hex(): rng.randbytes(VALUE_BYTES) for _ in range(12)}
+    keys = list(values)
+    cache = RawDataCache(directory, max_bytes=8 << 20, segment_bytes=1 << 20)
+    cache.put_many(KIND_RAW_BLOCK, values.items())
+    # The same key under another kind is a separate entry
+    cache.put(KIND_RAW_TX, keys[0], b"transaction")
+    cache.close()
+    assert len(segments(directory)) >= 3
+
+    cache = RawDataCache(directory, max_bytes=8 << 20, segment_bytes=1 << 20)
+    assert cache.get_many(KIND_RAW_BLOCK, keys) == values
+    assert cache.get(KIND_RAW_TX, keys[0]) == b"transaction"
+    assert cache.get(KIND_RAW_TX, keys[1]) is None
+    assert (cache.hits, cache.misses) == (13, 1)
+
+    # Past the cap, whole segments go, oldest first, together with their index entries
+    first_segment = segments(directory)[0]
+    more = {rng.randbytes(32).hex(): rng.randbytes(VALUE_BYTES) for _ in range(20)}
+    cache.put_many(KIND_RAW_BLOCK, more.items())
+    assert first_segment not in segments(directory)
+    assert sum(os.path.getsize(os.path.join(directory, name)) for name in segments(directory)) <= 8 << 20
+    found = cache.get_many(KIND_RAW_BLOCK, keys + list(more))
+    assert keys[0] not in found and list(more)[-1] in found
+    assert all(found[key] == (values.get(key) or more[key]) for key in found)
+    (count,), = cache.db.execute("SELECT COUNT(*) FROM entries WHERE kind = ?", (KIND_RAW_BLOCK,)).fetchall()
+    assert count == len(found)
+    cache.close()
+
+
+def test_truncated_segment_reads_as_a_miss(tmp_path):
+    directory = str(tmp_path / "cache")
+    cache = RawDataCache(directory)
+    cache.put_many(KIND_RAW_TX, [("aa" * 32, b"first" * 100), ("bb" * 32, b"second" * 100)])
+    cache.close()
+    segment, = segments(directory)
+    path = os.path.join(directory, segment)
+    os.truncate(path, os.path.getsize(path) - 10)
+
+    cache = RawDataCache(directory)
+    assert cache.get_many(KIND_RAW_TX, ["aa" * 32, "bb" * 32]) == {"aa" * 32: b"first" * 100}
+    cache.close()
+
+
+def test_caching_client_only_asks_the_node_once(tmp_path):
+    chain = SyntheticChain(10, 3, seed=15)
+    with MockNode(chain) as node:
+        for run in range(2):
+            client = CachingRPCClient(node.url, "user", "password", RawDataCache(str(tmp_path / "cache")),
+                                      min_confirmations=3)
+            hashes = client.batch([("getblockhash", [height]) for height in range(len(chain))])
+            assert hashes == chain.hashes
+            assert [client.call("getblock", [block_hash, 0]) for block_hash in hashes] == \
+                [chain.raw_blocks[block_hash].hex() for block_hash in hashes]
+            client.close()
+            if run == 0:
+                assert node.calls["getblock"] == len(chain)
+        assert node.calls["getblock"] == len(chain)
+        # Heights within min_confirmations of the tip can still be reorganized and are asked again
+        assert node.calls["getblockhash"] == len(chain) + 2
@@ -0,0 +1,104 @@
+import contextlib
+import io
+import threading
+import time
+
+import pytest
+
+import extract_data
+from benchmarks.mock_node import MockNode
+from benchmarks.synthetic_chain import SyntheticChain
+from rpc_client import CircuitBreaker, RPCClient, RPCAuthError
+
+
+@pytest.fixture(scope="module")
+def node():
+    with MockNode(SyntheticChain(4, 5, seed=6), auth=("scanner", "secret")) as node:
+        yield node
+
+
+def test_refused_credentials_raise_at_once(node):
+    # A retry delay this long would stall the test if the refusal were retried
+    client = RPCClient(node.url, "scanner", "wrong", retries=3, retry_delay=60)
+    with contextlib.redirect_stdout(io.StringIO()), pytest.raises(RPCAuthError, match="HTTP 401"):
+        client.call("getblockcount")
+    assert client.counters() == {"requests": 1, "failures": 0, "retries": 0, "breaker_trips": 0}
+    assert client.breaker.failures == 0
+
+    with pytest.raises(RPCAuthError):
+        list(client.imap("getblockhash", [[0], [1]], return_exceptions=True))
+    assert RPCClient(node.url, "scanner", "secret").call("getblockcount") == 3
+
+
+def test_batch_matches_responses_by_id(node, monkeypatch):
+    client = RPCClient(node.url, "scanner", "secret")
+    # A node may answer a batch in any order; entries with an error, or missing, come back as None
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        assert client.batch([("getblockhash", [2]), ("getblockhash", [9]), ("getblockcount", []),
+                             ("getblockhash", [0])]) == [node.chain.hashes[2], None, 3, node.chain.hashes[0]]
+    assert "Block height out of range" in log.getvalue()
+
+    post = client._post
+
+    def reordered(payload, timeout=None):
+        response = post(payload, timeout)
+        dropped = payload[1]['id'] if len(payload) > 1 else None
+        return [item for item in reversed(response) if item['id'] != dropped]
+    monkeypatch.setattr(client, "_post", reordered)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert client.batch_chunked("getblockhash", [[height] for height in range(4)], batch_size=3) == \
+            [node.chain.hashes[0], None, node.chain.hashes[2], node.chain.hashes[3]]
+
+    # A batch the node rejects as a whole fails every entry
+    monkeypatch.setattr(client, "_post", lambda payload, timeout=None: {"error": {"code": -32700}, "id": None})
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        assert client.batch([("getblockcount", []), ("getblockhash", [1])]) == [None, None]
+    assert "-32700" in log.getvalue()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_scan_stops_on_refused_credentials(node, tmp_path, monkeypatch, workers):
+    monkeypatch.setattr(extract_data.rpc_client, "url", node.url)
+    monkeypatch.setattr(extract_data.rpc_client, "retry_delay", 60)
+    with contextlib.redirect_stdout(io.StringIO()) as log, pytest.raises(SystemExit) as exit_info:
+        extract_data.main(0, 3, str(tmp_path / "out.txt"), workers=workers, raw_blocks=True)
+    assert exit_info.value.code == 1
+    assert "refused the request with HTTP 401" in log.getvalue()
+
+
+def test_circuit_breaker_trips_and_probes_half_open():
+    state = [0.0]
+    breaker = CircuitBreaker(state, threading.Lock(), threshold=3, cooldown=0.2)
+    assert [breaker.record_failure() for _ in range(3)] == [False, False, True]
+    assert state[0] > time.time()
+    # While it is open, a failure of another request does not extend the pause
+    until = state[0]
+    assert not breaker.record_failure() and state[0] == until
+
+    breaker.wait()
+    assert time.time() >= until
+    # Half-open: the probe failing trips it again at once
+    assert breaker.record_failure()
+    breaker.wait()
+    # A success closes it; it takes threshold failures to trip again
+    breaker.record_success()
+    assert [breaker.record_failure() for _ in range(3)] == [False, False, True]
+
+
+def test_circuit_breaker_counts_concurrent_failures_once_each():
+    state = [0.0]
+    breaker = CircuitBreaker(state, threading.Lock(), threshold=4000, cooldown=60)
+    start = threading.Barrier(8)
+    trips = []
+
+    def fail():
+        start.wait()
+        trips.extend(tripped for tripped in (breaker.record_failure() for _ in range(500)) if tripped)
+
+    threads = [threading.Thread(target=fail) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # The 4000th failure trips it; none of the counts is lost to a race between the pool's threads
+    assert trips == [True] and breaker.failures == 3999
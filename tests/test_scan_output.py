@@ -0,0 +1,129 @@
+import contextlib
+import gzip
+import io
+import json
+import os
+
+import pytest
+
+import extract_data
+from benchmarks.mock_node import MockNode
+from benchmarks.synthetic_chain import SyntheticChain
+from scan_output import GroupCommitWriter
+
+SHARDS = ("000000000-000000009", "000000010-000000019", "000000020-000000029")
+
+
+def test_retried_block_goes_to_the_shard_of_its_height(tmp_path, monkeypatch):
+    chain = SyntheticChain(30, 4, seed=5)
+    scan_fetched_block = extract_data.scan_fetched_block
+    failures = []
+
+    def failing_once(height, *args, **kwargs):
+        if height == 5 and not failures:
+            failures.append(height)
+            return height, None, None, None
+        return scan_fetched_block(height, *args, **kwargs)
+
+    monkeypatch.setattr(extract_data, "RETRY_ROUND_DELAY", 0)
+    with MockNode(chain) as node, contextlib.redirect_stdout(io.StringIO()):
+        monkeypatch.setattr(extract_data.rpc_client, "url", node.url)
+        extract_data.main(0, len(chain) - 1, str(tmp_path / "single.txt"), shard_blocks=10)
+        monkeypatch.setattr(extract_data, "scan_fetched_block", failing_once)
+        extract_data.main(0, len(chain) - 1, str(tmp_path / "retried.txt"), shard_blocks=10)
+        extract_data.main(5, 5, str(tmp_path / "block5.txt"))
+    assert failures == [5]
+
+    block = (tmp_path / "block5.txt").read_text()
+    single = [(tmp_path / f"single.{shard}.txt").read_text() for shard in SHARDS]
+    retried = [(tmp_path / f"retried.{shard}.txt").read_text() for shard in SHARDS]
+    # Block 5 is appended to its own shard, after the rest of it
+    assert block and block in single[0]
+    assert retried == [single[0].replace(block, '') + block, single[1], single[2]]
+    checkpoint = json.loads((tmp_path / "retried.txt.checkpoint").read_text())
+    assert checkpoint == {'height': 29, 'offset': len(single[2].encode())}
+
+
+def test_uncommitted_retry_is_cut_out_of_its_shard_on_resume(tmp_path):
+    output = str(tmp_path / "out.txt")
+    writer = GroupCommitWriter(output, flush_blocks=3, shard_blocks=10)
+    assert writer.resume(0, 29) == 0
+    for height in range(15):
+        if height == 5:
+            writer.add_failed(height)
+        else:
+            writer.add_block(height, [f"block {height}\n"])
+    writer.commit()
+    first_shard = writer.shard_path(0)
+    committed = open(first_shard).read()
+    assert json.loads(open(output + ".checkpoint").read())['shards'] == [[0, len(committed)]]
+
+    # The retry reaches the first shard, then the process dies before the group is committed
+    writer.add_block(5, ["block 5\n"])
+    assert open(first_shard).read() == committed + "block 5\n"
+    writer.file.close()
+
+    writer = GroupCommitWriter(output, flush_blocks=3, shard_blocks=10)
+    assert writer.resume(0, 29) == 15
+    assert writer.failed == {5} and open(first_shard).read() == committed
+    writer.add_block(5, ["block 5\n"])
+    writer.close()
+    assert open(first_shard).read() == committed + "block 5\n"
+    assert 'shards' not in json.loads(open(output + ".checkpoint").read())
+
+
+def read_output(writer, heights):
+    """The text of every file the writer produced for heights, in height order."""
+    data = b''
+    for path in dict.fromkeys(writer.shard_path(height) for height in heights):
+        with open(path, 'rb') as f:
+            data += gzip.decompress(f.read()) if writer.compression else f.read()
+    return data.decode()
+
+
+@pytest.mark.parametrize("compression, shard_blocks", [(None, None), ("gzip", None), (None, 10), ("gzip", 10)])
+def test_resume_after_a_crash_cuts_back_to_the_commit_marker(tmp_path, compression, shard_blocks):
+    heights = range(30)
+
+    def open_writer(name):
+        writer = GroupCommitWriter(str(tmp_path / name), flush_blocks=3, compression=compression,
+                                   shard_blocks=shard_blocks)
+        return writer, writer.resume(0, 29)
+
+    clean, first = open_writer("clean.txt")
+    for height in heights:
+        clean.add_block(height, [f"block {height}\n"] * (height % 4))
+    clean.close()
+    expected = read_output(clean, heights)
+    assert first == 0 and expected.count("block") == sum(height % 4 for height in heights)
+
+    crashed, first = open_writer("crashed.txt")
+    for height in range(first, 17):
+        crashed.add_block(height, [f"block {height}\n"] * (height % 4))
+    # The process dies in the middle of writing the pending group; rotating at block 10 commits early
+    crashed.file.write(b"block 15\nblock 1")
+    crashed.file.close()
+    checkpoint = json.loads(open(crashed.checkpoint_file).read())
+    assert checkpoint['height'] == (15 if shard_blocks else 14)
+
+    resumed, first = open_writer("crashed.txt")
+    assert first == checkpoint['height'] + 1
+    assert resumed.file.tell() == checkpoint['offset'] == os.path.getsize(resumed.shard_path(first))
+    for height in range(first, 30):
+        resumed.add_block(height, [f"block {height}\n"] * (height % 4))
+    resumed.close()
+    assert read_output(resumed, heights) == expected
+
+
+@pytest.mark.parametrize("raw_blocks", [False, True])
+@pytest.mark.parametrize("with_z", [False, True])
+def test_worker_processes_write_blocks_in_order(tmp_path, monkeypatch, raw_blocks, with_z):
+    chain = SyntheticChain(40, 4, seed=8)
+    with MockNode(chain) as node, contextlib.redirect_stdout(io.StringIO()):
+        monkeypatch.setattr(extract_data.rpc_client, "url", node.url)
+        for workers in (1, 3):
+            extract_data.main(0, len(chain) - 1, str(tmp_path / f"workers{workers}.txt"), batch_size=7,
+                              workers=workers, raw_blocks=raw_blocks, with_z=with_z)
+    single = (tmp_path / "workers1.txt").read_text()
+    assert single.count("Transaction ID") > len(chain)
+    assert (tmp_path / "workers3.txt").read_text() == single
@@ -0,0 +1,45 @@
+import contextlib
+import io
+import random
+import sys
+
+import sigfile
+from sigfile import FLAG_TRUNCATED, FLAG_TX_START, UNKNOWN_HEIGHT, SigFileReader
+
+
+def test_text_round_trips_through_a_signature_file(tmp_path, monkeypatch):
+    rng = random.Random(9)
+    # Strict DER, a zero-padded high bit, lax pre-BIP66 encodings with extra zero bytes, short values and one R
+    # with more than 32 significant bytes, which only keeps its low 32 bytes
+    r_values = [rng.randbytes(32).hex(), "00" + "f1" * 32, "0000" + rng.randbytes(32).hex(), rng.randbytes(20).hex(),
+                "0102" + rng.randbytes(32).hex()]
+    lines = []
+    for number, r in enumerate(r_values):
+        lines.append(f"Transaction ID: {rng.randbytes(32).hex()}\n")
+        for input_index in range(2):
+            z = f", Z: {rng.randbytes(32).hex()}" if input_index else ""
+            lines.append(f"  Signature - R: {r}, S: {rng.randbytes(32 - number).hex()}{z}\n")
+    text = tmp_path / "signatures.txt"
+    text.write_text(''.join(lines))
+
+    sig_path = tmp_path / "signatures.sig"
+    with contextlib.redirect_stdout(io.StringIO()):
+        for argv in (["from-text", str(text), str(sig_path)], ["to-text", str(sig_path), str(tmp_path / "back.txt")]):
+            monkeypatch.setattr(sys, "argv", ["sigfile.py"] + argv)
+            sigfile.main()
+
+    with SigFileReader(str(sig_path)) as reader:
+        chunk, = reader.chunks()
+        assert (chunk.first_height, chunk.last_height) == (UNKNOWN_HEIGHT, UNKNOWN_HEIGHT)
+        assert set(chunk.column("height")) == {UNKNOWN_HEIGHT}
+        flags = list(chunk.column("flags"))
+        records = list(chunk.records())
+    assert [bool(flag & FLAG_TX_START) for flag in flags] == [True, False] * len(r_values)
+    assert [bool(flag & FLAG_TRUNCATED) for flag in flags] == [False] * 8 + [True] * 2
+    assert all(record[0] is None and record[2] is None for record in records)
+
+    back = (tmp_path / "back.txt").read_text().splitlines(keepends=True)
+    assert back[:-3] == lines[:-3]
+    # The truncated R keeps its encoded length: the bytes beyond 32 come back as zeros
+    truncated = "0000" + r_values[-1][4:]
+    assert back[-3:] == [lines[-3]] + [line.replace(r_values[-1], truncated) for line in lines[-2:]]
@@ -0,0 +1,167 @@
+import pytest
+
+from block_parser import parse_transaction
+from script_parser import ByteReader
+from sighash import SegwitSighashEngine, compute_z_values, encode_varint, legacy_z_values, transaction_signing_infos
+
+P = 2 ** 256 - 2 ** 32 - 977
+N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+G = (0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+     0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+
+# Bitcoin Core signs uint256::ONE for SIGHASH_SINGLE without a matching output; its bytes are 01 00 .. 00
+SINGLE_BUG_Z = bytes.fromhex("0100000000000000000000000000000000000000000000000000000000000000")
+
+
+def point_add(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a[0] == b[0] and (a[1] + b[1]) % P == 0:
+        return None
+    if a == b:
+        slope = 3 * a[0] * a[0] * pow(2 * a[1], -1, P) % P
+    else:
+        slope = (b[1] - a[1]) * pow(b[0] - a[0], -1, P) % P
+    x = (slope * slope - a[0] - b[0]) % P
+    return x, (slope * (a[0] - x) - a[1]) % P
+
+
+def point_multiply(k, point=G):
+    result = None
+    while k:
+        if k & 1:
+            result = point_add(result, point)
+        point = point_add(point, point)
+        k >>= 1
+    return result
+
+
+def der_integer(value: int) -> bytes:
+    data = value.to_bytes(32, 'big').lstrip(b'\x00')
+    if data[0] & 0x80:
+        data = b'\x00' + data
+    return b'\x02' + bytes((len(data),)) + data
+
+
+def signature_push(private_key: int, nonce: int, digest: bytes, sighash_type: int) -> bytes:
+    r = point_multiply(nonce)[0] % N
+    s = pow(nonce, -1, N) * (int.from_bytes(digest, 'big') + r * private_key) % N
+    body = der_integer(r) + der_integer(s)
+    signature = b'\x30' + bytes((len(body),)) + body + bytes((sighash_type,))
+    return bytes((len(signature),)) + signature
+
+
+def verifies(public_point, r: int, s: int, digest: bytes) -> bool:
+    w = pow(s, -1, N)
+    point = point_add(point_multiply(int.from_bytes(digest, 'big') * w % N),
+                      point_multiply(r * w % N, public_point))
+    return point is not None and point[0] % N == r
+
+
+def test_sighash_single_without_matching_output_signs_one():
+    private_key = 0x1f2e3d4c5b6a79880123456789abcdef
+    public_point = point_multiply(private_key)
+    pubkey = bytes((2 + (public_point[1] & 1),)) + public_point[0].to_bytes(32, 'big')
+    pubkey_push = bytes((len(pubkey),)) + pubkey
+
+    # Input 0 is signed with SIGHASH_ALL; input 1 with SIGHASH_SINGLE, but there is only one output
+    script_sigs = [signature_push(private_key, 0x1234, bytes(32), 0x01) + pubkey_push,
+                   signature_push(private_key, 0x5678, SINGLE_BUG_Z, 0x03) + pubkey_push]
+    raw = bytearray((1).to_bytes(4, 'little') + encode_varint(len(script_sigs)))
+    for index, script_sig in enumerate(script_sigs):
+        raw += bytes([index + 1]) * 32 + index.to_bytes(4, 'little')
+        raw += encode_varint(len(script_sig)) + script_sig + b'\xff\xff\xff\xff'
+    script_pubkey = b'\x76\xa9\x14' + bytes(20) + b'\x88\xac'
+    raw += b'\x01' + (50000).to_bytes(8, 'little') + encode_varint(len(script_pubkey)) + script_pubkey
+    raw += bytes(4)
+
+    tx = parse_transaction(ByteReader(bytes(raw)))
+    results = legacy_z_values(tx)
+    (r, s, z), = results[1]
+    assert z == SINGLE_BUG_Z
+    assert verifies(public_point, int.from_bytes(r, 'big'), int.from_bytes(s, 'big'), z)
+    # The regular input still hashes its preimage, and that z is not the constant
+    assert results[0][0][2] != SINGLE_BUG_Z
+
+
+# BIP143 test vectors: signed native P2WPKH and P2SH-P2WPKH spends, with the amount and sighash of the witness input
+BIP143_SIGNED = {
+    "P2WPKH": (
+        "01000000000102fff7f7881a8099afa6940d42d1e7f6362bec38171ea3edf433541db4e4ad969f00000000494830450221008b9d1d"
+        "c26ba6a9cb62127b02742fa9d754cd3bebf337f7a55d114c8e5cdd30be022040529b194ba3f9281a99f2b1c0a19c0489bc22ede944cc"
+        "f4ecbab4cc618ef3ed01eeffffffef51e1b804cc89d182d279655c3aa89e815b1b309fe287d9b2b55d57b90ec68a0100000000ffffff"
+        "ff02202cb206000000001976a9148280b37df378db99f66f85c95a783a76ac7a6d5988ac9093510d000000001976a9143bde42dbee7e"
+        "4dbe6a21b2d50ce2f0167faa815988ac000247304402203609e17b84f6a7d30c80bfa610b5b4542f32a8a0d5447a12fb1366d7f01cc4"
+        "4a0220573a954c4518331561406f90300e8f3358f51928d43c212a8caed02de67eebee0121025476c2e83188368da1ff3e292e7acafc"
+        "db3566bb0ad253f62fc70f07aeee635711000000",
+        1, 600000000, "c37af31116d1b27caf68aae9e3ac82f1477929014d5b917657d0eb49478cb670"),
+    "P2SH-P2WPKH": (
+        "01000000000101db6b1b20aa0fd7b23880be2ecbd4a98130974cf4748fb66092ac4d3ceb1a5477010000001716001479091972186c44"
+        "9eb1ded22b78e40d009bdf0089feffffff02b8b4eb0b000000001976a914a457b684d7f0d539a46a45bbc043f35b59d0d96388ac0008"
+        "af2f000000001976a914fd270b1ee6abcaea97fea7ad0402e8bd8ad6d77c88ac02473044022047ac8e878352d3ebbde1c94ce3a10d05"
+        "7c24175747116f8288e5d794d12d482f0220217f36a485cae903c713331d877c1f64677e3622ad4010726870540656fe9dcb012103ad"
+        "1d8e89212f0b92c74d23bb710c00662ad1470198ac48c43f7d6f93a2a2687392040000",
+        0, 1000000000, "64f3b0f4dd2bb3aa1ce8566d220cc74dda9df97d8490cc81d89d735c92e59fb6"),
+}
+
+# BIP143's P2SH-P2WSH 6-of-6 multisig vector: the unsigned transaction, its witness script, which is the scriptCode
+# exactly as for a native P2WSH spend, the amount, and the sighash for each sighash type
+BIP143_P2WSH_TX = (
+    "010000000136641869ca081e70f394c6948e8af409e18b619df2ed74aa106c1ca29787b96e0100000000ffffffff0200e9a43500000000"
+    "1976a914389ffce9cd9ae88dcc0631e88a821ffdbe9bfe2688acc0832f05000000001976a9147480a33f950689af511e6e84c138dbbd3c"
+    "3ee41588ac00000000")
+BIP143_P2WSH_SCRIPT = (
+    "56210307b8ae49ac90a048e9b53357a2354b3334e9c8bee813ecb98e99a7e07e8c3ba32103b28f0c28bfab54554ae8c658ac5c3e0ce6e7"
+    "9ad336331f78c428dd43eea8449b21034b8113d703413d57761b8b9781957b8c0ac1dfe69f492580ca4195f50376ba4a21033400f6af"
+    "ecb833092a9a21cfdf1ed1376e58c5d1f47de74683123987e967a8f42103a6d48b1131e94ba04d9737d61acdaa1322008af9602b3b14"
+    "862c07a1789aac162102d8b661b0b3302ee2f162b09e07a55ad5dfbe673a9f01d9f0c19617681024306b56ae")
+BIP143_P2WSH_AMOUNT = 987654321
+BIP143_P2WSH_SIGHASHES = {
+    0x01: "185c0be5263dce5b4bb50a047973c1b6272bfbd0103a89444597dc40b248ee7c",
+    0x02: "e9733bc60ea13c95c6527066bb975a2ff29a925e80aa14c213f686cbae5d2f36",
+    0x03: "1e1f1c303dc025bd664acb72e583e933fae4cff9148bf78c157d1e8f78530aea",
+    0x81: "2a67f03e63a6a422125878b40b82da593be8d4efaafe88ee528af6e5a9955c6e",
+    0x82: "781ba15f3779d5542ce8ecb5c18716733a5ee42a6f51488ec96154934e2c890a",
+    0x83: "511e8e52ed574121fc1b654970395502128263f62662e076dc6baf05c2e6a99b",
+}
+
+
+def decompress(pubkey: bytes):
+    x = int.from_bytes(pubkey[1:], 'big')
+    y = pow((x ** 3 + 7) % P, (P + 1) // 4, P)
+    return x, y if y & 1 == pubkey[0] & 1 else P - y
+
+
+def witness_z_values(tx: dict, index: int, amount: int):
+    # The prevout provider would supply (amount, scriptPubKey); witness inputs only need the amount
+    tx_input = tx["vin"][index]
+    prevouts = {(tx_input["prev_txid"][::-1].hex(), tx_input["prev_index"]): (amount, b'')}
+    return compute_z_values(tx, transaction_signing_infos(tx), prevouts)[index]
+
+
+@pytest.mark.parametrize("name", sorted(BIP143_SIGNED))
+def test_bip143_witness_pubkey_hash_vectors(name):
+    raw, index, amount, sighash = BIP143_SIGNED[name]
+    tx = parse_transaction(ByteReader(bytes.fromhex(raw)))
+    entries, pubkey = witness_z_values(tx, index, amount)
+    (r, s, z), = entries
+    assert z.hex() == sighash
+    assert verifies(decompress(pubkey), int.from_bytes(r, 'big'), int.from_bytes(s, 'big'), z)
+
+
+def test_bip143_witness_script_vector():
+    tx = parse_transaction(ByteReader(bytes.fromhex(BIP143_P2WSH_TX)))
+    witness_script = bytes.fromhex(BIP143_P2WSH_SCRIPT)
+    engine = SegwitSighashEngine(tx)
+    assert {sighash_type: engine.sighash(0, witness_script, BIP143_P2WSH_AMOUNT, sighash_type).hex()
+            for sighash_type in BIP143_P2WSH_SIGHASHES} == BIP143_P2WSH_SIGHASHES
+
+    # The scriptCode is taken from the witness stack: OP_0, the signatures, then the witness script
+    private_key = 0x2468ace013579bdf
+    digest = bytes.fromhex(BIP143_P2WSH_SIGHASHES[0x01])
+    tx["vin"][0]["witness"] = [b'', signature_push(private_key, 0x9abc, digest, 0x01)[1:], witness_script]
+    (r, s, z), = witness_z_values(tx, 0, BIP143_P2WSH_AMOUNT)[0]
+    assert z == digest
+    assert verifies(point_multiply(private_key), int.from_bytes(r, 'big'), int.from_bytes(s, 'big'), z)
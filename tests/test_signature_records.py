@@ -0,0 +1,36 @@
+import contextlib
+import io
+
+import pytest
+
+import extract_data
+from benchmarks.bench_records import dict_records
+from benchmarks.mock_node import MockNode
+from benchmarks.synthetic_chain import SyntheticChain
+
+
+@pytest.fixture(scope="module")
+def chain():
+    return SyntheticChain(12, 20, seed=12, r_reuse=0.05)
+
+
+def test_batches_match_the_dict_records_they_replaced(chain):
+    for height in range(len(chain)):
+        lines, records = dict_records(chain.raw_block(height))
+        raw_batch = extract_data.raw_block_signature_batch(chain.raw_block(height))
+        verbose_batch = extract_data.block_signature_batch(chain.verbose_block(chain.hashes[height]))
+        for batch in (raw_batch, verbose_batch):
+            assert ''.join(batch.text_lines()) == ''.join(lines)
+            assert [(txid, input_index, r.hex(), s.hex(), z, pubkey) for txid, input_index, r, s, z, pubkey in batch] \
+                == records
+
+
+@pytest.mark.parametrize("raw_blocks", [False, True])
+def test_scan_output_is_byte_for_byte_the_dict_path(tmp_path, monkeypatch, chain, raw_blocks):
+    golden = ''.join(line for height in range(len(chain)) for line in dict_records(chain.raw_block(height))[0])
+    assert golden.count("Signature - R:") > 300
+    output = tmp_path / "out.txt"
+    with MockNode(chain) as node, contextlib.redirect_stdout(io.StringIO()):
+        monkeypatch.setattr(extract_data.rpc_client, "url", node.url)
+        extract_data.main(0, len(chain) - 1, str(output), raw_blocks=raw_blocks)
+    assert output.read_bytes() == golden.encode('utf-8')
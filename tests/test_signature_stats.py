@@ -0,0 +1,19 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from signature_stats import SignatureStats, format_report
+from sigfile import UNKNOWN_HEIGHT
+
+
+def test_unknown_heights_are_reported_as_their_own_range():
+    values = np.full((6, 32), 0x40, dtype=np.uint8)
+    lengths = np.full(6, 32)
+    heights = np.array([UNKNOWN_HEIGHT, UNKNOWN_HEIGHT, 5, 150, UNKNOWN_HEIGHT, 99])
+    stats = SignatureStats(range_size=100)
+    stats.add(values, values.copy(), lengths, lengths, heights=heights)
+
+    report = stats.report()
+    assert [(entry['first_height'], entry['signatures']) for entry in report['ranges']] == \
+        [(None, 3), (0, 2), (100, 1)]
+    assert "unknown" in format_report(report)